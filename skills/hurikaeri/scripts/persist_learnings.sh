@@ -8,22 +8,43 @@
 # 標準入力から YAML 形式の KPT データを受け取り、
 # ~/.claude/hurikaeri/ に原子的 ID で保存する。
 #
-# ID 採番方式: kpt-YYYYMMDD-NNN（prompt-improver の collect_feedback.sh と同一パターン）
+# ID 採番方式: kpt-YYYYMMDD-NNN（prompt-improver の id_allocator.py で払い出す。
+# 同時に保存しても重複せず、999 件を超えると桁が増える）
 
 set -euo pipefail
 
 HURIKAERI_DIR="$HOME/.claude/hurikaeri"
 mkdir -p "$HURIKAERI_DIR"
 
-# 原子的 ID 生成
+# 原子的 ID 生成（隠しファイル .reserve-<ID>.yaml が空で予約される。使えなければ noclobber で空き番号を探す）
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+ALLOCATOR="$SCRIPT_DIR/../../prompt-improver/scripts/id_allocator.py"
 DATE=$(date +%Y%m%d)
-SEQ=1
-while [ -f "$HURIKAERI_DIR/kpt-$DATE-$(printf '%03d' $SEQ).yaml" ]; do
-    SEQ=$((SEQ + 1))
-done
-FILENAME="kpt-$DATE-$(printf '%03d' $SEQ).yaml"
+KPT_ID=""
+if [ -f "$ALLOCATOR" ] && command -v python3 &>/dev/null; then
+    KPT_ID=$(python3 "$ALLOCATOR" "$HURIKAERI_DIR" kpt --date "$DATE") || KPT_ID=""
+fi
+if [ -z "$KPT_ID" ]; then
+    SEQ=1
+    until [ ! -e "$HURIKAERI_DIR/kpt-$DATE-$(printf '%03d' $SEQ).yaml" ] \
+        && (set -o noclobber; : > "$HURIKAERI_DIR/.reserve-kpt-$DATE-$(printf '%03d' $SEQ).yaml") 2>/dev/null; do
+        SEQ=$((SEQ + 1))
+        if [ "$SEQ" -gt 99999 ]; then
+            echo "Error: ID 生成失敗" >&2
+            exit 1
+        fi
+    done
+    KPT_ID="kpt-$DATE-$(printf '%03d' $SEQ)"
+fi
+FILENAME="$KPT_ID.yaml"
+RESERVED="$HURIKAERI_DIR/.reserve-$FILENAME"
 
-# 標準入力から KPT データを保存
-cat > "$HURIKAERI_DIR/$FILENAME"
+# 標準入力から KPT データを予約ファイルに書き、書き終えてから rename する
+if ! cat > "$RESERVED"; then
+    rm -f "$RESERVED"
+    echo "Error: 保存失敗" >&2
+    exit 1
+fi
+mv -f "$RESERVED" "$HURIKAERI_DIR/$FILENAME"
 
 echo "保存完了: $HURIKAERI_DIR/$FILENAME"
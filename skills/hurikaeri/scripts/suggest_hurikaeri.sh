@@ -33,13 +33,38 @@ if [ -z "$TRANSCRIPT_PATH" ] || [ ! -f "$TRANSCRIPT_PATH" ]; then
     exit 0
 fi
 
-# メトリクス取得
-MESSAGE_COUNT=$(wc -l < "$TRANSCRIPT_PATH" | tr -d ' ')
-# ツール使用カウント（"type": "tool_use" パターンで精度向上）
-TOOL_USES=$(grep -c '"type"[[:space:]]*:[[:space:]]*"tool_use"' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
-# コード変更カウント（"name": "Write" / "Edit" パターン）
-CODE_CHANGES=$(grep -cE '"name"[[:space:]]*:[[:space:]]*"(Write|Edit)"' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
-ERROR_COUNT=$(grep -c '"is_error"[[:space:]]*:[[:space:]]*true' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
+# メトリクス取得（prompt-improver の共通スキャナがあれば1パス集計。
+# stop_hook_collect.sh とチェックポイントを共有するため、トランスクリプトは1回しか読まない）
+# スキャナが見つからない・失敗した場合は wc / grep で数える（値は同じ）
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+SCANNER_DIR="$SCRIPT_DIR/../../prompt-improver/scripts"
+SCAN_VARS=""
+if [ -f "$SCANNER_DIR/transcript_scanner.py" ] && command -v python3 &>/dev/null; then
+    # 常駐ワーカー（hook_daemon.py）経由で実行（動いていなければ直接実行）
+    SCAN_VARS=$(python3 -S "$SCANNER_DIR/hook_daemon.py" run transcript_scanner.py hook-vars "$TRANSCRIPT_PATH" 2>/dev/null) || SCAN_VARS=""
+fi
+
+MESSAGE_COUNT=""
+TYPED_TOOL_USES=""
+WRITE_EDIT_CHANGES=""
+TYPED_ERROR_COUNT=""
+if [ -n "$SCAN_VARS" ]; then
+    eval "$SCAN_VARS"
+fi
+
+if [ -n "$MESSAGE_COUNT" ] && [ -n "$TYPED_TOOL_USES" ] && [ -n "$WRITE_EDIT_CHANGES" ] && [ -n "$TYPED_ERROR_COUNT" ]; then
+    # ツール使用（"type": "tool_use"）/ コード変更（"name": "Write" / "Edit"）/ エラー（"is_error": true）の行数
+    TOOL_USES=$TYPED_TOOL_USES
+    CODE_CHANGES=$WRITE_EDIT_CHANGES
+    ERROR_COUNT=$TYPED_ERROR_COUNT
+else
+    MESSAGE_COUNT=$(wc -l < "$TRANSCRIPT_PATH" | tr -d ' ')
+    # ツール使用カウント（"type": "tool_use" パターンで精度向上）
+    TOOL_USES=$(grep -c '"type"[[:space:]]*:[[:space:]]*"tool_use"' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
+    # コード変更カウント（"name": "Write" / "Edit" パターン）
+    CODE_CHANGES=$(grep -cE '"name"[[:space:]]*:[[:space:]]*"(Write|Edit)"' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
+    ERROR_COUNT=$(grep -c '"is_error"[[:space:]]*:[[:space:]]*true' "$TRANSCRIPT_PATH" 2>/dev/null || echo "0")
+fi
 
 # 軽微セッションは除外
 if [ "$MESSAGE_COUNT" -lt 20 ]; then
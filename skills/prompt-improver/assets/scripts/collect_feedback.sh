@@ -7,6 +7,19 @@
 # - P1: session_id upsert（同一セッションは上書き、message_count同値ならスキップ）
 # - P2: 収集条件厳格化 + 15分クールダウン
 # - P3: task_summary / success 自動推定（inferred + confidence 付与）
+# - P4: extract_transcript.py をセッション単位のチェックポイントから差分解析
+# - P5: wc / grep / インライン Python を共通スキャナ（transcript_scanner.py）の1パスに統合
+# - P6: 抽出情報を JSON サイドカー（fb-*.extracted.json）にも書き出す（recommend_structure.py 用）
+# - P7: session_id 検索・未処理件数を SQLite インデックス（feedback_index.py）から引く
+# - P8: Python スクリプトは常駐ワーカー（hook_daemon.py）経由で実行（起動・import のコストを省く）
+# - P9: hook はジョブをスプールに置いて戻り、収集はバックグラウンドのワーカー（feedback_spool.py）が
+#       このスクリプトを --process で実行して行う（FEEDBACK_SPOOL=0 で従来どおりその場で収集）
+# - P10: クールダウンの最終保存時刻もインデックス（session_id ごとの created_at の最大）から引き、
+#        .last_save_* ファイルを廃止。ファイルを archive/ に移しても、session_id が unknown でも従来どおり効く。
+#        session_id の検索はディレクトリ全体を照合しない（見つかったファイルだけを stat で確認）
+# - P11: ID は共有の採番（id_allocator.py）で払い出す（同時に終了したセッションでも重複せず、1日 999 件を超えても続く）
+# - P12: 閾値チェックは status ごとの件数（インデックスの status_counts）を --no-refresh で引くだけにする。
+#        書き込み前に .index.journal/ に印を置き、反映前に落ちても次の問い合わせで追いつく
 
 FEEDBACK_DIR="$HOME/.claude/feedback"
 mkdir -p "$FEEDBACK_DIR"
@@ -14,6 +27,48 @@ mkdir -p "$FEEDBACK_DIR"
 # スクリプト自身のディレクトリ（extract_transcript.py の相対参照用）
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
+# P8: 常駐ワーカー経由で実行（PROMPT_IMPROVER_DAEMON=1 のときだけ。ワーカーが動いていなければ起動を頼み、今回は直接実行する）
+PY_RUN=(python3 -S "$SCRIPT_DIR/hook_daemon.py" run)
+
+# P9: --process はスプールのワーカーからの呼び出し（標準入力はジョブ = hook の入力）
+MODE=hook
+if [ "${1:-}" = "--process" ]; then
+    MODE=process
+fi
+
+# 収集を中断して終了（--process ではワーカーに失敗を返して再試行させる）
+# 新規の ID を払い出し済みなら予約ファイルを消す（番号は欠番になる）
+RESERVED=""
+abort_collect() {
+    echo "$1" >> "$FEEDBACK_DIR/debug.log"
+    if [ -n "$RESERVED" ]; then
+        rm -f "$RESERVED"
+    fi
+    echo '{"continue": true}'
+    if [ "$MODE" = process ]; then
+        exit 1
+    fi
+    exit 0
+}
+
+# === 閾値チェック: 未処理フィードバックが多い場合は通知 ===
+notify_pending() {
+    local threshold=${FEEDBACK_THRESHOLD:-5}
+    local pending_count=""
+    if [ -f "$SCRIPT_DIR/feedback_index.py" ]; then
+        # P12: 維持している件数を引くだけ（書き換え中の印が残るファイルだけ反映し直す）
+        pending_count=$("${PY_RUN[@]}" feedback_index.py --feedback-dir "$FEEDBACK_DIR" --no-refresh count-status open)
+    fi
+    if [ -z "$pending_count" ]; then
+        pending_count=$(grep -l "status: open" "$FEEDBACK_DIR"/*.yaml 2>/dev/null | wc -l | tr -d ' ')
+    fi
+
+    if [ "$pending_count" -ge "$threshold" ]; then
+        echo "" >&3
+        echo "📊 未処理フィードバック: ${pending_count}件 → /improve で改善適用" >&3
+    fi
+}
+
 # 元の stderr を退避してからデバッグログにリダイレクト
 exec 3>&2
 exec 2>> "$FEEDBACK_DIR/debug.log"
@@ -48,14 +103,46 @@ if [ -z "$TRANSCRIPT_PATH" ] || [ ! -f "$TRANSCRIPT_PATH" ]; then
     exit 0
 fi
 
-# JSONLファイルからメッセージをカウント
-MESSAGE_COUNT=$(wc -l < "$TRANSCRIPT_PATH" | tr -d ' ')
-TOOL_USES=$(grep -c '"tool_use"' "$TRANSCRIPT_PATH" 2>/dev/null || true)
-CODE_CHANGES=$(grep -cE '"(Write|Edit|Bash)"' "$TRANSCRIPT_PATH" 2>/dev/null || true)
+# ===== P9: ジョブをスプールに置いて戻る =====
+# 同じ session_id のジョブは同じ名前で置き換わり、ワーカーはその時点の最新のトランスクリプトを1回だけ解析する
+SPOOL_SCRIPT="$SCRIPT_DIR/feedback_spool.py"
+if [ "$MODE" = hook ] && [ "${FEEDBACK_SPOOL:-1}" != 0 ] && [ -f "$SPOOL_SCRIPT" ] && command -v python3 &> /dev/null; then
+    PENDING_DIR="$FEEDBACK_DIR/.spool/pending"
+    JOB_KEY="$SESSION_ID"
+    if [ -z "$JOB_KEY" ] || [ "$JOB_KEY" = "unknown" ]; then
+        JOB_KEY=$(basename "$TRANSCRIPT_PATH" .jsonl)
+    fi
+    JOB_KEY=$(printf '%s' "$JOB_KEY" | tr -c 'A-Za-z0-9_.-' '_' | sed 's/^\.*//')
+    mkdir -p "$PENDING_DIR"
+    if JOB_TMP=$(mktemp "$PENDING_DIR/.job-XXXXXX") && printf '%s\n' "$INPUT" > "$JOB_TMP" \
+        && mv -f "$JOB_TMP" "$PENDING_DIR/${JOB_KEY:-unknown}.json"; then
+        echo "QUEUED: ${JOB_KEY:-unknown}" >> "$FEEDBACK_DIR/debug.log"
+        notify_pending
+        # ワーカーを起こす（別のワーカーが動いていればすぐ終了し、そちらが処理する）。
+        # 通知の後に起こし、hook 自身の処理と CPU を取り合わないようにする
+        nohup python3 "$SPOOL_SCRIPT" --feedback-dir "$FEEDBACK_DIR" work --hook "$SCRIPT_DIR/$(basename "$0")" \
+            < /dev/null > /dev/null 2>> "$FEEDBACK_DIR/debug.log" 3>&- &
+        echo '{"continue": true}'
+        exit 0
+    fi
+    rm -f "$JOB_TMP"
+    echo "QUEUE_FAILED: collecting synchronously" >> "$FEEDBACK_DIR/debug.log"
+fi
 
-# transcript が空/読み取り不能などで grep が何も出さなかった場合は 0 扱い
-TOOL_USES=${TOOL_USES:-0}
-CODE_CHANGES=${CODE_CHANGES:-0}
+# ===== P5: 共通スキャナで1パス解析 =====
+# transcript_scanner.py がメトリクス・task_summary・抽出情報を1回の読み取りで集計し、
+# チェックポイントを suggest_hurikaeri.sh / extract_transcript.py と共有する
+SCANNER="$SCRIPT_DIR/transcript_scanner.py"
+if [ ! -f "$SCANNER" ] || ! command -v python3 &> /dev/null; then
+    abort_collect "transcript_scanner.py not found at $SCANNER or python3 not available"
+fi
+
+SCAN_VARS=$("${PY_RUN[@]}" transcript_scanner.py hook-vars "$TRANSCRIPT_PATH" 2>> "$FEEDBACK_DIR/debug.log")
+if [ -z "$SCAN_VARS" ]; then
+    abort_collect "transcript_scanner.py returned empty"
+fi
+# MESSAGE_COUNT / TOOL_USES / CODE_CHANGES / ERROR_COUNT / TASK_SUMMARY を設定
+eval "$SCAN_VARS"
 
 echo "MESSAGE_COUNT=$MESSAGE_COUNT, TOOL_USES=$TOOL_USES, CODE_CHANGES=$CODE_CHANGES" >> "$FEEDBACK_DIR/debug.log"
 
@@ -89,13 +176,52 @@ if [ "$SHOULD_COLLECT" = false ]; then
     exit 0
 fi
 
-# ===== P2: 15分クールダウン =====
-COOLDOWN_SECS=900  # 15分
-LAST_SAVE_FILE="$FEEDBACK_DIR/.last_save_${SESSION_ID}"
+# ===== P1: session_id upsert（重複排除） =====
+DATE=$(date +%Y%m%d)
+TIMESTAMP=$(date -u +%Y-%m-%dT%H:%M:%SZ)
 NOW=$(date +%s)
 
-if [ -f "$LAST_SAVE_FILE" ]; then
-    LAST_SAVE=$(cat "$LAST_SAVE_FILE" 2>/dev/null || echo "0")
+# 同一 session_id の既存ファイル・message_count・最終保存時刻を検索
+# P7 / P10: インデックスから引く（使えなければ全ファイルを grep し、最終保存時刻は archive/ も含めた created_at の最大）。
+# unknown のセッションは上書きしないが、クールダウンは従来どおり unknown 全体で共有する
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
+SESSION_ID="${SESSION_ID:-unknown}"
+EXISTING=""
+PREV_MSG_COUNT=""
+LAST_SAVE=""
+if [ -f "$INDEX_SCRIPT" ] && FOUND=$("${PY_RUN[@]}" feedback_index.py --feedback-dir "$FEEDBACK_DIR" --no-refresh find-session "$SESSION_ID"); then
+    if [ -n "$FOUND" ]; then
+        FOUND_NAME=$(printf '%s' "$FOUND" | cut -f1)
+        if [ -n "$FOUND_NAME" ]; then
+            EXISTING="$FEEDBACK_DIR/$FOUND_NAME"
+        fi
+        PREV_MSG_COUNT=$(printf '%s' "$FOUND" | cut -f2)
+        LAST_SAVE=$(printf '%s' "$FOUND" | cut -f3)
+    fi
+else
+    SAVED_FILES=$(grep -l "session_id: $SESSION_ID" "$FEEDBACK_DIR"/fb-*.yaml "$FEEDBACK_DIR"/archive/fb-*.yaml 2>/dev/null)
+    EXISTING=$(printf '%s\n' "$SAVED_FILES" | grep -v '/archive/' | head -1)
+    if [ -n "$EXISTING" ]; then
+        PREV_MSG_COUNT=$(grep 'message_count:' "$EXISTING" 2>/dev/null | head -1 | awk '{print $2}')
+    fi
+    if [ -n "$SAVED_FILES" ]; then
+        # created_at は UTC の YYYY-MM-DDTHH:MM:SSZ なので文字列の順 = 時刻の順
+        CREATED_AT=$(printf '%s\n' "$SAVED_FILES" | while IFS= read -r SAVED; do
+            grep -m1 '^created_at:' "$SAVED" 2>/dev/null | awk '{print $2}'
+        done | sort | tail -1)
+        if [ -n "$CREATED_AT" ]; then
+            LAST_SAVE=$(date -u -d "$CREATED_AT" +%s 2>/dev/null || date -u -j -f '%Y-%m-%dT%H:%M:%SZ' "$CREATED_AT" +%s 2>/dev/null)
+        fi
+    fi
+fi
+if [ "$SESSION_ID" = "unknown" ]; then
+    EXISTING=""
+    PREV_MSG_COUNT=""
+fi
+
+# ===== P2: 15分クールダウン =====
+COOLDOWN_SECS=900  # 15分
+if [ -n "$LAST_SAVE" ]; then
     ELAPSED=$((NOW - LAST_SAVE))
     if [ "$ELAPSED" -lt "$COOLDOWN_SECS" ]; then
         echo "COOLDOWN: ${ELAPSED}s < ${COOLDOWN_SECS}s, skipping" >> "$FEEDBACK_DIR/debug.log"
@@ -104,19 +230,7 @@ if [ -f "$LAST_SAVE_FILE" ]; then
     fi
 fi
 
-# ===== P1: session_id upsert（重複排除） =====
-DATE=$(date +%Y%m%d)
-TIMESTAMP=$(date -u +%Y-%m-%dT%H:%M:%SZ)
-
-# 同一 session_id の既存ファイルを検索
-EXISTING=""
-if [ "$SESSION_ID" != "unknown" ]; then
-    EXISTING=$(grep -l "session_id: $SESSION_ID" "$FEEDBACK_DIR"/fb-*.yaml 2>/dev/null | head -1)
-fi
-
 if [ -n "$EXISTING" ]; then
-    # 既存ファイルの message_count を取得
-    PREV_MSG_COUNT=$(grep 'message_count:' "$EXISTING" 2>/dev/null | head -1 | awk '{print $2}')
     if [ "$PREV_MSG_COUNT" = "$MESSAGE_COUNT" ]; then
         echo "UPSERT_SKIP: message_count unchanged ($MESSAGE_COUNT)" >> "$FEEDBACK_DIR/debug.log"
         echo '{"continue": true}'
@@ -126,48 +240,21 @@ if [ -n "$EXISTING" ]; then
     FILENAME=$(basename "$EXISTING")
     echo "UPSERT: overwriting $FILENAME (msg: $PREV_MSG_COUNT -> $MESSAGE_COUNT)" >> "$FEEDBACK_DIR/debug.log"
 else
-    # 新規: シーケンス番号を決定
-    SEQ=1
-    while [ -f "$FEEDBACK_DIR/fb-$DATE-$(printf '%03d' $SEQ).yaml" ]; do
-        SEQ=$((SEQ + 1))
-    done
-    FILENAME="fb-$DATE-$(printf '%03d' $SEQ).yaml"
+    # 新規: P11 共有の採番で ID を払い出す（隠しファイル .reserve-<ID>.yaml が空で予約される）。
+    # 実行するたびに番号が進むので常駐ワーカーは通さない（応答が途切れたときに二重に払い出さない）
+    NEW_ID=$(python3 "$SCRIPT_DIR/id_allocator.py" "$FEEDBACK_DIR" fb --date "$DATE")
+    if [ -z "$NEW_ID" ]; then
+        abort_collect "id_allocator.py failed"
+    fi
+    FILENAME="$NEW_ID.yaml"
+    RESERVED="$FEEDBACK_DIR/.reserve-$FILENAME"
     echo "NEW: creating $FILENAME" >> "$FEEDBACK_DIR/debug.log"
 fi
 
 # ===== P3: task_summary / success 自動推定 =====
-TASK_SUMMARY=""
 SUCCESS="unknown"
 CONFIDENCE="low"
 
-if command -v python3 &> /dev/null; then
-    TASK_SUMMARY=$(python3 -c "
-import json, sys
-for line in open('$TRANSCRIPT_PATH', encoding='utf-8'):
-    try:
-        d = json.loads(line.strip())
-        if d.get('type') in ('human', 'user'):
-            content = d.get('message', {}).get('content', '')
-            if isinstance(content, list):
-                for c in content:
-                    if isinstance(c, dict) and c.get('type') == 'text':
-                        text = c.get('text', '')
-                        if text.strip():
-                            # system-reminder や hook 出力を除外
-                            skip_prefixes = ('<system-reminder>', '<command-', '<local-command-', '<task-notification>', 'Base directory for this skill:', 'This session is being continued')
-                            if not any(text.startswith(p) for p in skip_prefixes):
-                                print(text[:100])
-                                sys.exit(0)
-            elif isinstance(content, str) and content.strip():
-                skip_prefixes = ('<system-reminder>', '<command-', '<local-command-', '<task-notification>', 'Base directory for this skill:', 'This session is being continued')
-                if not any(content.startswith(p) for p in skip_prefixes):
-                    print(content[:100])
-                    sys.exit(0)
-    except:
-        pass
-" 2>/dev/null || echo "")
-fi
-
 # task_summary が取得できなかった場合のフォールバック
 if [ -z "$TASK_SUMMARY" ]; then
     TASK_SUMMARY="(自動抽出失敗)"
@@ -176,10 +263,7 @@ fi
 # YAML のダブルクォート内で安全な文字列にする
 TASK_SUMMARY=$(echo "$TASK_SUMMARY" | tr -d '\n' | sed 's/"/\\"/g' | head -c 100)
 
-# success 推定
-ERROR_COUNT=$(grep -c '"is_error":true' "$TRANSCRIPT_PATH" 2>/dev/null || true)
-ERROR_COUNT=${ERROR_COUNT:-0}
-
+# success 推定（ERROR_COUNT は共通スキャナの集計値）
 if [ "$ERROR_COUNT" -eq 0 ]; then
     SUCCESS="true"
     CONFIDENCE="medium"
@@ -194,9 +278,16 @@ fi
 echo "AUTO_SUMMARY: task='${TASK_SUMMARY:0:50}...' success=$SUCCESS confidence=$CONFIDENCE errors=$ERROR_COUNT" >> "$FEEDBACK_DIR/debug.log"
 
 # フィードバックテンプレート生成
-# P1: FILENAME は upsert の場合は既存名、新規の場合は採番済み
+# P1: FILENAME は upsert の場合は既存名、新規の場合は採番済み。
+# 新規は予約ファイルに書き終えてから FILENAME へ rename する（書きかけの fb-*.yaml を見せない）
 FB_ID="${FILENAME%.yaml}"
-cat > "$FEEDBACK_DIR/$FILENAME" << EOF
+OUTPUT="${RESERVED:-$FEEDBACK_DIR/$FILENAME}"
+# P12: 書き換え中の印（インデックスへの反映後に feedback_index.py update が消す）
+if [ -f "$INDEX_SCRIPT" ]; then
+    mkdir -p "$FEEDBACK_DIR/.index.journal" && : > "$FEEDBACK_DIR/.index.journal/$FILENAME"
+fi
+
+cat > "$OUTPUT" << EOF
 # Auto-generated by Stop hook
 id: $FB_ID
 created_at: $TIMESTAMP
@@ -232,19 +323,23 @@ triage:
 
 EOF
 
-# クールダウン: 最終保存時刻を記録
-echo "$NOW" > "$LAST_SAVE_FILE"
+# 旧形式のクールダウンファイル（最終保存時刻は created_at としてインデックスに載る）
+rm -f "$FEEDBACK_DIR/.last_save_${SESSION_ID}"
 
 # ===== P0: extract_transcript.py パス修正 =====
 # $SCRIPT_DIR 相対参照（デプロイ先に依存しない）
 EXTRACT_SCRIPT="$SCRIPT_DIR/extract_transcript.py"
 if [ -f "$EXTRACT_SCRIPT" ] && command -v python3 &> /dev/null; then
     echo "Running extract_transcript.py from $EXTRACT_SCRIPT" >> "$FEEDBACK_DIR/debug.log"
-    EXTRACTED=$(python3 "$EXTRACT_SCRIPT" "$TRANSCRIPT_PATH" 2>> "$FEEDBACK_DIR/debug.log")
+    # P4: 共通チェックポイントから再開（P5 のスキャンで解析済みのため追加の読み取りはほぼない）
+    # P6: 同じ解析結果を JSON サイドカーにも書き出す（upsert 時は古いサイドカーを破棄）
+    SIDECAR="$FEEDBACK_DIR/$FB_ID.extracted.json"
+    rm -f "$SIDECAR"
+    EXTRACTED=$("${PY_RUN[@]}" extract_transcript.py "$TRANSCRIPT_PATH" --checkpoint --sidecar "$SIDECAR" 2>> "$FEEDBACK_DIR/debug.log")
     if [ -n "$EXTRACTED" ]; then
-        echo "" >> "$FEEDBACK_DIR/$FILENAME"
-        echo "# 自動抽出された詳細情報" >> "$FEEDBACK_DIR/$FILENAME"
-        echo "$EXTRACTED" >> "$FEEDBACK_DIR/$FILENAME"
+        echo "" >> "$OUTPUT"
+        echo "# 自動抽出された詳細情報" >> "$OUTPUT"
+        echo "$EXTRACTED" >> "$OUTPUT"
         echo "Extracted data appended" >> "$FEEDBACK_DIR/debug.log"
     else
         echo "No extracted data (script returned empty)" >> "$FEEDBACK_DIR/debug.log"
@@ -253,15 +348,21 @@ else
     echo "extract_transcript.py not found at $EXTRACT_SCRIPT or python3 not available" >> "$FEEDBACK_DIR/debug.log"
 fi
 
+if [ -n "$RESERVED" ]; then
+    mv -f "$RESERVED" "$FEEDBACK_DIR/$FILENAME" || abort_collect "failed to move $RESERVED into place"
+    RESERVED=""
+fi
 echo "SAVED: $FILENAME" >> "$FEEDBACK_DIR/debug.log"
 
-# === 閾値チェック: 未処理フィードバックが多い場合は通知 ===
-THRESHOLD=${FEEDBACK_THRESHOLD:-5}
-pending_count=$(grep -l "status: open" "$FEEDBACK_DIR"/*.yaml 2>/dev/null | wc -l | tr -d ' ')
+# P7: インデックスに反映（サイドカーの抽出情報も取り込む）
+if [ -f "$INDEX_SCRIPT" ]; then
+    "${PY_RUN[@]}" feedback_index.py --feedback-dir "$FEEDBACK_DIR" update "$FEEDBACK_DIR/$FILENAME" \
+        || echo "feedback_index.py update failed" >> "$FEEDBACK_DIR/debug.log"
+fi
 
-if [ "$pending_count" -ge "$THRESHOLD" ]; then
-    echo "" >&3
-    echo "📊 未処理フィードバック: ${pending_count}件 → /improve で改善適用" >&3
+# 閾値チェック（ワーカーからの実行では通知先がないので省く）
+if [ "$MODE" = hook ]; then
+    notify_pending
 fi
 
 # 成功メッセージを出力
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+feedback_parser.py - フィードバック YAML の1パス限定パーサ
+
+fb-*.yaml を行の先頭から1回たどり、字下げでいまどのブロックにいるかを追って
+必要なフィールドだけを取り出す。PyYAML なしで動作。
+
+    要約（feedback_index.py のインデックス用）:
+        id / session_id / created_at / outcome.success / stats.message_count /
+        triage.status / triage.priority / issues[].type / issues[].target.path
+    抽出情報（recommend_structure.py の分析用。サイドカーがないときに使う）:
+        extracted.improvement_targets / extracted.errors の matched_keywords /
+        extracted.user_corrections.items
+
+対象は Stop hook（stop_hook_collect.sh + extract_transcript.py）と collect_feedback.sh が
+書く形。トップレベルのキーは字下げなし、extracted 直下のキーは字下げ2で、それより深い行は
+直前のキーのブロックに属するとみなす。
+
+FeedbackParseCache は解析結果を ~/.claude/cache/feedback-parse/records.marshal に残し、
+(inode, mtime, size) か内容の SHA-1 が一致するファイルは解析し直さない
+（archive/ への移動やインデックスの再構築の後も使える）。
+
+置き換える前の正規表現版との一致確認・時間比較は benchmarks/reference_checks.py feedback-parser。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import hashlib
+import io
+import marshal
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 解析結果のキャッシュ（FeedbackParseCache）の保存先。フィードバックディレクトリと archive/ で共有する
+DEFAULT_PARSE_CACHE_PATH = os.path.join(
+    os.environ.get("FEEDBACK_PARSE_CACHE_DIR", os.path.expanduser("~/.claude/cache/feedback-parse")),
+    "records.marshal",
+)
+
+# パーサの抽出結果か保存形式が変わったら上げる（不一致のキャッシュは使わない）
+PARSE_CACHE_VERSION = 3
+
+# キャッシュに残す解析結果の上限（超えたら古く登録したものから捨てる）
+PARSE_CACHE_MAX_RECORDS = 20000
+
+# parse_many でプロセスを使って解析する最小件数（これより少なければプロセス起動の方が高くつく）
+PARALLEL_PARSE_MIN_FILES = 256
+
+_TOP_KEY = re.compile(r"^([A-Za-z_]\w*):\s*(.*?)\s*$")
+_NESTED_KEY = re.compile(r"^( +)(-\s+)?([A-Za-z_]\w*):\s*(.*?)\s*$")
+
+# 値を読むトップレベルのスカラー / ブロック
+_TOP_SCALARS = ("id", "session_id", "created_at")
+_TOP_BLOCKS = ("outcome", "stats", "triage", "issues", "extracted")
+
+# 抽出情報の値（extract_transcript.py の書き方に合わせ、クォートは1組だけ外してエスケープは残す）
+_WORD_VALUE_RE = re.compile(r'["\']?(\S+?)["\']?$')
+_QUOTED_VALUE_RE = re.compile(r'["\']?(.+?)["\']?$')
+_NUMBER_VALUE_RE = re.compile(r'\d+(?:\.\d+)?')
+_INLINE_LIST_RE = re.compile(r'\[(.+?)\]')
+
+
+def _scalar(value: str) -> Optional[str]:
+    """YAML のスカラー値（クォートを外す。空・null は None）"""
+    if value in ("", "null", "~"):
+        return None
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+def _inline_list(match: Optional[re.Match]) -> List[str]:
+    """[a, "b"] の中身（クォートを外す）"""
+    if not match:
+        return []
+    return [item.strip().strip('"\'') for item in match.group(1).split(',')]
+
+
+# ===============================
+# 抽出情報のブロック
+# ===============================
+
+class _TargetsHandler:
+    """extracted.improvement_targets の行から改善ターゲットを組み立てる"""
+
+    def __init__(self):
+        self.targets: List[Dict] = []
+        self.current: Optional[Dict] = None
+
+    def feed(self, key: str, dash: bool, value: str) -> None:
+        if key == 'target' and dash:
+            self.current = {'keywords': [], 'avg_confidence': 1.0, 'file': None, 'section': None, 'type': None}
+            self.targets.append(self.current)
+            return
+        current = self.current
+        if current is None:
+            return
+        if key == 'type':
+            match = _WORD_VALUE_RE.match(value)
+            if match:
+                current['type'] = match.group(1).strip('"\'')
+        elif key in ('file', 'section'):
+            match = _QUOTED_VALUE_RE.match(value)
+            if match:
+                current[key] = match.group(1).strip('"\'')
+        elif key == 'avg_confidence':
+            match = _NUMBER_VALUE_RE.match(value)
+            if match:
+                current['avg_confidence'] = float(match.group())
+        elif key == 'keywords':
+            current['keywords'] = _inline_list(_INLINE_LIST_RE.match(value))
+
+
+class _CorrectionItemsHandler:
+    """extracted.user_corrections.items の行から修正指示の詳細とパターン名を組み立てる"""
+
+    def __init__(self):
+        self.items: List[Dict] = []
+        self.keywords: List[str] = []
+        self.current: Optional[Dict] = None
+
+    def feed(self, key: str, dash: bool, value: str) -> None:
+        if key == 'line' and dash:
+            self.current = {'excerpt': '', 'patterns': [], 'linked_target': None}
+            self.items.append(self.current)
+            return
+        current = self.current
+        if current is None:
+            return
+        if key == 'excerpt':
+            match = _QUOTED_VALUE_RE.match(value)
+            if match:
+                current['excerpt'] = match.group(1)[:100]
+        elif key == 'patterns':
+            match = _INLINE_LIST_RE.match(value)
+            if match:
+                current['patterns'] = _inline_list(match)
+                self.keywords.extend(p for p in current['patterns'] if p)
+        elif key == 'linked_target':
+            current['linked_target'] = True
+
+
+# ===============================
+# パーサ本体
+# ===============================
+
+def parse_feedback_lines(lines: Iterable[str], extracted: bool = True) -> Dict:
+    """
+    行（末尾の改行はあってもなくてもよい）から要約と抽出情報を読む。
+    extracted=False なら要約だけを返す（extracted ブロックの行は読み飛ばす）。
+    """
+    result = {
+        'id': None,
+        'session_id': None,
+        'created_at': None,
+        'success': None,
+        'message_count': None,
+        'triage_status': None,
+        'triage_priority': None,
+        'issues': [],
+    }
+    targets = _TargetsHandler()
+    corrections = _CorrectionItemsHandler()
+    error_keywords: List[str] = []
+
+    block = None  # いまのトップレベルのブロック
+    section = None  # extracted 直下のキー（字下げ2）
+    in_items = False  # extracted.user_corrections.items の中か
+    issue = None
+    in_target = False
+
+    for line in lines:
+        line = line.rstrip("\n")
+        stripped = line.strip()
+        if not stripped or stripped[0] == "#":
+            continue
+
+        if not line[0].isspace():
+            block = None
+            match = _TOP_KEY.match(line)
+            if not match:
+                continue
+            key, value = match.groups()
+            if key in _TOP_SCALARS:
+                result[key] = _scalar(value)
+            elif key in _TOP_BLOCKS:
+                block = key
+                section = None
+            continue
+
+        if block == "extracted":
+            if not extracted:
+                continue
+            if not line.startswith("   "):
+                # extracted 直下のキー（字下げ2）
+                match = _NESTED_KEY.match(line)
+                section = match.group(3) if match and not match.group(2) else None
+                in_items = False
+                continue
+            if section == "errors":
+                if stripped.startswith("matched_keywords:"):
+                    error_keywords.extend(kw for kw in _inline_list(_INLINE_LIST_RE.search(stripped)) if kw)
+                continue
+            if section != "improvement_targets" and section != "user_corrections":
+                continue
+            match = _NESTED_KEY.match(line)
+            if not match:
+                continue
+            spaces, dash, key, value = match.groups()
+            if section == "improvement_targets":
+                targets.feed(key, bool(dash), value)
+            elif len(spaces) == 4 and not dash:
+                in_items = key == "items" and not value
+            elif in_items:
+                corrections.feed(key, bool(dash), value)
+            continue
+
+        if block is None:
+            continue
+        match = _NESTED_KEY.match(line)
+        if not match:
+            continue
+        spaces, dash, key, value = match.groups()
+        # "  - key:" は key の位置（4）で数える
+        column = len(spaces) + (2 if dash else 0)
+
+        if block == "issues":
+            if dash and column == 4:
+                issue = {"type": None, "target_path": None}
+                result["issues"].append(issue)
+                in_target = False
+            if issue is None:
+                continue
+            if column == 4:
+                in_target = key == "target"
+                if key == "type":
+                    issue["type"] = _scalar(value)
+            elif column == 6 and in_target and key == "path":
+                issue["target_path"] = _scalar(value)
+            continue
+
+        if column != 2:
+            continue
+        if block == "outcome" and key == "success":
+            result["success"] = _scalar(value)
+        elif block == "stats" and key == "message_count":
+            count = _scalar(value)
+            result["message_count"] = int(count) if count and count.isdigit() else None
+        elif block == "triage" and key == "status":
+            result["triage_status"] = _scalar(value)
+        elif block == "triage" and key == "priority":
+            result["triage_priority"] = _scalar(value)
+
+    if extracted:
+        result['improvement_targets'] = targets.targets
+        result['errors'] = error_keywords
+        result['user_corrections'] = corrections.keywords
+        result['user_correction_items'] = corrections.items
+    return result
+
+
+def parse_feedback_yaml(filepath: str, extracted: bool = True) -> Optional[Dict]:
+    """
+    フィードバック YAML を1パスで読む（読めなければ None）。
+    復号できないバイトは置き換える（task_summary は head -c で切るので文字の途中で切れることがある）。
+
+    extracted=False なら要約だけを返す（インデックスの要約・サイドカーがある場合用）。
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+            return parse_feedback_lines(f, extracted)
+    except OSError:
+        return None
+
+
+def parse_feedback_bytes(data: bytes) -> Dict:
+    """ファイルの内容（バイト列）を parse_feedback_yaml と同じ規則で解析する"""
+    text = data.decode("utf-8", errors="replace")
+    # open() と同じく改行を \n にそろえる
+    return parse_feedback_lines(io.StringIO(text, newline=None))
+
+
+def _map_in_threads(func: Callable, items: List, jobs: int) -> List:
+    """func を items の順に適用した結果（jobs > 1 ならスレッドで並行に）"""
+    if jobs > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+            return list(pool.map(func, items))
+    return [func(item) for item in items]
+
+
+# ===============================
+# 解析結果のキャッシュ
+# ===============================
+
+class FeedbackParseCache:
+    """
+    parse_feedback_yaml の結果の永続キャッシュ（marshal 1ファイル）。
+
+    中身は dict / tuple / list / bytes / str / 数値だけなので marshal で足りる。
+    pickle と違い、書き換えられたファイルを読み込んでもコードは実行されない。
+
+    - 内容の SHA-1 → 解析結果。同じ内容なら場所が変わっても解析し直さない
+    - (st_dev, st_ino, mtime_ns, size) → SHA-1。一致すればファイルを読まない
+      （archive_feedback.sh の mv はどちらも変えないので、archive/ に移しても読み直さない）
+    - 件数が上限を超えたら古く登録したものから捨てる
+
+    返す dict はキャッシュと共有するので、呼び出し側で書き換えないこと。
+    """
+
+    def __init__(self, cache_path: str = DEFAULT_PARSE_CACHE_PATH, max_records: int = PARSE_CACHE_MAX_RECORDS):
+        self.cache_path = cache_path
+        self.max_records = max_records
+        self.files: Dict[Tuple[int, int, int, int], bytes] = {}
+        self.records: Dict[bytes, Optional[Dict]] = {}
+        self.dirty = False
+        self.stat_hits = 0
+        self.content_hits = 0
+        self.parsed = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, "rb") as f:
+                cached = marshal.load(f)
+        except (OSError, EOFError, TypeError, ValueError):
+            return
+        if not isinstance(cached, dict) or cached.get("version") != PARSE_CACHE_VERSION:
+            return
+        files = cached.get("files")
+        records = cached.get("records")
+        if not isinstance(files, dict) or not isinstance(records, dict):
+            return
+        self.files = files
+        self.records = records
+
+    def parse(self, filepath: str) -> Optional[Dict]:
+        """parse_feedback_yaml(filepath) と同じ結果を返す（変わっていないファイルは解析しない）"""
+        return self.parse_many([filepath])[0]
+
+    def _fetch(self, filepath: str) -> Optional[Tuple[Optional[Tuple[int, int, int, int]], Optional[bytes], Optional[bytes]]]:
+        """
+        (stat のキー, キャッシュ済みの SHA-1, 内容) を返す。読めなければ None。
+        stat のキーがキャッシュにあれば内容は読まない。読んでいる間に書き換えられたらキーは None。
+        キャッシュを書き換えないのでスレッドから呼べる。
+        """
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+        digest = self.files.get(key)
+        if digest is not None and digest in self.records:
+            return key, digest, None
+
+        try:
+            with open(filepath, "rb") as f:
+                data = f.read()
+                after = os.fstat(f.fileno())
+        except OSError:
+            return None
+        if (after.st_mtime_ns, after.st_size) != (st.st_mtime_ns, st.st_size) or len(data) != st.st_size:
+            key = None
+        return key, None, data
+
+    def parse_many(self, paths: List[str], jobs: int = 1) -> List[Optional[Dict]]:
+        """
+        parse を paths の順に行った結果を返す。
+
+        jobs > 1 なら、キャッシュにないファイルを jobs 個のスレッドで並行に読み（ネットワーク越しの
+        ホームでは open / read の待ちが支配的）、未知の内容が PARALLEL_PARSE_MIN_FILES 件以上あれば
+        jobs 個のプロセスで並行に解析する。
+        """
+        fetched = _map_in_threads(self._fetch, paths, jobs)
+
+        digests: List[Optional[bytes]] = []
+        unknown: Dict[bytes, bytes] = {}  # SHA-1 → まだ解析していない内容
+        for item in fetched:
+            if item is None:
+                digests.append(None)
+                continue
+            key, digest, data = item
+            if data is None:
+                self.stat_hits += 1
+            else:
+                digest = hashlib.sha1(data).digest()
+                if digest in self.records or digest in unknown:
+                    self.content_hits += 1
+                else:
+                    self.parsed += 1
+                    unknown[digest] = data
+                if key is not None:
+                    self.files[key] = digest
+                self.dirty = True
+            digests.append(digest)
+
+        if unknown:
+            contents = list(unknown.values())
+            if jobs > 1 and len(contents) >= PARALLEL_PARSE_MIN_FILES:
+                # multiprocessing の読み込みは重いので、使うときだけ（feedback_index.py も読み込むため）
+                from concurrent.futures import ProcessPoolExecutor
+
+                workers = min(jobs, len(contents))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    records = list(pool.map(
+                        parse_feedback_bytes, contents, chunksize=max(1, len(contents) // (workers * 4))
+                    ))
+            else:
+                records = [parse_feedback_bytes(data) for data in contents]
+            self.records.update(zip(unknown, records))
+
+        return [None if digest is None else self.records[digest] for digest in digests]
+
+    def _prune(self) -> None:
+        if len(self.records) > self.max_records:
+            for digest in list(self.records)[: len(self.records) - self.max_records]:
+                del self.records[digest]
+        # 消えた結果を指す対応と、上限を超えた古い対応を捨てる
+        files = {key: digest for key, digest in self.files.items() if digest in self.records}
+        if len(files) > self.max_records:
+            files = dict(list(files.items())[len(files) - self.max_records:])
+        self.files = files
+
+    def save(self) -> bool:
+        """変更があれば原子的に書き込む（同時に書いても読み手は常に完全なファイルを見る）"""
+        if not self.dirty:
+            return True
+        self._prune()
+        cache_dir = os.path.dirname(self.cache_path) or "."
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".parse-", suffix=".tmp")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump({"version": PARSE_CACHE_VERSION, "files": self.files, "records": self.records}, f)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+        self.dirty = False
+        return True
+
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+feedback_spool.py - Stop hook のフィードバック収集ジョブのスプールとワーカー
+
+Stop hook（stop_hook_collect.sh）はスキャン・テンプレート生成・extract_transcript.py の実行を
+その場で行わず、hook の入力（session_id・transcript_path）をジョブとしてスプールに書いて戻る。
+バックグラウンドのワーカーがジョブを取り出し、stop_hook_collect.sh --process で収集を実行する。
+
+<feedback_dir>/.spool/
+    pending/<key>.json          未処理のジョブ（hook の入力 JSON。key は session_id）
+    running/<key>.json.<pid>    実行中（pending から rename で取り出す）
+    dead/<key>-<時刻>.json      再試行しても失敗したジョブ（retry-dead で pending に戻せる）
+    worker.lock                 ワーカーの排他（flock）
+
+- ジョブは一時ファイルに書いてから rename で pending/<key>.json に置く（書きかけを読まない）。
+  同じ session_id のジョブは同じ名前で上書きされるので、続けて Stop しても処理は1回にまとまり、
+  その時点の最新のトランスクリプトを解析する
+- ワーカーは同時に1つだけ動く（worker.lock）。起動時に running に残っているジョブ
+  （前のワーカーが異常終了したもの）は pending に戻す
+- 失敗したジョブは試行回数と次の実行時刻（指数バックオフ）を付けて pending に戻し、
+  MAX_ATTEMPTS 回失敗したら dead に移す。戻すときに同じ session_id の新しいジョブが
+  pending にあれば、古いジョブは捨てる（新しいジョブが最新の状態を解析する）
+- 処理するジョブがなくなったら終了する（ロックを外した後にもう一度確認し、
+  その間に置かれたジョブがあれば続けて処理する）
+
+使用方法:
+    python3 feedback_spool.py [--feedback-dir DIR] enqueue < hook_input.json
+    python3 feedback_spool.py [--feedback-dir DIR] work [--hook stop_hook_collect.sh] [--once]
+    python3 feedback_spool.py [--feedback-dir DIR] status
+    python3 feedback_spool.py [--feedback-dir DIR] retry-dead
+
+依存: Python 3.x 標準ライブラリのみ（Unix 系のみ。fcntl を使用）
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_FEEDBACK_DIR = os.path.expanduser("~/.claude/feedback")
+DEFAULT_HOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stop_hook_collect.sh")
+
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECS = 15  # 1回目の失敗後 15 秒、2回目の後 30 秒…
+MAX_WAIT_SECS = 120  # バックオフ中のジョブをこの秒数までは待ってから終了する
+JOB_TIMEOUT_SECS = 600
+
+# ワーカーが付ける情報（hook の入力と区別するためのキー）
+META_KEY = "_spool"
+
+
+def job_key(job: dict) -> str:
+    """ジョブのファイル名（session_id ごとに1つ。なければトランスクリプトのファイル名）"""
+    key = job.get("session_id") or ""
+    if not key or key == "unknown":
+        key = os.path.splitext(os.path.basename(job.get("transcript_path") or ""))[0]
+    key = re.sub(r"[^A-Za-z0-9_.-]", "_", key).lstrip(".")
+    return key or "unknown"
+
+
+class Spool:
+    def __init__(self, feedback_dir: str = DEFAULT_FEEDBACK_DIR):
+        self.root = os.path.join(feedback_dir, ".spool")
+        self.pending_dir = os.path.join(self.root, "pending")
+        self.running_dir = os.path.join(self.root, "running")
+        self.dead_dir = os.path.join(self.root, "dead")
+        for path in (self.pending_dir, self.running_dir, self.dead_dir):
+            os.makedirs(path, exist_ok=True)
+
+    # ---------- 書き込み ----------
+
+    def _write(self, directory: str, name: str, job: dict) -> str:
+        """一時ファイルに書いてから rename で置く（同名のジョブは置き換わる）"""
+        fd, tmp = tempfile.mkstemp(prefix=".job-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False)
+            path = os.path.join(directory, name)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def enqueue(self, job: dict) -> str:
+        job = {k: v for k, v in job.items() if k != META_KEY}
+        return self._write(self.pending_dir, job_key(job) + ".json", job)
+
+    def _requeue(self, path: str, job: dict) -> bool:
+        """running のジョブを pending に戻す。同じ key の新しいジョブがあれば戻さずに捨てる"""
+        name = os.path.basename(path).rsplit(".", 1)[0]  # <key>.json.<pid> → <key>.json
+        staged = self._write(self.running_dir, f".requeue-{name}", job)
+        try:
+            # link は置き換えない（間に置かれた新しいジョブを上書きしない）
+            os.link(staged, os.path.join(self.pending_dir, name))
+            requeued = True
+        except FileExistsError:
+            requeued = False
+        finally:
+            os.unlink(staged)
+        os.unlink(path)
+        return requeued
+
+    # ---------- 取り出し ----------
+
+    def pending(self) -> List[Tuple[float, str]]:
+        """(実行可能になる時刻, パス) を古い順に"""
+        jobs = []
+        for name in os.listdir(self.pending_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.pending_dir, name)
+            try:
+                mtime = os.stat(path).st_mtime
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f).get(META_KEY) or {}
+            except (OSError, ValueError, AttributeError):
+                continue
+            jobs.append((float(meta.get("not_before", 0)), mtime, path))
+        jobs.sort(key=lambda j: (j[0], j[1]))
+        return [(not_before, path) for not_before, _, path in jobs]
+
+    def claim(self, path: str) -> Optional[Tuple[str, dict]]:
+        """pending のジョブを running に rename して読む（他のワーカーが先に取れば None）"""
+        running = os.path.join(self.running_dir, f"{os.path.basename(path)}.{os.getpid()}")
+        try:
+            os.rename(path, running)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(running, "r", encoding="utf-8") as f:
+                job = json.load(f)
+            if not isinstance(job, dict):
+                raise ValueError("job is not an object")
+        except (OSError, ValueError) as e:
+            self._bury(running, {"raw": True}, f"unreadable job: {e}")
+            return None
+        return running, job
+
+    def complete(self, running: str) -> None:
+        os.unlink(running)
+
+    def fail(self, running: str, job: dict, error: str, now: Optional[float] = None) -> str:
+        """失敗を記録して pending に戻すか dead に移す。"retry" / "superseded" / "dead" を返す"""
+        now = time.time() if now is None else now
+        meta = dict(job.get(META_KEY) or {})
+        meta["attempts"] = int(meta.get("attempts", 0)) + 1
+        meta["last_error"] = error[-2000:]
+        job = {**job, META_KEY: meta}
+        if meta["attempts"] >= MAX_ATTEMPTS:
+            self._bury(running, job, error)
+            return "dead"
+        meta["not_before"] = now + RETRY_BASE_SECS * 2 ** (meta["attempts"] - 1)
+        return "retry" if self._requeue(running, job) else "superseded"
+
+    def _bury(self, running: str, job: dict, error: str) -> None:
+        name = os.path.basename(running).split(".json")[0]
+        meta = dict(job.get(META_KEY) or {})
+        meta["last_error"] = error[-2000:]
+        self._write(self.dead_dir, f"{name}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.json", {**job, META_KEY: meta})
+        os.unlink(running)
+
+    def recover(self) -> int:
+        """
+        running に残っているジョブを失敗として扱う（ワーカーのロックを持っているときだけ呼ぶ）。
+        ワーカーごと落ちるジョブも MAX_ATTEMPTS 回で dead に移る
+        """
+        recovered = 0
+        for name in os.listdir(self.running_dir):
+            path = os.path.join(self.running_dir, name)
+            if name.startswith("."):
+                os.unlink(path)  # 書きかけの一時ファイル
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                job = None
+            if not isinstance(job, dict):
+                self._bury(path, {"raw": True}, "unreadable job")
+                continue
+            self.fail(path, job, "worker exited during the job")
+            recovered += 1
+        return recovered
+
+    def retry_dead(self) -> int:
+        count = 0
+        for name in sorted(os.listdir(self.dead_dir)):
+            path = os.path.join(self.dead_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(job, dict) and not job.get("raw"):
+                self.enqueue(job)
+                os.unlink(path)
+                count += 1
+        return count
+
+    def counts(self) -> dict:
+        return {
+            "pending": sum(1 for n in os.listdir(self.pending_dir) if n.endswith(".json")),
+            "running": sum(1 for n in os.listdir(self.running_dir) if not n.startswith(".")),
+            "dead": sum(1 for n in os.listdir(self.dead_dir) if n.endswith(".json")),
+        }
+
+    # ---------- ワーカー ----------
+
+    def _lock(self) -> Optional[int]:
+        fd = os.open(os.path.join(self.root, "worker.lock"), os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _drain(self, processor: Callable[[dict], Tuple[bool, str]], once: bool, max_wait: float, stats: dict) -> None:
+        while True:
+            jobs = self.pending()
+            if not jobs:
+                return
+            not_before, path = jobs[0]
+            wait = not_before - time.time()
+            if wait > 0:
+                # バックオフ中のジョブしかない
+                if once or wait > max_wait:
+                    return
+                time.sleep(wait)
+                continue
+            claimed = self.claim(path)
+            if claimed is None:
+                continue
+            running, job = claimed
+            try:
+                ok, error = processor({k: v for k, v in job.items() if k != META_KEY})
+            except Exception as e:  # noqa: BLE001 - 処理側の例外も失敗として再試行する
+                ok, error = False, f"{type(e).__name__}: {e}"
+            if ok:
+                self.complete(running)
+                stats["done"] += 1
+            else:
+                stats[self.fail(running, job, error)] += 1
+            if once:
+                return
+
+    def work(
+        self, processor: Callable[[dict], Tuple[bool, str]], once: bool = False, max_wait: float = MAX_WAIT_SECS
+    ) -> Optional[dict]:
+        """ジョブがなくなるまで処理する（別のワーカーが動いていれば何もせず None）"""
+        stats = {"done": 0, "retry": 0, "superseded": 0, "dead": 0}
+        lock_fd = self._lock()
+        if lock_fd is None:
+            return None
+        while True:
+            try:
+                self.recover()
+                self._drain(processor, once, max_wait, stats)
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            # ロックを外すまでの間に置かれたジョブは、新しく起動したワーカーか自分が拾う
+            if once or not any(not_before <= time.time() for not_before, _ in self.pending()):
+                break
+            if not _try_lock(lock_fd):
+                break
+        os.close(lock_fd)
+        return stats
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def hook_processor(hook: str, timeout: float = JOB_TIMEOUT_SECS) -> Callable[[dict], Tuple[bool, str]]:
+    """hook スクリプトを --process で実行するプロセッサ（終了コード 0 なら成功）"""
+
+    def process(job: dict) -> Tuple[bool, str]:
+        try:
+            result = subprocess.run(
+                ["bash", hook, "--process"],
+                input=json.dumps(job, ensure_ascii=False),
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return False, f"timed out after {timeout:g}s"
+        except OSError as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, f"exit status {result.returncode}: {result.stderr.strip()}"
+        return True, ""
+
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stop hook のフィードバック収集ジョブのスプールとワーカー")
+    parser.add_argument("--feedback-dir", default=DEFAULT_FEEDBACK_DIR, help="フィードバックディレクトリ")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("enqueue", help="標準入力の hook 入力 JSON をジョブとして置く")
+    work_parser = subparsers.add_parser("work", help="ジョブがなくなるまで処理する")
+    work_parser.add_argument("--hook", default=DEFAULT_HOOK, help="--process で実行する hook スクリプト")
+    work_parser.add_argument("--once", action="store_true", help="1件だけ処理する（バックオフ中なら待たない）")
+    subparsers.add_parser("status", help="「pending running dead」の件数を出力")
+    subparsers.add_parser("retry-dead", help="dead のジョブを pending に戻す")
+
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.error("command is required")
+
+    spool = Spool(args.feedback_dir)
+    if args.command == "enqueue":
+        try:
+            job = json.load(sys.stdin)
+        except ValueError as e:
+            print(f"Error: hook 入力を読めません: {e}", file=sys.stderr)
+            return 1
+        if not isinstance(job, dict):
+            print("Error: hook 入力が JSON オブジェクトではありません", file=sys.stderr)
+            return 1
+        print(spool.enqueue(job))
+    elif args.command == "work":
+        stats = spool.work(hook_processor(os.path.abspath(args.hook)), once=args.once)
+        if stats is None:
+            print("another worker is running", file=sys.stderr)
+        else:
+            print(" ".join(f"{k}={v}" for k, v in stats.items()), file=sys.stderr)
+    elif args.command == "status":
+        counts = spool.counts()
+        print(f"{counts['pending']} {counts['running']} {counts['dead']}")
+    elif args.command == "retry-dead":
+        print(f"requeued: {spool.retry_dead()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
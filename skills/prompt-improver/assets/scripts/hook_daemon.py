@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+hook_daemon.py - Stop / SessionStart hook 用の常駐ワーカー（任意）
+
+hook のたびに python3 を起動し直すと、インタプリタの起動・モジュールの import・
+CORRECTION_PATTERNS などの正規表現のコンパイル・キーワードインデックスの読み込みを
+毎回やり直すことになる。常駐ワーカーはこれらを読み込んだ状態でローカルの Unix ソケットで待ち、
+hook からはコマンドライン（と cwd・関係する環境変数）だけを送って結果を受け取る。
+
+    python3 -S hook_daemon.py run <script> [args...]
+
+- ワーカーは任意（PROMPT_IMPROVER_DAEMON=1 のときだけ使う）。既定では run は常にスクリプトを直接実行し、
+  start は何もしない
+- <script> は transcript_scanner.py / extract_transcript.py / feedback_index.py のいずれか。
+  ワーカーがそのスクリプトの main() を同じ引数で実行し、標準出力・標準エラー・終了コードを返す
+  （直接実行した場合と同じ結果）。-S で site を読まないので、クライアント側の起動は軽い。
+  ID の採番（id_allocator.py）のように実行するたびに結果が変わるものはワーカーに載せない
+- ワーカーが動いていなければ、バックグラウンドで起動してから今回はスクリプトを直接実行する
+  （exec で置き換えるので、出力・終了コードは従来どおり）
+- ワーカーは IDLE_TIMEOUT 秒リクエストがなければ終了する。スクリプトが更新された・
+  hook の環境変数（HOME / TRANSCRIPT_SCAN_* / FEEDBACK_* など）が起動時と違う場合は、
+  実行せずに「再起動」を返して終了し、クライアントは直接実行に切り替える（次の呼び出しで新しいワーカーが起動する）
+- 直接実行に切り替えるのは、リクエストがワーカーに届いていない（接続・送信に失敗した）か、
+  ワーカーが実行せずに断った場合だけ。送った後に応答が途切れた・タイムアウトした場合は、
+  ワーカーが実行済みかもしれないので二重に実行せず、終了コード 1 で失敗を返す
+
+チェックポイント・インデックスはディスク上のものをそのまま使う（hurikaeri や直接実行と共有するため）。
+ソケットは所有者だけが読み書きできるディレクトリに置き（やりとりは marshal。json より import が軽い）、
+実行できるのは上の3スクリプトだけ。
+
+使用方法:
+    python3 -S hook_daemon.py run transcript_scanner.py hook-vars <transcript.jsonl>
+    python3 -S hook_daemon.py start    # 動いていなければ起動（SessionStart hook 用。何も出力しない。PROMPT_IMPROVER_DAEMON=1 のときだけ）
+    python3 -S hook_daemon.py status   # 動いていれば pid を表示（終了コード 0）
+    python3 -S hook_daemon.py stop
+    python3 hook_daemon.py serve [--idle-timeout SECS]   # フォアグラウンドで起動
+
+依存: Python 3.x 標準ライブラリのみ（Unix 系のみ。fcntl / AF_UNIX を使用）
+"""
+
+import _socket  # socket / json は import が重い（enum / re を伴う）のでクライアントでは読み込まない
+import marshal
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "PROMPT_IMPROVER_DAEMON_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".claude", "cache", "hook-daemon", "hook-daemon.sock"),
+)
+IDLE_TIMEOUT = 600  # 秒
+CONNECT_TIMEOUT = 0.5  # 秒（接続できなければ直接実行）
+REQUEST_TIMEOUT = 60  # 秒（初回の大きなトランスクリプトの解析を含む）
+MAX_REQUEST_BYTES = 1 << 20
+PROTOCOL_VERSION = 1
+
+# ワーカーで実行できるスクリプト → モジュール名
+COMMANDS = {
+    "transcript_scanner.py": "transcript_scanner",
+    "extract_transcript.py": "extract_transcript",
+    "feedback_index.py": "feedback_index",
+}
+
+# ワーカー起動時と同じでなければならない環境変数（モジュールの import 時に読むもの）
+ENVIRONMENT_KEYS = ("HOME", "XDG_CACHE_HOME", "LANG", "LC_ALL", "PYTHONHASHSEED")
+ENVIRONMENT_PREFIXES = ("TRANSCRIPT_SCAN_", "FEEDBACK_", "PROMPT_IMPROVER_")
+
+
+def daemon_enabled() -> bool:
+    return os.environ.get("PROMPT_IMPROVER_DAEMON", "0") == "1"
+
+
+def hook_environment() -> dict:
+    return {
+        key: value
+        for key, value in os.environ.items()
+        if key in ENVIRONMENT_KEYS or key.startswith(ENVIRONMENT_PREFIXES)
+    }
+
+
+# ===============================
+# クライアント（hook から -S で起動する。重いモジュールは import しない）
+# ===============================
+
+def _connect(socket_path: str, timeout: float):
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _send(sock, request: dict) -> None:
+    sock.sendall(marshal.dumps(request))
+    sock.shutdown(_socket.SHUT_WR)
+
+
+def _exchange(sock, request: dict) -> dict:
+    _send(sock, request)
+    return marshal.loads(_receive(sock))
+
+
+def _receive(sock, limit: int = 0) -> bytes:
+    """相手が送信を終える（EOF）まで読む。limit を超えたら打ち切る"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if limit and size > limit:
+            break
+    return b"".join(chunks)
+
+
+def spawn_daemon(socket_path: str) -> None:
+    """ワーカーをセッションから切り離して起動する（起動を待たない）"""
+    import subprocess
+
+    # クライアントは -S で動いているが、ワーカーは site-packages（orjson / numpy）も使う
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve", "--socket", socket_path],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        close_fds=True,
+    )
+
+
+def _exec_directly(script: str, args: list) -> None:
+    """スクリプトを直接実行する（プロセスを置き換えるので戻らない）"""
+    path = os.path.join(SCRIPT_DIR, script)
+    os.execv(sys.executable, [sys.executable, path, *args])
+
+
+def run(script: str, args: list, socket_path: str = DEFAULT_SOCKET_PATH) -> int:
+    """ワーカーで実行する（リクエストが届かなければ起動を頼んで直接実行）"""
+    if script not in COMMANDS:
+        print(f"Error: unknown script: {script}", file=sys.stderr)
+        return 2
+    if not daemon_enabled():
+        _exec_directly(script, args)
+
+    try:
+        sock = _connect(socket_path, CONNECT_TIMEOUT)
+    except OSError:
+        try:
+            spawn_daemon(socket_path)
+        except OSError:
+            pass
+        _exec_directly(script, args)
+
+    request = {
+        "version": PROTOCOL_VERSION,
+        "script": script,
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": hook_environment(),
+    }
+    try:
+        sock.settimeout(REQUEST_TIMEOUT)
+        _send(sock, request)
+    except (OSError, ValueError):
+        # 届いていない（ワーカーは実行していない）
+        sock.close()
+        _exec_directly(script, args)
+
+    try:
+        response = marshal.loads(_receive(sock))
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        # 届いた後に途切れた。ワーカーが実行済みかもしれないので直接実行し直さない
+        print(f"Error: no response from hook daemon ({e.__class__.__name__}): {script}", file=sys.stderr)
+        return 1
+    finally:
+        sock.close()
+
+    if not isinstance(response, dict):
+        print(f"Error: invalid response from hook daemon: {script}", file=sys.stderr)
+        return 1
+    if response.get("status") is None:
+        # ワーカーが実行せずに断った（スクリプトの更新・環境の違い・形式の違いで再起動待ち）
+        _exec_directly(script, args)
+    sys.stdout.buffer.write(response.get("stdout", "").encode("utf-8"))
+    sys.stdout.flush()
+    sys.stderr.buffer.write(response.get("stderr", "").encode("utf-8"))
+    sys.stderr.flush()
+    return int(response["status"])
+
+
+def start(socket_path: str = DEFAULT_SOCKET_PATH) -> int:
+    """動いていなければ起動する（PROMPT_IMPROVER_DAEMON=1 のときだけ）"""
+    if not daemon_enabled():
+        return 0
+    try:
+        _connect(socket_path, CONNECT_TIMEOUT).close()
+    except OSError:
+        try:
+            spawn_daemon(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+def control(op: str, socket_path: str = DEFAULT_SOCKET_PATH) -> int:
+    """status: pid を表示 / stop: 終了を頼む（動いていなければ終了コード 1）"""
+    try:
+        sock = _connect(socket_path, CONNECT_TIMEOUT)
+    except OSError:
+        print("not running", file=sys.stderr)
+        return 1
+    try:
+        sock.settimeout(REQUEST_TIMEOUT)
+        response = _exchange(sock, {"version": PROTOCOL_VERSION, "control": op})
+    except (OSError, EOFError, ValueError, TypeError):
+        print("no response", file=sys.stderr)
+        return 1
+    finally:
+        sock.close()
+    print(f"pid {response.get('pid')}, {response.get('served', 0)} requests")
+    return 0
+
+
+# ===============================
+# ワーカー
+# ===============================
+
+class _Capture:
+    """
+    sys.stdout / sys.stderr の差し替え先。モジュールの import 前に設定するので、
+    既定引数に束縛された sys.stdout（write_json の stream など）もリクエストごとの出力に書かれる。
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        import io
+        self._io = io
+        self.encoding = encoding
+        self.target = io.StringIO()
+
+    def begin(self) -> None:
+        self.target = self._io.StringIO()
+
+    def getvalue(self) -> str:
+        return self.target.getvalue()
+
+    def write(self, text: str) -> int:
+        return self.target.write(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+def _source_signature() -> dict:
+    """スクリプトの更新検出用（このディレクトリの .py の mtime）"""
+    signature = {}
+    for name in sorted(os.listdir(SCRIPT_DIR)):
+        if name.endswith(".py"):
+            try:
+                signature[name] = os.stat(os.path.join(SCRIPT_DIR, name)).st_mtime_ns
+            except OSError:
+                pass
+    return signature
+
+
+class HookDaemon:
+    def __init__(self, socket_path: str, idle_timeout: float):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.environment = hook_environment()
+        self.sources = _source_signature()
+        self.stdout = _Capture()
+        self.stderr = _Capture()
+        self.modules = {}
+        self.served = 0
+        self.stopping = False
+
+    def load(self) -> None:
+        """出力の差し替え後にモジュールを読み込み、検出器・キーワードインデックスを温めておく"""
+        import importlib
+
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        if SCRIPT_DIR not in sys.path:
+            sys.path.insert(0, SCRIPT_DIR)
+        for script, module_name in COMMANDS.items():
+            self.modules[script] = importlib.import_module(module_name)
+        transcript_rules = importlib.import_module("transcript_rules")
+        transcript_rules.get_correction_detector(
+            transcript_rules.CORRECTION_PATTERNS, transcript_rules.HIGH_SCORE_PATTERNS
+        )
+        transcript_rules.load_compiled_section_keywords()
+
+    def _execute(self, script: str, args: list, cwd: str) -> dict:
+        import traceback
+
+        module = self.modules[script]
+        self.stdout.begin()
+        self.stderr.begin()
+        saved_argv = sys.argv
+        sys.argv = [os.path.join(SCRIPT_DIR, script), *args]
+        status = 0
+        try:
+            os.chdir(cwd)
+            result = module.main()
+            status = result if isinstance(result, int) else 0
+        except SystemExit as e:
+            if e.code is None:
+                status = 0
+            elif isinstance(e.code, int):
+                status = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except Exception:  # noqa: BLE001 - 失敗はクライアントに終了コード 1 として返す
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.argv = saved_argv
+            os.chdir("/")
+        return {"status": status, "stdout": self.stdout.getvalue(), "stderr": self.stderr.getvalue()}
+
+    def handle(self, conn) -> None:
+        conn.settimeout(REQUEST_TIMEOUT)
+        data = _receive(conn, MAX_REQUEST_BYTES)
+        if _source_signature() != self.sources:
+            # スクリプトが更新された（やりとりの形式も変わっているかもしれない）ので、解釈せずに断って終了する。
+            # クライアントは直接実行し、次の呼び出しで新しいワーカーが起動する
+            self.stopping = True
+            conn.sendall(marshal.dumps({"status": None, "error": "restart"}))
+            return
+        try:
+            request = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            request = None
+        if not isinstance(request, dict) or request.get("version") != PROTOCOL_VERSION:
+            response = {"status": None, "error": "protocol"}
+        elif request.get("control") in ("status", "stop"):
+            self.stopping = request["control"] == "stop"
+            response = {"pid": os.getpid(), "served": self.served}
+        elif request.get("env") != self.environment:
+            # 違う環境では応答せずに終了する（同上）
+            self.stopping = True
+            response = {"status": None, "error": "restart"}
+        elif request.get("script") not in self.modules or not isinstance(request.get("args"), list):
+            response = {"status": 2, "stdout": "", "stderr": "Error: unknown script\n"}
+        else:
+            response = self._execute(request["script"], [str(a) for a in request["args"]], request.get("cwd") or "/")
+            self.served += 1
+        conn.sendall(marshal.dumps(response))
+
+    def serve(self) -> int:
+        import fcntl
+        import socket
+
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        # 同時に起動されても1つだけが動く
+        lock_fd = os.open(self.socket_path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(lock_fd)
+            return 0
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)  # 前のワーカーが残したもの（ロックを持っているのは自分だけ）
+            old_umask = os.umask(0o177)
+            try:
+                server.bind(self.socket_path)
+            finally:
+                os.umask(old_umask)
+            server.listen(16)
+            self.load()
+            server.settimeout(self.idle_timeout)
+            while not self.stopping:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    break
+                with conn:
+                    try:
+                        self.handle(conn)
+                    except OSError:
+                        pass
+        finally:
+            server.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            os.close(lock_fd)
+        return 0
+
+
+def main():
+    # クライアント側は argparse も読み込まない（hook の起動時間を抑える）
+    argv = sys.argv[1:]
+    socket_path = DEFAULT_SOCKET_PATH
+    if len(argv) >= 2 and argv[0] == "--socket":
+        socket_path, argv = argv[1], argv[2:]
+    command = argv[0] if argv else ""
+
+    if command == "run" and len(argv) >= 2:
+        return run(argv[1], argv[2:], socket_path)
+    if command == "start":
+        return start(socket_path)
+    if command in ("status", "stop"):
+        return control(command, socket_path)
+    if command == "serve":
+        import argparse
+
+        parser = argparse.ArgumentParser(description="hook 用の常駐ワーカー")
+        parser.add_argument("--socket", default=socket_path, help="Unix ソケットのパス")
+        parser.add_argument(
+            "--idle-timeout", type=float, default=IDLE_TIMEOUT, help="この秒数リクエストがなければ終了（既定: %(default)s）"
+        )
+        args = parser.parse_args(argv[1:])
+        return HookDaemon(args.socket, args.idle_timeout).serve()
+
+    print(__doc__.strip().split("使用方法:")[1].split("依存:")[0].rstrip(), file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1332 @@
+#!/usr/bin/env python3
+"""
+transcript_scanner.py - トランスクリプト JSONL の共通シングルパススキャナ
+
+各 JSONL エントリを1回だけデコードし、登録されたコレクタ
+（metrics / task_summary / skills / timeline / errors / corrections / linked_targets）に
+順に渡す。解析状態はトランスクリプトごとのチェックポイントに保存されるため、
+Stop hook（suggest_hurikaeri.sh / stop_hook_collect.sh）・extract_transcript.py・
+extract_session_trace.py は同じチェックポイントから追記分だけを解析する。
+
+使用方法:
+    python3 transcript_scanner.py hook-vars <transcript.jsonl> [--no-checkpoint]
+
+    Stop hook 用のメトリクスを shell 変数（KEY='value'）として出力する:
+    eval "$(python3 transcript_scanner.py hook-vars "$TRANSCRIPT_PATH")"
+
+依存: Python 3.x 標準ライブラリのみ（orjson があればデコードに使用）
+"""
+
+import argparse
+import copy
+import hashlib
+import heapq
+import json
+import os
+import re
+import shlex
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows など: ロックなしで動作
+    fcntl = None
+
+try:
+    import orjson  # 任意: インストールされていれば高速デコーダとして使う
+except ImportError:
+    orjson = None
+
+from keyword_matcher import SectionKeywordIndex
+from transcript_rules import (
+    DEFAULT_CACHE_DIR,
+    SESSION_CORRECTION_PATTERNS,
+    SESSION_HIGH_SCORE_PATTERNS,
+    compile_section_keywords,
+    detect_user_correction,
+    extract_keywords_from_text,
+    extract_text_from_content,
+    keywords_fingerprint,
+    load_compiled_section_keywords,
+    summarize_tool_input,
+)
+
+
+# ===============================
+# 設定
+# ===============================
+
+# チェックポイント形式のバージョン（コレクタの state 構造を変えたら上げる）
+SCANNER_VERSION = 2
+
+# 再開位置の検証に使う直前バイト数（ファイルの差し替え・切り詰め検出用）
+CHECKPOINT_TAIL_BYTES = 4096
+
+# この日数より古いチェックポイントは削除
+CHECKPOINT_MAX_AGE_DAYS = 7
+
+# ユーザー側のエントリ種別
+USER_TYPES = ("user", "human")
+
+# task_summary から除外するテキスト（system-reminder や hook 出力）
+TASK_SUMMARY_SKIP_PREFIXES = (
+    '<system-reminder>', '<command-', '<local-command-', '<task-notification>',
+    'Base directory for this skill:', 'This session is being continued',
+)
+
+COMMAND_NAME_RE = re.compile(r"<command-name>/([^<]+)</command-name>")
+
+# 事前フィルタ（どのコレクタも参照しない行のデコードを省略）の既定値
+# TRANSCRIPT_SCAN_PREFILTER=0 で無効化（結果比較用）
+DEFAULT_PREFILTER = os.environ.get("TRANSCRIPT_SCAN_PREFILTER", "1") != "0"
+
+# JSON デコーダ: auto（orjson があれば使用）/ json / orjson
+DEFAULT_JSON_BACKEND = os.environ.get("TRANSCRIPT_SCAN_JSON_BACKEND", "auto")
+
+# デコードを省略した行のエントリ種別（user / assistant 以外として扱う）
+SKIPPED_ENTRY_TYPE = "(skipped)"
+
+
+# ===============================
+# スキャンコンテキスト
+# ===============================
+
+class ScanContext:
+    """スキャン中のセッション状態（全コレクタで共有）"""
+
+    # ターン数え上げに必要なエントリを示すバイト列（エントリ種別の値）
+    decode_markers = (b'"user"', b'"human"', b'"assistant"')
+
+    # チェックポイントに保存するフィールド
+    PERSISTENT_FIELDS = (
+        "line_number", "turn_number", "user_turns", "assistant_turns",
+        "last_entry_type", "active_skill",
+    )
+
+    def __init__(self):
+        self.line_number = 0
+        self.turn_number = 0  # ユーザーターン番号（ユーザー発言ごとにインクリメント）
+        self.user_turns = 0
+        self.assistant_turns = 0
+        self.last_entry_type = None
+        self.active_skill = None
+
+        # 現在のエントリ（feed 中のみ有効）
+        self.entry = None
+        self.entry_type = None
+        self.content = []
+        self.skill_events: List[Tuple[str, str]] = []  # (source, skill_name)
+        self._text_cache = {}
+
+    def begin_entry(self, entry: dict) -> None:
+        """デコード済みエントリを現在のエントリとして設定し、共有状態を更新"""
+        self.entry = entry
+        self.entry_type = entry_type = entry.get("type")
+        message = entry.get("message", {})
+        self.content = content = message.get("content", []) if isinstance(message, dict) else []
+        self._text_cache = {}
+
+        # ターンカウント（種別が切り替わったときだけ数える）
+        if entry_type != self.last_entry_type:
+            if entry_type in USER_TYPES:
+                self.user_turns += 1
+                self.turn_number += 1
+            elif entry_type == "assistant":
+                self.assistant_turns += 1
+        self.last_entry_type = entry_type
+
+        # スキル使用（<command-name>/skill</command-name> と Skill ツール）
+        self.skill_events = []
+        if isinstance(content, str):
+            skill_match = COMMAND_NAME_RE.search(content)
+            if skill_match:
+                self.skill_events.append(("command", skill_match.group(1)))
+        elif entry_type == "assistant" and isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "tool_use" and item.get("name") == "Skill":
+                    skill_name = item.get("input", {}).get("skill", "")
+                    if skill_name:
+                        self.skill_events.append(("tool", skill_name))
+        if self.skill_events:
+            self.active_skill = self.skill_events[-1][1]
+
+    def text(self, include_tool_results: bool = True) -> str:
+        """現在のエントリのテキスト（エントリごとにキャッシュ）"""
+        cached = self._text_cache.get(include_tool_results)
+        if cached is None:
+            cached = extract_text_from_content(self.content, include_tool_results)
+            self._text_cache[include_tool_results] = cached
+        return cached
+
+    def get_state(self) -> dict:
+        return {field: getattr(self, field) for field in self.PERSISTENT_FIELDS}
+
+    def set_state(self, state: dict) -> None:
+        for field in self.PERSISTENT_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
+
+    def merge_state(self, state: dict, first_entry_type: Optional[str], entry_seen: bool) -> Tuple[int, int]:
+        """直後のチャンクを単独で解析したコンテキストを結合する（並列スキャン用）
+
+        チャンクは直前のエントリ種別を知らずに解析するため、先頭エントリが前のチャンクの
+        最後のエントリと同じ種別なら、そこで数えたターンを取り消す。
+
+        Returns:
+            (line_offset, turn_offset) チャンク内の番号に足すと全体の番号になる値
+        """
+        repeated = entry_seen and first_entry_type == self.last_entry_type
+        adjust_user = 1 if repeated and first_entry_type in USER_TYPES else 0
+        adjust_assistant = 1 if repeated and first_entry_type == "assistant" else 0
+
+        line_offset = self.line_number
+        turn_offset = self.turn_number - adjust_user
+        self.line_number += state["line_number"]
+        self.turn_number += state["turn_number"] - adjust_user
+        self.user_turns += state["user_turns"] - adjust_user
+        self.assistant_turns += state["assistant_turns"] - adjust_assistant
+        if entry_seen:
+            self.last_entry_type = state["last_entry_type"]
+        if state["active_skill"] is not None:
+            self.active_skill = state["active_skill"]
+        return line_offset, turn_offset
+
+
+# ===============================
+# コレクタ
+# ===============================
+
+class Collector:
+    """コレクタの基底クラス
+
+    feed_raw は全行（デコード前のバイト列）、feed はデコードに成功した
+    エントリごとに呼ばれる。get_state / set_state はチェックポイント用で、
+    JSON 化できる値だけを返すこと。
+
+    decode_markers は「このいずれも含まない行は、本文のないエントリとして扱ってよい」
+    ことを示すバイト列。None は全行のデコードが必要（事前フィルタを無効化）。
+
+    LIMITS はリストごとの保持件数の上限（上限名 → 既定値）。上限を超えた分は
+    件数だけ数えて中身は保持しないため、メモリ使用量はトランスクリプトの長さに依存しない。
+    上限名は全コレクタで共通（default_collectors の limits で一括指定）。
+    """
+
+    name = ""
+    decode_markers: Optional[Tuple[bytes, ...]] = None
+    LIMITS: Dict[str, int] = {}
+
+    def configure_limits(self, limits: Optional[dict] = None) -> None:
+        """保持件数の上限を設定（未指定の上限は LIMITS の既定値）"""
+        limits = limits or {}
+        self.limits = {key: max(0, int(limits.get(key, default))) for key, default in self.LIMITS.items()}
+
+    def limit_signature(self) -> str:
+        limits = getattr(self, "limits", {})
+        return ",".join(f"{key}={limits[key]}" for key in sorted(limits))
+
+    def signature(self) -> str:
+        """チェックポイント互換性の判定に使う識別子（設定が変わったら変える）"""
+        limits = self.limit_signature()
+        return f"{self.name}:{limits}" if limits else self.name
+
+    def feed_raw(self, raw: bytes, ctx: ScanContext) -> None:
+        pass
+
+    def feed(self, ctx: ScanContext) -> None:
+        pass
+
+    def get_state(self) -> dict:
+        state = dict(vars(self))
+        state.pop("limits", None)
+        return state
+
+    def set_state(self, state: dict) -> None:
+        vars(self).update(state)
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        """直後のチャンクを単独で解析した state を結合する（並列スキャン用）
+
+        self はそれまでのチャンクを結合した状態。line_offset / turn_offset は
+        チャンク内の行番号・ターン番号を全体の番号に直すための加算値。
+        """
+        raise NotImplementedError(f"{self.name} collector cannot be merged")
+
+
+class MetricsCollector(Collector):
+    """Stop hook 用の行ベースメトリクス（従来の wc -l / grep -c と同じ数え方）"""
+
+    name = "metrics"
+    # デコード済みエントリは参照しない
+    decode_markers = ()
+
+    TOOL_USE_MARK = b'"tool_use"'
+    CODE_CHANGE_RE = re.compile(rb'"(?:Write|Edit|Bash)"')
+    ERROR_MARK = b'"is_error":true'
+    # 空白を許容するパターン（"type" : "tool_use" なども数える）
+    TYPED_TOOL_USE_RE = re.compile(rb'"type"\s*:\s*"tool_use"')
+    WRITE_EDIT_RE = re.compile(rb'"name"\s*:\s*"(?:Write|Edit)"')
+    TYPED_ERROR_RE = re.compile(rb'"is_error"\s*:\s*true')
+
+    def __init__(self):
+        self.newline_count = 0  # wc -l 相当
+        self.tool_use_lines = 0
+        self.code_change_lines = 0
+        self.error_lines = 0
+        self.typed_tool_use_lines = 0
+        self.write_edit_lines = 0
+        self.typed_error_lines = 0
+
+    def feed_raw(self, raw: bytes, ctx: ScanContext) -> None:
+        if raw.endswith(b"\n"):
+            self.newline_count += 1
+        if self.TOOL_USE_MARK in raw:
+            self.tool_use_lines += 1
+        if self.CODE_CHANGE_RE.search(raw):
+            self.code_change_lines += 1
+        if self.ERROR_MARK in raw:
+            self.error_lines += 1
+        if self.TYPED_TOOL_USE_RE.search(raw):
+            self.typed_tool_use_lines += 1
+        if self.WRITE_EDIT_RE.search(raw):
+            self.write_edit_lines += 1
+        if self.TYPED_ERROR_RE.search(raw):
+            self.typed_error_lines += 1
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        for field, value in state.items():
+            setattr(self, field, getattr(self, field) + value)
+
+
+class TaskSummaryCollector(Collector):
+    """最初の実質的なユーザー発言（task_summary 推定用）"""
+
+    name = "task_summary"
+    decode_markers = (b'"user"', b'"human"')
+
+    def __init__(self):
+        self.summary = None
+
+    def feed(self, ctx: ScanContext) -> None:
+        if self.summary is not None or ctx.entry_type not in USER_TYPES:
+            return
+        content = ctx.content
+        if isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "text":
+                    text = item.get("text", "")
+                    if isinstance(text, str) and text.strip() and not text.startswith(TASK_SUMMARY_SKIP_PREFIXES):
+                        self.summary = text[:100]
+                        return
+        elif isinstance(content, str) and content.strip():
+            if not content.startswith(TASK_SUMMARY_SKIP_PREFIXES):
+                self.summary = content[:100]
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        if self.summary is None:
+            self.summary = state["summary"]
+
+
+class SkillUsageCollector(Collector):
+    """スキル使用（<command-name> と Skill ツール）"""
+
+    name = "skills"
+    decode_markers = (b"<command-name>", b'"Skill"')
+
+    def __init__(self):
+        self.skills = {}  # name -> {"count", "first_line", "last_line"}（両方のソース）
+        self.tool_counts = {}  # name -> count（Skill ツールのみ）
+
+    def feed(self, ctx: ScanContext) -> None:
+        for source, skill_name in ctx.skill_events:
+            usage = self.skills.setdefault(
+                skill_name, {"count": 0, "first_line": None, "last_line": None}
+            )
+            if usage["first_line"] is None:
+                usage["first_line"] = ctx.line_number
+            usage["last_line"] = ctx.line_number
+            usage["count"] += 1
+            if source == "tool":
+                self.tool_counts[skill_name] = self.tool_counts.get(skill_name, 0) + 1
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        # dict の挿入順（初出順）は前のチャンクから順に結合すれば直列と同じ
+        for skill_name, chunk_usage in state["skills"].items():
+            usage = self.skills.get(skill_name)
+            if usage is None:
+                self.skills[skill_name] = {
+                    "count": chunk_usage["count"],
+                    "first_line": chunk_usage["first_line"] + line_offset,
+                    "last_line": chunk_usage["last_line"] + line_offset,
+                }
+            else:
+                usage["count"] += chunk_usage["count"]
+                usage["last_line"] = chunk_usage["last_line"] + line_offset
+        for skill_name, count in state["tool_counts"].items():
+            self.tool_counts[skill_name] = self.tool_counts.get(skill_name, 0) + count
+
+
+class ToolTimelineCollector(Collector):
+    """ツール使用の時系列・検索パス・ファイル変更"""
+
+    name = "timeline"
+    decode_markers = (b'"tool_use"', b'"is_error"', b'"tool_result"')
+
+    LIMITS = {
+        "tool_timeline": 100,
+        "search_paths": 50,
+        "changed_files": 50,
+        "unique_changed": 30,
+        "edit_turns": 50,  # ファイルごとに記録する編集ターン数
+    }
+
+    def __init__(self, limits: Optional[dict] = None, chunk_mode: bool = False):
+        self.configure_limits(limits)
+        # チャンク単独の解析（並列スキャン）では、前のチャンクのツール使用を参照する
+        # tool_result を解決できないため pending_results に記録して結合時に解決する
+        self.chunk_mode = chunk_mode
+        if chunk_mode:
+            self.in_flight = set()  # このチャンクで開始し結果が未着の tool_use_id（保持有無を問わない）
+            self.pending_results = []  # [tool_use_id, is_error, その時点の tool_use_count]
+        self.tool_timeline = []  # 先頭 N 件（件数は tool_use_count）
+        self.search_paths = []  # 先頭 N 件（件数は search_count）
+        self.search_count = 0
+        self.changed_files = []  # Write/Edit の先頭 N 件（件数は changed_file_count）
+        self.changed_file_count = 0
+        self.unique_changed = []  # ファイルごとの最初の変更（件数は len(file_edit_counts)）
+        self.file_edit_counts = {}  # backtrack 検出用（全ファイルの正確な編集回数）
+        self.file_edit_turns = {}
+        self.tool_use_count = 0
+        self.unique_tools = set()
+        # 未解決の tool_use_id → tool_timeline のインデックス（エラー紐付け用）
+        # 保持しているエントリのみ登録し、tool_result で解決したら削除する
+        self.tool_use_id_map = {}
+
+    def feed(self, ctx: ScanContext) -> None:
+        content = ctx.content
+        if not isinstance(content, list):
+            return
+
+        if ctx.entry_type == "assistant":
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "tool_use":
+                    self._record_tool_use(item, ctx)
+
+        elif ctx.entry_type in USER_TYPES:
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "tool_result":
+                    result_tool_use_id = item.get("tool_use_id", "")
+                    is_error = bool(item.get("is_error")) and isinstance(item.get("content", ""), str)
+                    if self.chunk_mode:
+                        self._resolve_chunk_result(result_tool_use_id, is_error)
+                        continue
+                    # 解決済みのペアは以降参照しないので削除（マップは未解決分だけ）
+                    index = self.tool_use_id_map.pop(result_tool_use_id, None) if result_tool_use_id else None
+                    if is_error:
+                        self._mark_failed(index)
+
+    def _mark_failed(self, index: Optional[int]) -> None:
+        # tool_use_id で正確にツール使用を紐付け
+        if index is not None:
+            self.tool_timeline[index]["success"] = False
+        elif self.tool_timeline and len(self.tool_timeline) == self.tool_use_count:
+            # フォールバック: tool_use_id がない場合は直前に紐付け
+            # （直前のツール使用が上限超過で保持されていなければ対象なし）
+            self.tool_timeline[-1]["success"] = False
+
+    def _resolve_chunk_result(self, result_tool_use_id: str, is_error: bool) -> None:
+        if result_tool_use_id and result_tool_use_id in self.in_flight:
+            # このチャンク内のツール使用: 直列と同じく解決
+            self.in_flight.discard(result_tool_use_id)
+            index = self.tool_use_id_map.pop(result_tool_use_id, None)
+            if is_error and index is not None:
+                self.tool_timeline[index]["success"] = False
+        elif result_tool_use_id or not self.tool_use_count:
+            # 前のチャンクのツール使用（または未知の ID）、もしくはチャンク先頭の ID なしエラー
+            if result_tool_use_id or is_error:
+                self.pending_results.append([result_tool_use_id, is_error, self.tool_use_count])
+        elif is_error:
+            self._mark_failed(None)
+
+    def _record_tool_use(self, item: dict, ctx: ScanContext) -> None:
+        tool_name = item.get("name", "")
+        tool_input = item.get("input", {})
+        self.tool_use_count += 1
+        self.unique_tools.add(tool_name)
+
+        tool_use_id = item.get("id", "")
+        if self.chunk_mode and tool_use_id:
+            self.in_flight.add(tool_use_id)
+        if len(self.tool_timeline) < self.limits["tool_timeline"]:
+            input_summary = summarize_tool_input(tool_name, tool_input)
+            self.tool_timeline.append({
+                "turn": ctx.turn_number,
+                "line": ctx.line_number,
+                "tool": tool_name,
+                "input_summary": input_summary[:100],
+                "success": True,  # デフォルト、後でエラーで上書き
+            })
+            if tool_use_id:
+                self.tool_use_id_map[tool_use_id] = len(self.tool_timeline) - 1
+
+        # 検索パスの記録
+        if tool_name in ("Grep", "Glob", "Read"):
+            self.search_count += 1
+            if len(self.search_paths) < self.limits["search_paths"]:
+                self.search_paths.append({
+                    "turn": ctx.turn_number,
+                    "tool": tool_name,
+                    "path": tool_input.get("file_path", tool_input.get("path", "")),
+                    "pattern": tool_input.get("pattern", ""),
+                })
+
+        # ファイル変更の記録
+        if tool_name in ("Write", "Edit"):
+            file_path = tool_input.get("file_path", "")
+            if file_path:
+                change = {
+                    "path": file_path,
+                    "op": "write" if tool_name == "Write" else "edit",
+                    "via": tool_name,
+                    "turn": ctx.turn_number,
+                    "line": ctx.line_number,
+                }
+                self.changed_file_count += 1
+                if len(self.changed_files) < self.limits["changed_files"]:
+                    self.changed_files.append(change)
+                if file_path not in self.file_edit_counts:
+                    if len(self.unique_changed) < self.limits["unique_changed"]:
+                        self.unique_changed.append(change)
+                self.file_edit_counts[file_path] = self.file_edit_counts.get(file_path, 0) + 1
+                turns = self.file_edit_turns.setdefault(file_path, [])
+                if len(turns) < self.limits["edit_turns"]:
+                    turns.append(ctx.turn_number)
+
+    def get_state(self) -> dict:
+        state = super().get_state()
+        state.pop("chunk_mode", None)
+        state.pop("in_flight", None)
+        state["unique_tools"] = sorted(self.unique_tools)
+        return state
+
+    def set_state(self, state: dict) -> None:
+        vars(self).update(state)
+        self.unique_tools = set(state.get("unique_tools", []))
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        limits = self.limits
+        before = self.tool_use_count
+
+        for t in state["tool_timeline"]:
+            if len(self.tool_timeline) >= limits["tool_timeline"]:
+                break
+            self.tool_timeline.append({**t, "turn": t["turn"] + turn_offset, "line": t["line"] + line_offset})
+
+        # 前のチャンクのツール使用を参照する tool_result を直列と同じ規則で解決
+        for result_tool_use_id, is_error, local_count in state.get("pending_results", []):
+            index = self.tool_use_id_map.pop(result_tool_use_id, None) if result_tool_use_id else None
+            if not is_error:
+                continue
+            if index is not None:
+                self.tool_timeline[index]["success"] = False
+            else:
+                # その時点の直前のツール使用（全体の通し番号）が保持されていれば紐付け
+                last = before + local_count
+                if 0 < last <= limits["tool_timeline"]:
+                    self.tool_timeline[last - 1]["success"] = False
+
+        for tool_use_id, index in state["tool_use_id_map"].items():
+            if before + index < limits["tool_timeline"]:
+                self.tool_use_id_map[tool_use_id] = before + index
+        self.tool_use_count += state["tool_use_count"]
+        self.unique_tools.update(state["unique_tools"])
+
+        for sp in state["search_paths"]:
+            if len(self.search_paths) >= limits["search_paths"]:
+                break
+            self.search_paths.append({**sp, "turn": sp["turn"] + turn_offset})
+        self.search_count += state["search_count"]
+
+        for cf in state["changed_files"]:
+            if len(self.changed_files) >= limits["changed_files"]:
+                break
+            self.changed_files.append({**cf, "turn": cf["turn"] + turn_offset, "line": cf["line"] + line_offset})
+        self.changed_file_count += state["changed_file_count"]
+
+        # チャンク内の初出ファイルのうち、前のチャンクに出ていないものが全体の初出
+        for cf in state["unique_changed"]:
+            if len(self.unique_changed) >= limits["unique_changed"]:
+                break
+            if cf["path"] not in self.file_edit_counts:
+                self.unique_changed.append(
+                    {**cf, "turn": cf["turn"] + turn_offset, "line": cf["line"] + line_offset}
+                )
+        for file_path, count in state["file_edit_counts"].items():
+            self.file_edit_counts[file_path] = self.file_edit_counts.get(file_path, 0) + count
+            turns = self.file_edit_turns.setdefault(file_path, [])
+            room = limits["edit_turns"] - len(turns)
+            if room > 0:
+                turns.extend(turn + turn_offset for turn in state["file_edit_turns"][file_path][:room])
+
+
+class ErrorCollector(Collector):
+    """ツール実行エラー（tool_result の is_error）"""
+
+    name = "errors"
+    decode_markers = (b'"is_error"',)
+
+    LIMITS = {"errors": 20}
+
+    def __init__(self, limits: Optional[dict] = None):
+        self.configure_limits(limits)
+        self.errors = []  # 先頭 N 件（件数は error_count）
+        self.error_count = 0
+
+    def feed(self, ctx: ScanContext) -> None:
+        if ctx.entry_type not in USER_TYPES or not isinstance(ctx.content, list):
+            return
+        for item in ctx.content:
+            if isinstance(item, dict) and item.get("type") == "tool_result" and item.get("is_error"):
+                error_content = item.get("content", "")
+                if isinstance(error_content, str):
+                    self.error_count += 1
+                    if len(self.errors) < self.limits["errors"]:
+                        self.errors.append({
+                            "line": ctx.line_number,
+                            "turn": ctx.turn_number,
+                            "message": error_content[:200],
+                        })
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        for err in state["errors"][:max(0, self.limits["errors"] - len(self.errors))]:
+            self.errors.append({**err, "line": err["line"] + line_offset, "turn": err["turn"] + turn_offset})
+        self.error_count += state["error_count"]
+
+
+class CorrectionCollector(Collector):
+    """ユーザー修正指示（tool_result と system-reminder を除いたユーザー発言のみ）"""
+
+    name = "corrections"
+    decode_markers = (b'"user"', b'"human"')
+
+    LIMITS = {"corrections": 10}
+
+    def __init__(
+        self,
+        patterns: Optional[dict] = None,
+        high_score_patterns: Optional[set] = None,
+        limits: Optional[dict] = None,
+    ):
+        self.patterns = patterns if patterns is not None else SESSION_CORRECTION_PATTERNS
+        self.high_score_patterns = (
+            high_score_patterns if high_score_patterns is not None else SESSION_HIGH_SCORE_PATTERNS
+        )
+        self.configure_limits(limits)
+        self.corrections = []  # 先頭 N 件（件数は correction_count）
+        self.correction_count = 0
+
+    def signature(self) -> str:
+        return (
+            f"{self.name}:{','.join(self.patterns)}:{','.join(sorted(self.high_score_patterns))}"
+            f":{self.limit_signature()}"
+        )
+
+    def feed(self, ctx: ScanContext) -> None:
+        if ctx.entry_type not in USER_TYPES:
+            return
+        # tool_result を除外してユーザーのテキストのみ抽出（誤検出防止）
+        user_text = ctx.text(include_tool_results=False)
+        # system-reminder を除外
+        if user_text.startswith("<system-reminder>"):
+            return
+        correction = detect_user_correction(user_text, self.patterns, self.high_score_patterns)
+        if correction:
+            self.correction_count += 1
+            if len(self.corrections) < self.limits["corrections"]:
+                self.corrections.append({
+                    "turn": ctx.turn_number,
+                    "line": ctx.line_number,
+                    "excerpt": correction["excerpt"],
+                    "patterns": correction["patterns"],
+                    "score": correction["score"],
+                })
+
+    def get_state(self) -> dict:
+        return {"corrections": self.corrections, "correction_count": self.correction_count}
+
+    def set_state(self, state: dict) -> None:
+        self.corrections = state.get("corrections", [])
+        self.correction_count = state.get("correction_count", len(self.corrections))
+
+    def merge_state(self, state: dict, line_offset: int, turn_offset: int) -> None:
+        for item in state["corrections"][:max(0, self.limits["corrections"] - len(self.corrections))]:
+            self.corrections.append({**item, "line": item["line"] + line_offset, "turn": item["turn"] + turn_offset})
+        self.correction_count += state["correction_count"]
+
+
+class ContextWindow:
+    """直近 N エントリのテキストを保持するスライディングウィンドウ
+
+    各エントリのキーワード走査・トークン分割は最初に参照されたときに一度だけ行い、
+    ウィンドウ全体の出現数をエントリの出入りに合わせて増減する。リンク判定や
+    context_keywords はこの出現数を読むだけで、" ".join() したコンテキストを再走査しない。
+    結果は " ".join(entries) に対して find_linked_target / extract_keywords_from_text を
+    呼んだ場合と同一。
+    """
+
+    def __init__(self, index: SectionKeywordIndex, size: int):
+        self.index = index
+        self.size = size
+        # [text, (lowered, pattern_ids, tokens) or None（未解析）]
+        self._entries = deque()
+        self._pending = 0
+        self._pattern_counts = {}
+        self._token_counts = {}
+        self._nonblank = 0
+
+    @staticmethod
+    def _add(counts: dict, keys) -> None:
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+
+    @staticmethod
+    def _remove(counts: dict, keys) -> None:
+        for key in keys:
+            n = counts[key] - 1
+            if n:
+                counts[key] = n
+            else:
+                del counts[key]
+
+    def push(self, text: str) -> None:
+        self._entries.append([text, None])
+        self._pending += 1
+        if text.strip():
+            self._nonblank += 1
+
+        if len(self._entries) > self.size:
+            old_text, analysis = self._entries.popleft()
+            if analysis is None:
+                self._pending -= 1
+            else:
+                self._remove(self._pattern_counts, analysis[1])
+                self._remove(self._token_counts, analysis[2])
+            if old_text.strip():
+                self._nonblank -= 1
+
+    def _analyze_pending(self) -> None:
+        """未解析のエントリを走査して出現数に反映"""
+        if not self._pending:
+            return
+        find_ids = self.index.matcher.find_ids
+        for entry in self._entries:
+            if entry[1] is None:
+                text = entry[0]
+                lowered = text.lower()
+                pattern_ids = find_ids(lowered)
+                tokens = extract_keywords_from_text(text)
+                entry[1] = (lowered, pattern_ids, tokens)
+                self._add(self._pattern_counts, pattern_ids)
+                self._add(self._token_counts, tokens)
+        self._pending = 0
+
+    def texts(self) -> List[str]:
+        return [entry[0] for entry in self._entries]
+
+    def is_blank(self) -> bool:
+        """連結したコンテキストが空白のみか"""
+        return self._nonblank == 0
+
+    def _spanning_ids(self) -> set:
+        """エントリ境界をまたぐキーワード（空白を含むもの）のマッチ
+
+        境界をまたぐマッチは境界の前後 L-1 文字以内に収まるため、長いエントリは
+        先頭・末尾 L-1 文字だけを残して（中間は NUL で分断）連結した短い文字列を走査する。
+        """
+        max_len = self.index.spanning_max_len
+        if not max_len or len(self._entries) < 2:
+            return set()
+        k = max_len - 1
+        pieces = []
+        for _, (lowered, _, _) in self._entries:
+            if len(lowered) <= 2 * k:
+                pieces.append(lowered)
+            else:
+                pieces.append(lowered[:k] + "\x00" + lowered[len(lowered) - k:])
+        return self.index.matcher.find_ids(" ".join(pieces))
+
+    def linked_target(self, active_skill: Optional[str]) -> Optional[dict]:
+        """ウィンドウ全体に対する find_linked_target"""
+        if self.is_blank():
+            return None
+        self._analyze_pending()
+        pattern_ids = set(self._pattern_counts)
+        pattern_ids |= self._spanning_ids()
+        scores = self.index.section_scores_from_ids(pattern_ids)
+        return self.index.best_target(scores, active_skill)
+
+    def keywords(self, limit: int) -> List[str]:
+        """ウィンドウ全体のトークンを辞書順に先頭 limit 件"""
+        self._analyze_pending()
+        return heapq.nsmallest(limit, self._token_counts)
+
+
+class LinkedTargetCollector(Collector):
+    """エラー・修正指示を直近コンテキストから section_keywords のセクションに紐付け"""
+
+    name = "linked_targets"
+    # message を持たないエントリはコンテキストに空文字列として入るだけ
+    decode_markers = (b'"message"',)
+
+    # リンク解決に使う直近コンテキスト数
+    CONTEXT_WINDOW = 10
+
+    # 出力上限（先頭 N 件のみ保持すれば結果は変わらない）
+    LIMITS = {"errors": 20, "corrections": 10}
+
+    def __init__(self, section_keywords: Optional[dict] = None, limits: Optional[dict] = None):
+        self.configure_limits(limits)
+        # 全セクションのキーワードを1つのマッチャにコンパイル（エラー・修正ごとの再走査を避ける）
+        if section_keywords is None:
+            # section_keywords.json はディスク上のコンパイル済みキャッシュから読む
+            self.section_keywords, self.keywords_fp, self.section_index = load_compiled_section_keywords()
+        else:
+            self.section_keywords = section_keywords
+            self.keywords_fp = keywords_fingerprint(section_keywords)
+            self.section_index = compile_section_keywords(section_keywords)
+
+        # 直近のコンテキスト（キーワード・トークンの出現数を差分更新）
+        self.context = ContextWindow(self.section_index, self.CONTEXT_WINDOW)
+        self.errors = []
+        self.user_corrections = []
+        self.correction_count = 0
+        # improvement_targets 集計用（タプルキーで安全に）
+        self.target_issues = {}
+
+    def signature(self) -> str:
+        return f"{self.name}:{self.keywords_fp}:{self.limit_signature()}"
+
+    def feed(self, ctx: ScanContext) -> None:
+        # コンテキストウィンドウを更新
+        self.context.push(ctx.text())
+
+        if ctx.entry_type != "user":
+            return
+
+        # エラーの検出（tool_result with is_error）
+        if isinstance(ctx.content, list):
+            for item in ctx.content:
+                if isinstance(item, dict) and item.get("type") == "tool_result" and item.get("is_error"):
+                    error_content = item.get("content", "")
+                    if isinstance(error_content, str):
+                        self._record_error(error_content, ctx)
+
+        # ユーザー修正の検出
+        correction = detect_user_correction(ctx.text())
+        if correction:
+            linked = self.context.linked_target(ctx.active_skill)
+
+            correction_entry = {
+                "line": ctx.line_number,
+                "excerpt": correction["excerpt"],
+                "patterns": correction["patterns"],
+                "score": correction["score"],
+                "linked_skill": ctx.active_skill,
+                "context_keywords": self.context.keywords(10)
+            }
+            if linked:
+                correction_entry["linked_target"] = linked
+                self._record_link(linked, "corrections")
+
+            self.correction_count += 1
+            if len(self.user_corrections) < self.limits["corrections"]:
+                self.user_corrections.append(correction_entry)
+
+    def _record_error(self, error_content: str, ctx: ScanContext) -> None:
+        linked = self.context.linked_target(ctx.active_skill)
+
+        error_entry = {
+            "kind": "tool_error",
+            "tool": "unknown",  # tool_use_id から逆引きが必要だが簡略化
+            "message": error_content[:200],
+            "line": ctx.line_number,
+        }
+        if linked:
+            error_entry["linked_target"] = linked
+            self._record_link(linked, "errors")
+
+        # context_keywords を YAML 出力用に保存（recommend_structure.py で使用）
+        if len(self.errors) < self.limits["errors"]:
+            error_entry["context_keywords"] = self.context.keywords(15)
+            self.errors.append(error_entry)
+
+    def _record_link(self, linked: dict, field: str) -> None:
+        # タプルキーで安全に（パスに:が含まれる環境対応）
+        target_key = (linked['type'], linked['file'], linked['section'])
+        issue = self.target_issues.get(target_key)
+        if issue is None:
+            issue = self.target_issues[target_key] = {
+                "errors": 0,
+                "corrections": 0,
+                "matched_keywords": set(),  # 根拠キーワード（精度優先）
+                "total_confidence": 0.0,  # confidenceの合計（重み付け用）
+                "link_count": 0  # リンク回数
+            }
+        issue[field] += 1
+        issue["total_confidence"] += linked.get('confidence', 0.5)
+        issue["link_count"] += 1
+        # 根拠キーワードを優先して保存
+        issue["matched_keywords"].update(linked.get('matched_keywords', []))
+
+    def improvement_targets(self) -> List[dict]:
+        """improvement_targets を weighted_blame_score の降順で生成"""
+        improvement_targets = []
+        for target_key, issues in self.target_issues.items():
+            target_type, file_path, section = target_key
+
+            # 平均confidence（リンクの信頼度）
+            avg_confidence = (
+                issues["total_confidence"] / issues["link_count"]
+                if issues["link_count"] > 0 else 0.5
+            )
+
+            # 重み付きblame_score（confidence考慮）
+            raw_blame_score = 3 * issues["errors"] + 2 * issues["corrections"]
+            blame_score = round(raw_blame_score * avg_confidence, 1)
+
+            improvement_targets.append({
+                "target": {
+                    "type": target_type,
+                    "file": file_path,
+                    "section": section
+                },
+                "errors": issues["errors"],
+                "corrections": issues["corrections"],
+                "raw_blame_score": raw_blame_score,  # 元式: 3*errors + 2*corrections
+                "blame_score": blame_score,  # 重み付き（ソートに使用）
+                "avg_confidence": round(avg_confidence, 2),
+                "keywords": sorted(list(issues["matched_keywords"]))[:10]  # 根拠キーワード優先
+            })
+
+        # blame_score（重み付き）で降順ソート
+        improvement_targets.sort(key=lambda x: (x["blame_score"], x["raw_blame_score"]), reverse=True)
+        return improvement_targets
+
+    def get_state(self) -> dict:
+        return {
+            "context_buffer": self.context.texts(),
+            "errors": self.errors,
+            "user_corrections": self.user_corrections,
+            "correction_count": self.correction_count,
+            "target_issues": [
+                [list(key), {**issue, "matched_keywords": sorted(issue["matched_keywords"])}]
+                for key, issue in self.target_issues.items()
+            ],
+        }
+
+    def set_state(self, state: dict) -> None:
+        self.context = ContextWindow(self.section_index, self.CONTEXT_WINDOW)
+        for text in state.get("context_buffer", []):
+            self.context.push(text)
+        self.errors = state.get("errors", [])
+        self.user_corrections = state.get("user_corrections", [])
+        self.correction_count = state.get("correction_count", 0)
+        self.target_issues = {
+            tuple(key): {**issue, "matched_keywords": set(issue["matched_keywords"])}
+            for key, issue in state.get("target_issues", [])
+        }
+
+
+def default_collectors(limits: Optional[dict] = None) -> List[Collector]:
+    """全コンシューマ共通のコレクタ構成（チェックポイントを共有するため固定）
+
+    limits は保持件数の上限（上限名 → 件数、Collector.LIMITS 参照）。
+    既定値以外を指定するとチェックポイントは別になる。
+    """
+    return [
+        MetricsCollector(),
+        TaskSummaryCollector(),
+        SkillUsageCollector(),
+        ToolTimelineCollector(limits),
+        ErrorCollector(limits),
+        CorrectionCollector(limits=limits),
+        LinkedTargetCollector(limits=limits),
+    ]
+
+
+# ===============================
+# チェックポイント
+# ===============================
+
+def profile_signature(collectors: List[Collector]) -> str:
+    return f"v{SCANNER_VERSION}|" + "|".join(c.signature() for c in collectors)
+
+
+def default_checkpoint_path(
+    jsonl_path: str,
+    collectors: List[Collector],
+    cache_dir: str = DEFAULT_CACHE_DIR,
+) -> str:
+    """トランスクリプトとコレクタ構成からチェックポイントのパスを決定"""
+    abs_path = os.path.abspath(jsonl_path)
+    stem = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.splitext(os.path.basename(abs_path))[0])
+    key = hashlib.sha1(f"{abs_path}\0{profile_signature(collectors)}".encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{stem}-{key}.json")
+
+
+def _tail_digest(f, offset: int) -> str:
+    """offset 直前の CHECKPOINT_TAIL_BYTES バイトのハッシュ"""
+    start = max(0, offset - CHECKPOINT_TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def load_checkpoint(checkpoint_path: str, jsonl_path: str, f, signature: str) -> Optional[dict]:
+    """再開可能なチェックポイントを読み込む（不整合なら None）"""
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as cf:
+            checkpoint = json.load(cf)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        st = os.fstat(f.fileno())
+        offset = checkpoint["offset"]
+        if (
+            checkpoint.get("signature") != signature
+            or checkpoint.get("transcript") != os.path.abspath(jsonl_path)
+            or checkpoint.get("inode") != st.st_ino
+            or offset > st.st_size
+            or checkpoint.get("tail_sha1") != _tail_digest(f, offset)
+        ):
+            return None
+    except (KeyError, TypeError):
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: str, checkpoint: dict) -> None:
+    """チェックポイントを原子的に保存（tmp に書いてから rename）"""
+    checkpoint_dir = os.path.dirname(checkpoint_path)
+    try:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".ckpt-", dir=checkpoint_dir)
+        # json.dump はファイルに書くとき C のエンコーダを使わないため、文字列にしてから書く
+        with os.fdopen(fd, "w", encoding="utf-8") as cf:
+            cf.write(json.dumps(checkpoint, ensure_ascii=False))
+        os.replace(tmp_path, checkpoint_path)
+    except OSError as e:
+        print(f"Warning: checkpoint not saved: {e}", file=sys.stderr)
+        return
+    prune_checkpoints(checkpoint_dir)
+
+
+def prune_checkpoints(checkpoint_dir: str, max_age_days: int = CHECKPOINT_MAX_AGE_DAYS) -> None:
+    """終了したセッションの古いチェックポイント（とロックファイル）を削除"""
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        for name in os.listdir(checkpoint_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(checkpoint_dir, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                if os.path.exists(path + ".lock"):
+                    os.remove(path + ".lock")
+    except OSError:
+        pass
+
+
+@contextmanager
+def _checkpoint_lock(checkpoint_path: Optional[str]):
+    """同じトランスクリプトを同時に解析する hook を直列化する"""
+    if not checkpoint_path or fcntl is None:
+        yield
+        return
+    try:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        fd = os.open(checkpoint_path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+    except OSError:
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _snapshot(ctx: ScanContext, collectors: List[Collector]) -> dict:
+    return copy.deepcopy({
+        "context": ctx.get_state(),
+        "collectors": {c.name: c.get_state() for c in collectors},
+    })
+
+
+# ===============================
+# デコード層
+# ===============================
+
+def _stdlib_loads(raw: bytes):
+    return json.loads(raw.decode("utf-8").strip())
+
+
+def resolve_json_backend(backend: str = DEFAULT_JSON_BACKEND):
+    """JSON デコーダを選択（(名前, bytes を受け取る loads)）
+
+    orjson.JSONDecodeError は json.JSONDecodeError（ValueError）のサブクラスなので、
+    呼び出し側はどちらも ValueError として扱える。
+    """
+    if backend == "orjson" and orjson is None:
+        print("Warning: orjson is not installed; falling back to json", file=sys.stderr)
+    if backend in ("auto", "orjson") and orjson is not None:
+        return "orjson", orjson.loads
+    return "json", _stdlib_loads
+
+
+class EntryDecoder:
+    """行ごとのデコード判定とデコード
+
+    事前フィルタ有効時は、ScanContext と全コレクタの decode_markers のどれも含まない行を
+    デコードせず、本文のないエントリ（種別 SKIPPED_ENTRY_TYPE）として返す。
+    対象は改行で終わり { ... } の形をした行のみ（書き込み途中の末尾行や明らかに壊れた行は
+    通常どおりデコードして判定する）。
+    """
+
+    def __init__(self, collectors: List[Collector], prefilter: bool = DEFAULT_PREFILTER,
+                 backend: str = DEFAULT_JSON_BACKEND):
+        self.backend, self._loads = resolve_json_backend(backend)
+        self.markers = None
+        if prefilter:
+            markers = set(ScanContext.decode_markers)
+            for c in collectors:
+                if c.decode_markers is None:
+                    markers = None
+                    break
+                markers.update(c.decode_markers)
+            if markers is not None:
+                self.markers = tuple(sorted(markers))
+        self.decoded = 0
+        self.skipped = 0
+
+    def _needs_decode(self, raw: bytes) -> bool:
+        for marker in self.markers:
+            if marker in raw:
+                return True
+        if not raw.endswith(b"\n"):
+            return True
+        body = raw.strip()
+        return not (body.startswith(b"{") and body.endswith(b"}"))
+
+    def decode(self, raw: bytes) -> Optional[dict]:
+        """エントリ（dict）を返す。JSON として不正・dict 以外なら None"""
+        if self.markers is not None and not self._needs_decode(raw):
+            self.skipped += 1
+            return {"type": SKIPPED_ENTRY_TYPE}
+        self.decoded += 1
+        try:
+            entry = self._loads(raw)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+
+
+def add_decode_arguments(parser: argparse.ArgumentParser) -> None:
+    """デコード層の切り替えオプション（結果比較用）を CLI に追加"""
+    parser.add_argument(
+        "--no-prefilter",
+        dest="prefilter",
+        action="store_false",
+        default=DEFAULT_PREFILTER,
+        help="全行をデコードする（事前フィルタ無効、TRANSCRIPT_SCAN_PREFILTER=0 と同じ）",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=("auto", "json", "orjson"),
+        default=DEFAULT_JSON_BACKEND,
+        help="JSON デコーダ（既定: auto = orjson があれば使用）",
+    )
+
+
+# 保持件数の上限オプション（上限名 → CLI オプション名）
+LIMIT_OPTIONS = {
+    "tool_timeline": "--max-tool-timeline",
+    "search_paths": "--max-search-paths",
+    "changed_files": "--max-changed-files",
+    "unique_changed": "--max-unique-changed",
+    "edit_turns": "--max-edit-turns",
+    "errors": "--max-errors",
+    "corrections": "--max-corrections",
+}
+
+
+def add_limit_arguments(parser: argparse.ArgumentParser) -> None:
+    """コレクタの保持件数の上限を CLI に追加（件数そのものは上限に関係なく正確に数える）"""
+    defaults = {}
+    for collector_class in (ToolTimelineCollector, ErrorCollector, CorrectionCollector, LinkedTargetCollector):
+        defaults.update(collector_class.LIMITS)
+    group = parser.add_argument_group("保持件数の上限")
+    for key, option in LIMIT_OPTIONS.items():
+        group.add_argument(
+            option,
+            dest=f"limit_{key}",
+            type=int,
+            metavar="N",
+            help=f"{key} の保持件数（既定: {defaults[key]}）",
+        )
+
+
+def limits_from_args(args: argparse.Namespace) -> Optional[dict]:
+    """add_limit_arguments で指定された上限だけを dict にする（未指定なら None）"""
+    limits = {
+        key: getattr(args, f"limit_{key}")
+        for key in LIMIT_OPTIONS
+        if getattr(args, f"limit_{key}", None) is not None
+    }
+    return limits or None
+
+
+# ===============================
+# スキャナ本体
+# ===============================
+
+def scan_transcript(
+    jsonl_path: str,
+    collectors: Optional[List[Collector]] = None,
+    checkpoint_path: Optional[str] = None,
+    prefilter: bool = DEFAULT_PREFILTER,
+    json_backend: str = DEFAULT_JSON_BACKEND,
+) -> Tuple[ScanContext, Dict[str, Collector]]:
+    """JSONL を1パスで読み、各エントリを全コレクタに渡す
+
+    checkpoint_path を指定すると、前回の読み取り位置と全コレクタの状態から再開し、
+    追記された行だけを解析する。prefilter / json_backend は EntryDecoder を参照。
+
+    Returns:
+        (スキャンコンテキスト, コレクタ名 → コレクタ)
+    """
+    if collectors is None:
+        collectors = default_collectors()
+    signature = profile_signature(collectors)
+    ctx = ScanContext()
+    decoder = EntryDecoder(collectors, prefilter, json_backend)
+
+    with _checkpoint_lock(checkpoint_path), open(jsonl_path, "rb") as f:
+        offset = 0
+        resumed_at = None
+        if checkpoint_path:
+            checkpoint = load_checkpoint(checkpoint_path, jsonl_path, f, signature)
+            if checkpoint:
+                ctx.set_state(checkpoint["state"]["context"])
+                for c in collectors:
+                    c.set_state(checkpoint["state"]["collectors"][c.name])
+                offset = resumed_at = checkpoint["offset"]
+
+        # 改行で終わる行までをチェックポイントとして保存
+        committed = None
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                # 書き込み途中の可能性がある末尾行: 解析はするが再開位置には含めない
+                committed = (offset, _snapshot(ctx, collectors))
+
+            ctx.line_number += 1
+            offset += len(raw)
+            for c in collectors:
+                c.feed_raw(raw, ctx)
+
+            entry = decoder.decode(raw)
+            if entry is None:
+                continue
+
+            ctx.begin_entry(entry)
+            for c in collectors:
+                c.feed(ctx)
+
+        # 再開位置から何も読まなかった（同じ Stop で続けて呼ばれた）場合は書き直さない
+        if checkpoint_path and not (committed is None and offset == resumed_at):
+            if committed is None:
+                committed = (offset, {
+                    "context": ctx.get_state(),
+                    "collectors": {c.name: c.get_state() for c in collectors},
+                })
+            saved_offset, saved_state = committed
+            save_checkpoint(checkpoint_path, {
+                "signature": signature,
+                "transcript": os.path.abspath(jsonl_path),
+                "inode": os.fstat(f.fileno()).st_ino,
+                "offset": saved_offset,
+                "tail_sha1": _tail_digest(f, saved_offset),
+                "saved_at": int(time.time()),
+                "state": saved_state,
+            })
+
+    return ctx, {c.name: c for c in collectors}
+
+
+def scan_session(
+    jsonl_path: str,
+    use_checkpoint: bool = True,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    prefilter: bool = DEFAULT_PREFILTER,
+    json_backend: str = DEFAULT_JSON_BACKEND,
+    limits: Optional[dict] = None,
+) -> Tuple[ScanContext, Dict[str, Collector]]:
+    """共通コレクタ構成でスキャン（全コンシューマ共通の入口）"""
+    collectors = default_collectors(limits)
+    checkpoint_path = default_checkpoint_path(jsonl_path, collectors, cache_dir) if use_checkpoint else None
+    return scan_transcript(jsonl_path, collectors, checkpoint_path, prefilter, json_backend)
+
+
+# ===============================
+# Stop hook 用出力
+# ===============================
+
+def hook_vars(collectors: Dict[str, Collector]) -> Dict[str, object]:
+    """Stop hook が参照するメトリクス（従来の wc / grep と同じ値）"""
+    metrics = collectors["metrics"]
+    summary = collectors["task_summary"].summary
+    return {
+        # stop_hook_collect.sh
+        "MESSAGE_COUNT": metrics.newline_count,
+        "TOOL_USES": metrics.tool_use_lines,
+        "CODE_CHANGES": metrics.code_change_lines,
+        "ERROR_COUNT": metrics.error_lines,
+        "TASK_SUMMARY": summary or "",
+        # 空白を許容するパターンで数えた行数（"type": "tool_use" / "name": "Write|Edit" / "is_error": true）
+        "TYPED_TOOL_USES": metrics.typed_tool_use_lines,
+        "WRITE_EDIT_CHANGES": metrics.write_edit_lines,
+        "TYPED_ERROR_COUNT": metrics.typed_error_lines,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="トランスクリプト共通スキャナ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    vars_parser = subparsers.add_parser("hook-vars", help="Stop hook 用メトリクスを shell 変数で出力")
+    vars_parser.add_argument("transcript", help="トランスクリプト JSONL のパス")
+    vars_parser.add_argument("--no-checkpoint", action="store_true", help="チェックポイントを使わない")
+    vars_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="チェックポイント保存先")
+    add_decode_arguments(vars_parser)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.transcript):
+        print(f"Error: File not found: {args.transcript}", file=sys.stderr)
+        return 1
+
+    _, collectors = scan_session(
+        args.transcript, not args.no_checkpoint, args.cache_dir, args.prefilter, args.json_backend
+    )
+    for key, value in hook_vars(collectors).items():
+        print(f"{key}={shlex.quote(str(value))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+gen_feedback.py - ベンチマーク用の合成フィードバック（fb-*.yaml の滞留）を生成
+
+Stop hook（stop_hook_collect.sh）と同じヘッダに、extract_transcript.py の format_yaml_output で
+書いた extracted セクションを続けた YAML を作る。サイドカー（fb-*.extracted.json）も
+structured_output.write_sidecar で同じ内容を書く（--sidecar-ratio の割合のファイルだけ）。
+同じ seed と件数からは常に同じディレクトリを生成する。
+
+- 改善ターゲットは section_keywords.json のセクションとキーワードから選ぶ
+  （一部はキーワードの偏ったテーマを繰り返し、新スキル候補・分割候補が出るようにする）
+- 修正指示は検出パターンあり / なし（未検出の言い回し）を混ぜる
+- triage.status は open / in_progress / fixed / wontfix を混ぜ、created_at は過去 90 日に散らす
+
+使用方法:
+    python3 gen_feedback.py OUT_DIR [--count N] [--seed S] [--sidecar-ratio R]
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+SCRIPTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from extract_transcript import format_yaml_output, structured_extracted  # noqa: E402
+from structured_output import sidecar_path, write_sidecar  # noqa: E402
+from transcript_rules import load_section_keywords  # noqa: E402
+
+from gen_transcript import DETECTED_CORRECTIONS, UNDETECTED_CORRECTIONS  # noqa: E402
+
+BASE_TIME = datetime(2026, 4, 1, tzinfo=timezone.utc)
+
+STATUSES = ["open"] * 6 + ["in_progress", "fixed", "fixed", "wontfix"]
+
+PATTERNS = [
+    "negation_start", "contrast", "correction_request", "instruction_reminder", "why_doing",
+    "comprehension_check", "repetition_frustration", "missing_element", "expectation_check",
+]
+
+# どのセクションにも結び付かない（低信頼度になる）テーマ
+UNLINKED_THEMES = [
+    ["terraform", "state", "lock"],
+    ["i18n", "翻訳", "locale"],
+    ["flaky", "retry", "timeout"],
+    ["docker", "compose", "volume"],
+]
+
+
+def _sections() -> List[Tuple[str, str, str, List[str]]]:
+    """(type, file, section, keywords) の一覧"""
+    sections = []
+    data = load_section_keywords()
+    for owner, owner_sections in data.get("claude_md", {}).items():
+        for section, keywords in owner_sections.items():
+            sections.append(("claude_md", owner, section, list(keywords)))
+    for owner, owner_sections in data.get("skills", {}).items():
+        for section, keywords in owner_sections.items():
+            sections.append(("skill", f"skills/{owner}/SKILL.md", section, list(keywords)))
+    return sections
+
+
+class FeedbackGenerator:
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.sections = _sections()
+        # よく指摘されるセクション（偏りを作る）
+        self.hot = self.rng.sample(self.sections, min(6, len(self.sections)))
+
+    def _target(self) -> Tuple[Dict, List[str], float]:
+        rng = self.rng
+        if rng.random() < 0.15:
+            theme = rng.choice(UNLINKED_THEMES)
+            target_type, file_path, section, keywords = rng.choice(self.sections)
+            return (
+                {"type": target_type, "file": file_path, "section": section},
+                rng.sample(theme, rng.randint(1, len(theme))),
+                round(rng.uniform(0.1, 0.29), 2),
+            )
+        target_type, file_path, section, keywords = rng.choice(self.hot if rng.random() < 0.6 else self.sections)
+        matched = rng.sample(keywords, rng.randint(1, min(4, len(keywords))))
+        return {"type": target_type, "file": file_path, "section": section}, matched, round(rng.uniform(0.3, 1.0), 2)
+
+    def extracted(self) -> Dict:
+        """process_transcript の戻り値と同じ形の extracted"""
+        rng = self.rng
+        targets = []
+        errors = []
+        corrections = []
+        for _ in range(rng.randint(0, 4)):
+            target, keywords, confidence = self._target()
+            linked = {**target, "confidence": confidence, "matched_keywords": keywords}
+            error_count = rng.randint(0, 3)
+            correction_count = rng.randint(0, 2)
+            for _ in range(error_count):
+                if len(errors) < 20:
+                    errors.append({
+                        "kind": "tool_error",
+                        "tool": "unknown",
+                        "message": f"Exit code 1: {' '.join(keywords)} failed",
+                        "line": rng.randint(1, 5000),
+                        "linked_target": linked,
+                        "context_keywords": keywords,
+                    })
+            for _ in range(correction_count):
+                if len(corrections) < 10:
+                    detected = rng.random() < 0.75
+                    template = rng.choice(DETECTED_CORRECTIONS if detected else UNDETECTED_CORRECTIONS)
+                    corrections.append({
+                        "line": rng.randint(1, 5000),
+                        "excerpt": template.format(kw=keywords[0])[:120],
+                        "patterns": rng.sample(PATTERNS, rng.randint(1, 2)) if detected else [],
+                        "score": rng.randint(1, 3) if detected else 0,
+                        "linked_target": linked,
+                    })
+            if error_count or correction_count:
+                raw = 3 * error_count + 2 * correction_count
+                targets.append({
+                    "target": target,
+                    "errors": error_count,
+                    "corrections": correction_count,
+                    "raw_blame_score": raw,
+                    "blame_score": round(raw * confidence, 1),
+                    "avg_confidence": confidence,
+                    "keywords": sorted(keywords),
+                })
+        targets.sort(key=lambda t: (t["blame_score"], t["raw_blame_score"]), reverse=True)
+        return {
+            "skills_used": [
+                {"name": name, "count": rng.randint(1, 5), "first_line": 1, "last_line": rng.randint(2, 5000)}
+                for name in rng.sample(["api", "architecture", "database", "implementation"], rng.randint(0, 2))
+            ],
+            "changed_files": [
+                {"path": f"src/module_{rng.randint(0, 40)}.py", "op": rng.choice(["edit", "write"]), "via": "Edit", "line": 1}
+                for _ in range(rng.randint(0, 8))
+            ],
+            "errors": errors,
+            "user_corrections": {"count": len(corrections) + rng.randint(0, 2), "items": corrections},
+            "improvement_targets": targets[:10],
+        }
+
+    def header(self, fb_id: str, index: int) -> str:
+        rng = self.rng
+        created = BASE_TIME + timedelta(seconds=rng.randint(0, 90 * 86400))
+        return "\n".join([
+            "# Auto-generated by Stop hook",
+            f"id: {fb_id}",
+            f"created_at: {created.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+            f"session_id: bench-session-{index:06d}",
+            f"transcript_path: /home/bench/.claude/projects/bench/{index:06d}.jsonl",
+            "",
+            "# セッション統計",
+            "stats:",
+            f"  message_count: {rng.randint(5, 400)}",
+            f"  tool_uses: {rng.randint(0, 200)}",
+            f"  code_changes: {rng.randint(0, 30)}",
+            "  collection_reason: errors",
+            "",
+            "task_summary: \"ベンチマーク用の合成フィードバック\"",
+            "outcome:",
+            "  success: unknown",
+            "  score: null",
+            "  rationale: \"自動推定\"",
+            "  inferred: true",
+            "  confidence: low",
+            "",
+            "issues: []",
+            "",
+            "# プライバシー",
+            "privacy:",
+            "  redacted: false",
+            "",
+            "# トリアージ（初期状態）",
+            "triage:",
+            f"  status: {rng.choice(STATUSES)}",
+            "  priority: medium",
+            "",
+        ])
+
+
+def generate_feedback_dir(out_dir: str, count: int, seed: int = 0, sidecar_ratio: float = 0.75) -> int:
+    """out_dir に count 件の fb-*.yaml（と一部のサイドカー）を書き出し、件数を返す"""
+    os.makedirs(out_dir, exist_ok=True)
+    generator = FeedbackGenerator(seed)
+    for index in range(count):
+        day = BASE_TIME + timedelta(days=index * 90 // max(count, 1))
+        fb_id = f"fb-{day.strftime('%Y%m%d')}-{index % 1000 + 1:03d}"
+        if index >= 1000:
+            fb_id += f"-{index // 1000}"
+        path = os.path.join(out_dir, f"{fb_id}.yaml")
+        extracted = generator.extracted()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generator.header(fb_id, index))
+            f.write("\n# 自動抽出された詳細情報\n")
+            f.write(format_yaml_output(extracted) + "\n")
+        if generator.rng.random() < sidecar_ratio:
+            write_sidecar(sidecar_path(path), "extracted", structured_extracted(extracted))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成フィードバックを生成")
+    parser.add_argument("output_dir", help="書き出すディレクトリ")
+    parser.add_argument("--count", type=int, default=1000, help="件数（既定: %(default)s）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の seed（既定: %(default)s）")
+    parser.add_argument(
+        "--sidecar-ratio", type=float, default=0.75, help="サイドカーも書くファイルの割合（既定: %(default)s）"
+    )
+    args = parser.parse_args()
+
+    generate_feedback_dir(args.output_dir, args.count, args.seed, args.sidecar_ratio)
+    print(f"{args.output_dir}: {args.count} feedbacks", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+gen_transcript.py - ベンチマーク用の合成トランスクリプト（Claude Code の JSONL）を生成
+
+同じ seed と行数からは常に同じファイルを生成する。含まれるもの:
+- ユーザーの依頼（日本語・英語）と、セクションキーワードを含む作業の説明
+- assistant の tool_use（Read / Edit / Write / Bash / Grep / Glob / Skill / Task）と、
+  対応する tool_result（一部は is_error、まれに数十〜数百 KB の巨大な出力）
+- 修正指示: CORRECTION_PATTERNS に引っかかるもの（日英）と、引っかからない言い回し
+- <command-name> によるスキル起動、コンパクションの要約、file-history-snapshot などの
+  どのコレクタも参照しない行
+
+使用方法:
+    python3 gen_transcript.py OUT.jsonl [--lines N] [--seed S]
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+SCRIPTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+KEYWORDS_FILE = os.path.join(SCRIPTS_DIR, "section_keywords.json")
+
+BASE_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+TASKS = [
+    "{kw} まわりを整理してほしい",
+    "{kw} の対応をお願いします。既存の挙動は変えないで",
+    "{kw} について調べて、必要なら修正して",
+    "Please look into the {kw} handling and clean it up",
+    "Can you refactor the {kw} code path without changing behavior?",
+    "Add tests for {kw} and make sure CI passes",
+]
+
+# CORRECTION_PATTERNS に引っかかる指摘
+DETECTED_CORRECTIONS = [
+    "いや、そうじゃなくて {kw} のほうを直して",
+    "違う、{kw} は触らないでって言ったよね",
+    "なんでテストを消してるの？",
+    "さっきも言ったけど {kw} は別ブランチでやって",
+    "{kw} の説明が足りない。もう一回説明して",
+    "no, use the existing {kw} helper instead",
+    "I said to keep the {kw} API stable",
+    "why are you doing a rebase here? please fix the history",
+    "that's not what I asked for, redo the {kw} change",
+    "{kw} のエラー処理がない",
+]
+
+# 検出パターンに引っかからない指摘
+UNDETECTED_CORRECTIONS = [
+    "いちいち確認しなくていいから進めて",
+    "勝手にファイルを消さないでほしい",
+    "そのテストは前から落ちてたやつだよ",
+    "ログを見てから判断してくれる？ {kw} の件",
+    "hold on, the {kw} change broke the build again",
+]
+
+ACKS = ["ok", "ありがとう", "いいね、次お願い", "LGTM", "続けて", "thanks, continue"]
+
+TOOLS = ["Read", "Edit", "Write", "Bash", "Grep", "Glob", "Task"]
+TOOL_WEIGHTS = [30, 20, 8, 20, 10, 6, 2]
+
+ERROR_MESSAGES = [
+    "Error: File has not been read yet. Read it first before writing to it.",
+    "Exit code 1\nFAILED tests/test_{kw}.py::test_case - AssertionError",
+    "String to replace not found in file.",
+    "Error: command timed out after 120000ms",
+    "ModuleNotFoundError: No module named '{kw}'",
+]
+
+
+def load_keywords() -> List[str]:
+    """section_keywords.json の全キーワード（読めなければ汎用の語）"""
+    try:
+        with open(KEYWORDS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return ["error", "test", "deploy", "schema", "api", "debug"]
+    keywords = []
+    for group in data.values():
+        for sections in group.values():
+            for words in sections.values():
+                keywords.extend(words)
+    return sorted(set(keywords))
+
+
+class TranscriptGenerator:
+    """1セッション分のエントリを順に作る（行数は目安。最後のターンまで書き切る）"""
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.keywords = load_keywords()
+        self.skills = ["api", "architecture", "database", "implementation", "prompt-improver", "hurikaeri"]
+        self.session_id = f"bench-{seed:08x}-0000-0000-0000-000000000000"
+        self.clock = BASE_TIME
+        self.tool_count = 0
+        self.uuid_count = 0
+        self.parent = None
+        self.files = [f"src/{self.rng.choice(['app', 'lib', 'core'])}/module_{i}.py" for i in range(40)]
+
+    def _kw(self) -> str:
+        return self.rng.choice(self.keywords)
+
+    def _entry(self, entry_type: str, content, **extra) -> Dict:
+        self.uuid_count += 1
+        self.clock += timedelta(seconds=self.rng.randint(1, 40))
+        uuid = f"{self.uuid_count:08d}-0000-4000-8000-{self.uuid_count:012d}"
+        entry = {
+            "parentUuid": self.parent,
+            "isSidechain": False,
+            "type": entry_type,
+            "message": {"role": "user" if entry_type == "user" else "assistant", "content": content},
+            "uuid": uuid,
+            "timestamp": self.clock.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "sessionId": self.session_id,
+            "cwd": "/home/bench/project",
+            **extra,
+        }
+        self.parent = uuid
+        return entry
+
+    def _tool_input(self, name: str) -> Dict:
+        path = self.rng.choice(self.files)
+        if name == "Read":
+            return {"file_path": path}
+        if name == "Edit":
+            return {"file_path": path, "old_string": f"# {self._kw()}", "new_string": f"# {self._kw()} (fixed)"}
+        if name == "Write":
+            return {"file_path": path, "content": "\n".join(f"x_{i} = {i}" for i in range(self.rng.randint(5, 60)))}
+        if name == "Bash":
+            return {"command": self.rng.choice(["pytest -q", "git status", "git diff --stat", "npm test", "make lint"])}
+        if name in ("Grep", "Glob"):
+            return {"pattern": self._kw(), "path": os.path.dirname(path)}
+        return {"description": f"investigate {self._kw()}", "prompt": f"{self._kw()} を調べて"}
+
+    def _tool_output(self, name: str) -> str:
+        roll = self.rng.random()
+        if roll < 0.01:
+            # 巨大な出力（ログのダンプなど）
+            size = self.rng.randint(50_000, 400_000)
+            line = f"{self._kw()} INFO processing item ok\n"
+            return line * (size // len(line))
+        if name == "Read":
+            return "\n".join(f"{i:>6}\t{self._kw()} = load_{i}()" for i in range(self.rng.randint(10, 200)))
+        if name == "Bash":
+            return "\n".join(f"tests/test_{self._kw()}.py ." for _ in range(self.rng.randint(1, 30)))
+        return f"The file {self.rng.choice(self.files)} has been updated."
+
+    def turn(self) -> List[Dict]:
+        """ユーザー発言 1 回と、それに続く assistant / tool_result のやりとり"""
+        rng = self.rng
+        entries = []
+        roll = rng.random()
+        if roll < 0.03:
+            entries.append(self._entry(
+                "user",
+                "This session is being continued from a previous conversation that ran out of context. "
+                "The conversation is summarized below:\n" + " ".join(self._kw() for _ in range(200)),
+                isCompactSummary=True,
+            ))
+        elif roll < 0.08:
+            skill = rng.choice(self.skills)
+            entries.append(self._entry(
+                "user", f"<command-message>{skill} is running…</command-message>\n<command-name>/{skill}</command-name>"
+            ))
+        elif roll < 0.23:
+            template = rng.choice(DETECTED_CORRECTIONS if rng.random() < 0.7 else UNDETECTED_CORRECTIONS)
+            entries.append(self._entry("user", template.format(kw=self._kw())))
+        elif roll < 0.35:
+            entries.append(self._entry("user", rng.choice(ACKS)))
+        else:
+            entries.append(self._entry("user", rng.choice(TASKS).format(kw=self._kw())))
+
+        for _ in range(rng.randint(1, 6)):
+            content = [{"type": "text", "text": f"{self._kw()} を確認します。"}]
+            calls = []
+            for _ in range(rng.choice([1, 1, 1, 2, 3])):
+                if rng.random() < 0.03:
+                    name, tool_input = "Skill", {"skill": rng.choice(self.skills)}
+                else:
+                    name = rng.choices(TOOLS, TOOL_WEIGHTS)[0]
+                    tool_input = self._tool_input(name)
+                self.tool_count += 1
+                tool_id = f"toolu_bench{self.tool_count:010d}"
+                content.append({"type": "tool_use", "id": tool_id, "name": name, "input": tool_input})
+                calls.append((tool_id, name))
+            entries.append(self._entry("assistant", content))
+
+            results = []
+            for tool_id, name in calls:
+                if rng.random() < 0.06:
+                    results.append({
+                        "type": "tool_result", "tool_use_id": tool_id, "is_error": True,
+                        "content": rng.choice(ERROR_MESSAGES).format(kw=self._kw()),
+                    })
+                else:
+                    results.append({"type": "tool_result", "tool_use_id": tool_id, "content": self._tool_output(name)})
+            entries.append(self._entry("user", results))
+
+        entries.append(self._entry("assistant", [{"type": "text", "text": f"{self._kw()} の対応が終わりました。"}]))
+        if rng.random() < 0.2:
+            entries.append({"type": "file-history-snapshot", "messageId": self.parent, "snapshot": {"files": {}}})
+        return entries
+
+
+def generate_transcript(out_path: str, lines: int, seed: int = 0) -> int:
+    """out_path に約 lines 行のトランスクリプトを書き出し、書いた行数を返す"""
+    generator = TranscriptGenerator(seed)
+    written = 0
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "summary", "summary": "benchmark session", "leafUuid": None}) + "\n")
+        written += 1
+        while written < lines:
+            for entry in generator.turn():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成トランスクリプトを生成")
+    parser.add_argument("output", help="書き出す JSONL のパス")
+    parser.add_argument("--lines", type=int, default=10000, help="行数の目安（既定: %(default)s）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の seed（既定: %(default)s）")
+    args = parser.parse_args()
+
+    written = generate_transcript(args.output, args.lines, args.seed)
+    print(f"{args.output}: {written} lines, {os.path.getsize(args.output)} bytes", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1426 @@
+#!/usr/bin/env python3
+"""
+reference_checks.py - 高速化した処理と従来の実装（基準実装）の一致確認・時間計測
+
+scripts/ の高速化した処理を、置き換える前の素直な実装と同じ入力で実行して結果を比べる。
+基準実装はここにだけ置き、本体のスクリプトには持たせない。
+
+    correction        correction_detector.CorrectionDetector と、パターンごとの search ループ
+    feedback-parser   feedback_parser.parse_feedback_yaml（と FeedbackParseCache）と、正規表現版
+    clusters          recommend_structure.cluster_keywords_by_cooccurrence と、キーワードの総当たり
+    similarity        recommend_structure.low_similarity_pairs（bitset / numpy）と、セクションの総当たり
+    split             recommend_structure.detect_split_candidates（KeywordPostings から）と、セクションの総当たり
+    near-duplicates   near_duplicates.near_duplicate_groups（MinHash / LSH）と、全組の総当たり（誤結合・取りこぼし）
+    spool             feedback_spool.Spool のまとめ・再試行・dead・復旧と、同時に動く hook / ワーカー（一時ディレクトリ）
+    id-allocator      id_allocator.allocate を多数のプロセスから同時に呼ぶ（重複・欠番・予約漏れ・999 超え・カウンタの復旧）
+
+使用方法:
+    python3 reference_checks.py [NAME ...] [--transcript T.jsonl ...] [--feedback-dir DIR ...]   # 一致確認（既定: すべて）
+    python3 reference_checks.py --bench [NAME ...]                                                # 基準実装と時間を比べる
+
+--transcript のユーザー発言は correction の追加コーパスにする。
+--feedback-dir の fb-*.yaml（archive/ も含む）は、feedback-parser で Stop hook と同じ形の生成データに加えて確かめる。
+不一致があれば終了コード 1。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "scripts"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+class Report:
+    """不一致の件数を数え、先頭の10件だけ表示する"""
+
+    def __init__(self):
+        self.failures = 0
+
+    def __call__(self, label: str) -> None:
+        self.failures += 1
+        if self.failures <= 10:
+            print(f"MISMATCH {label}", file=sys.stderr)
+
+
+def best_of(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# ===============================
+# correction: 修正指示の融合検出器
+# ===============================
+
+def reference_detect(text: str, patterns: Dict[str, re.Pattern], high_score_patterns: Iterable[str]) -> Optional[dict]:
+    """従来のパターンごとの search ループ"""
+    score = 0
+    patterns_matched = []
+
+    for pattern_name, pattern in patterns.items():
+        if pattern.search(text):
+            if pattern_name in high_score_patterns:
+                score += 3
+            else:
+                score += 2
+            patterns_matched.append(pattern_name)
+
+    if re.search(r"\.\w{2,4}\b", text):
+        score += 1
+    if re.search(r"[A-Z][a-z]+[A-Z]", text):
+        score += 1
+
+    if score >= 3:
+        return {
+            "score": score,
+            "patterns": patterns_matched,
+            "excerpt": text[:120]
+        }
+    return None
+
+
+# 組み込みコーパス（各パターン・ボーナス・境界条件を一通り含む）
+CORRECTION_CORPUS = [
+    "", " ", "ok", "普通の依頼です",
+    "いや、そうじゃない", "違う、App.tsx を直して", "no, use the other one", "not that", "That's not right",
+    "前にも言ったけど \nいや違う", "you misunderstood the task",
+    "A ではなく B にして", "use rebase instead of merge", "rather than copying",
+    "修正してください", "please fix the TestCase", "Please Change it", "redo",
+    "って言ったよね", "I said use pnpm", "i said", "told you twice", "asked you to stop",
+    "なんでそれやってるの", "why are you doing this", "WHY did you delete it",
+    "why" + "x" * 21 + "doing", "why" + "x" * 20 + "doing", "どうして させてる",
+    "聞いてた？", "読んだ?", "読んだ", "did you read the docs", "are you listening",
+    "もう一回説明して", "何度も言ってる", "さっきも言",
+    "テストがない", "テストがないか確認して", "設定が足りないことを", "import を忘れてる",
+    "そうでしょ？", "じゃないの?", "だよね",
+    "see main.py", "file.tar.gz", "x.toolong", "MyClass is broken", "myClass", "HTTPServer", "Xy",
+    "いや instead please fix もう一回言 がない でしょ？ App.tsx CamelCase",
+    "log line\n" * 50 + "why would you be doing that",
+    "ÉCOLE ǅ ﬃ İstanbul why doing",
+]
+
+
+def _iter_transcript_texts(path: str) -> Iterable[str]:
+    """トランスクリプトのユーザー発言（tool_result 込み / なしの両方）"""
+    from transcript_rules import extract_text_from_content
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(entry, dict) or entry.get("type") not in ("user", "human"):
+                continue
+            message = entry.get("message", {})
+            content = message.get("content", []) if isinstance(message, dict) else []
+            yield extract_text_from_content(content, True)
+            yield extract_text_from_content(content, False)
+
+
+def _correction_profiles():
+    from transcript_rules import (
+        CORRECTION_PATTERNS,
+        HIGH_SCORE_PATTERNS,
+        SESSION_CORRECTION_PATTERNS,
+        SESSION_HIGH_SCORE_PATTERNS,
+    )
+
+    return [
+        ("prompt-improver", CORRECTION_PATTERNS, HIGH_SCORE_PATTERNS),
+        ("hurikaeri", SESSION_CORRECTION_PATTERNS, SESSION_HIGH_SCORE_PATTERNS),
+    ]
+
+
+def _correction_texts(transcripts: List[str]) -> List[str]:
+    texts = list(CORRECTION_CORPUS)
+    for path in transcripts:
+        texts.extend(_iter_transcript_texts(path))
+    return texts
+
+
+def check_correction(args: argparse.Namespace, report: Report) -> None:
+    from correction_detector import CorrectionDetector
+
+    texts = _correction_texts(args.transcript)
+    for label, patterns, high in _correction_profiles():
+        detector = CorrectionDetector(patterns, high)
+        detected = 0
+        for text in texts:
+            expected = reference_detect(text, patterns, high)
+            actual = detector.detect(text)
+            if expected is not None:
+                detected += 1
+            if expected != actual:
+                report(f"[{label}] {text[:80]!r}: expected={expected} actual={actual}")
+        print(f"correction [{label}]: {len(texts)} texts, {detected} detected")
+
+
+def bench_correction(args: argparse.Namespace) -> None:
+    from correction_detector import CorrectionDetector
+
+    texts = _correction_texts(args.transcript) * (1 if args.transcript else 200)
+    print(f"correction（{len(texts)} texts）")
+    print(f"{'profile':>16} {'reference ms':>13} {'detector ms':>12}")
+    for label, patterns, high in _correction_profiles():
+        detector = CorrectionDetector(patterns, high)
+        reference = best_of(lambda: [reference_detect(text, patterns, high) for text in texts])
+        fused = best_of(lambda: [detector.detect(text) for text in texts])
+        print(f"{label:>16} {reference * 1000:>13.1f} {fused * 1000:>12.1f}")
+
+
+# ===============================
+# feedback-parser: フィードバック YAML の1パス限定パーサ
+# ===============================
+
+# 生成して確かめるフィードバックの件数
+FEEDBACK_CORPUS_SIZE = 2000
+
+
+def reference_parse_feedback_yaml(filepath: str) -> Optional[Dict]:
+    """
+    従来の正規表現版。ファイル全体に複数行の正規表現をフィールドごとにかけ、
+    切り出したセクションを行に分け直して走査する（閉じないセクションでは後戻りが指数的に増える）
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception:
+        return None
+
+    result = {
+        'id': None,
+        'triage_status': None,
+        'improvement_targets': [],
+        'errors': [],
+        'user_corrections': [],
+    }
+
+    # ID
+    match = re.search(r'^id:\s*(\S+)', content, re.MULTILINE)
+    if match:
+        result['id'] = match.group(1)
+
+    # triage.status
+    match = re.search(r'triage:\s*\n\s+status:\s*(\S+)', content)
+    if match:
+        result['triage_status'] = match.group(1)
+
+    # improvement_targets セクションを抽出（ネスト構造を含む全行をキャプチャ）
+    targets_match = re.search(
+        r'improvement_targets:\s*\n((?:\s{4,}.*\n?)+?)(?=\n\s{2}\w+:|\Z)',
+        content
+    )
+    if targets_match:
+        targets_section = targets_match.group(1)
+        result['improvement_targets'] = _reference_improvement_targets(targets_section)
+
+    # errors セクションからキーワードを抽出（ネスト構造を含む）
+    errors_match = re.search(
+        r'^\s+errors:\s*\n((?:\s{4,}.*\n?)+?)(?=\n\s{2}\w+:|\Z)',
+        content,
+        re.MULTILINE
+    )
+    if errors_match:
+        errors_section = errors_match.group(1)
+        result['errors'] = _reference_error_keywords(errors_section)
+
+    # user_corrections セクションからキーワードと詳細を抽出
+    # items: セクションを探す（ネスト構造を含む全行をキャプチャ）
+    items_match = re.search(
+        r'user_corrections:\s*\n\s+count:\s*\d+\s*\n\s+items:\s*\n((?:\s{6,}.*\n?)+)',
+        content
+    )
+    if items_match:
+        items_section = items_match.group(1)
+        result['user_corrections'] = _reference_correction_keywords(items_section)
+        result['user_correction_items'] = _reference_correction_items(items_section)
+    else:
+        result['user_correction_items'] = []
+
+    return result
+
+
+def _reference_improvement_targets(section: str) -> List[Dict]:
+    """improvement_targets セクションをパース"""
+    targets = []
+    current_target = {}
+
+    for line in section.split('\n'):
+        if re.match(r'\s+-\s+target:', line):
+            if current_target:
+                targets.append(current_target)
+            current_target = {'keywords': [], 'avg_confidence': 1.0, 'file': None, 'section': None, 'type': None}
+        elif 'type:' in line and current_target:
+            match = re.search(r'type:\s*["\']?(\S+?)["\']?$', line)
+            if match:
+                current_target['type'] = match.group(1).strip('"\'')
+        elif 'file:' in line and current_target:
+            match = re.search(r'file:\s*["\']?(.+?)["\']?\s*$', line)
+            if match:
+                current_target['file'] = match.group(1).strip('"\'')
+        elif 'section:' in line and current_target:
+            match = re.search(r'section:\s*["\']?(.+?)["\']?\s*$', line)
+            if match:
+                current_target['section'] = match.group(1).strip('"\'')
+        elif 'avg_confidence:' in line and current_target:
+            match = re.search(r'avg_confidence:\s*([\d.]+)', line)
+            if match:
+                current_target['avg_confidence'] = float(match.group(1))
+        elif 'keywords:' in line and current_target:
+            # keywords リストを抽出
+            match = re.search(r'keywords:\s*\[(.+?)\]', line)
+            if match:
+                keywords_str = match.group(1)
+                current_target['keywords'] = [
+                    k.strip().strip('"\'')
+                    for k in keywords_str.split(',')
+                ]
+
+    if current_target:
+        targets.append(current_target)
+
+    return targets
+
+
+def _reference_error_keywords(section: str) -> List[str]:
+    """errors セクションからキーワードを抽出"""
+    keywords = []
+    matches = re.findall(r'matched_keywords:\s*\[(.+?)\]', section)
+    for match in matches:
+        for kw in match.split(','):
+            kw = kw.strip().strip('"\'')
+            if kw:
+                keywords.append(kw)
+    return keywords
+
+
+def _reference_correction_keywords(section: str) -> List[str]:
+    """user_corrections セクションからキーワードを抽出"""
+    keywords = []
+    # patterns から抽出
+    matches = re.findall(r'patterns:\s*\[(.+?)\]', section)
+    for match in matches:
+        for kw in match.split(','):
+            kw = kw.strip().strip('"\'')
+            if kw:
+                keywords.append(kw)
+    return keywords
+
+
+def _reference_correction_items(section: str) -> List[Dict]:
+    """user_corrections セクションから詳細情報を抽出"""
+    items = []
+    current_item = {}
+
+    for line in section.split('\n'):
+        if re.match(r'\s+-\s+line:', line):
+            if current_item:
+                items.append(current_item)
+            current_item = {'excerpt': '', 'patterns': [], 'linked_target': None}
+        elif 'excerpt:' in line and current_item is not None:
+            match = re.search(r'excerpt:\s*["\']?(.+?)["\']?\s*$', line)
+            if match:
+                current_item['excerpt'] = match.group(1)[:100]
+        elif 'patterns:' in line and current_item is not None:
+            match = re.search(r'patterns:\s*\[(.+?)\]', line)
+            if match:
+                current_item['patterns'] = [
+                    p.strip().strip('"\'') for p in match.group(1).split(',')
+                ]
+        elif 'linked_target:' in line and current_item is not None:
+            current_item['linked_target'] = True
+
+    if current_item:
+        items.append(current_item)
+
+    return items
+
+
+
+
+# 従来の実装が返すフィールド（新しいパーサは要約のフィールドも返す）
+REFERENCE_FIELDS = ('id', 'triage_status', 'improvement_targets', 'errors', 'user_corrections', 'user_correction_items')
+
+# Stop hook（stop_hook_collect.sh）が書く要約部分。extracted は extract_transcript.py の出力を続ける
+STOP_HOOK_HEADER = """# Auto-generated by Stop hook
+id: {id}
+created_at: 2026-04-01T09:00:00Z
+session_id: session-{n:06d}
+transcript_path: /home/u/.claude/projects/p/{n:06d}.jsonl
+
+# セッション統計
+stats:
+  message_count: {messages}
+  tool_uses: 12
+  code_changes: 3
+  collection_reason: code_changes
+
+# P3: 自動推定（inferred: true = ヒューリスティック推定値）
+task_summary: "{summary}"
+outcome:
+  success: {success}
+  score: null
+  rationale: "自動推定"
+  inferred: true
+  confidence: medium
+
+issues: []
+
+# プライバシー
+privacy:
+  redacted: false
+
+# トリアージ（初期状態）
+triage:
+  status: {status}
+  priority: medium
+
+"""
+
+# collect_feedback.sh（手動記録）が書く形
+MANUAL_FEEDBACK = """id: {id}
+created_at: 2026-04-01T09:00:00Z
+task_summary: "{summary}"
+outcome:
+  success: {success}
+  rationale: "手動記録"
+issues: []
+source: self
+triage:
+  status: {status}
+  priority: low
+"""
+
+# 値に使う文字列（クォート・エスケープ・コロン・# ・日英を含む）
+FEEDBACK_WORDS = [
+    "git", "push", "テスト", "フロー", "API", "think-hard", "a:b", "# 見出し", "'single'", 'say "hi"',
+    "back\\slash", "tab\there", "line\nbreak", "x" * 130, "", "[bracket]", "comma, inside",
+]
+
+
+def _random_extracted(rng) -> dict:
+    """extract_transcript.py に渡す extracted（件数・リンクの有無・値を乱択）"""
+    def text(words: int) -> str:
+        return " ".join(rng.choice(FEEDBACK_WORDS) for _ in range(words))
+
+    def keywords() -> List[str]:
+        return [rng.choice(FEEDBACK_WORDS[:8]) for _ in range(rng.randint(0, 4))]
+
+    def target() -> dict:
+        return {
+            "type": rng.choice(["skill", "claude_md", "rules"]),
+            "file": rng.choice(["skills/a/SKILL.md", "CLAUDE.md", "RULES.md", None]),
+            "section": rng.choice(["## 手順", "## A: B", "## 1. 準備", None]),
+            "confidence": rng.choice([0.3, 0.5, 0.86]),
+            "matched_keywords": keywords(),
+        }
+
+    errors = []
+    for i in range(rng.randint(0, 4)):
+        err = {"kind": "tool_error", "tool": "Bash", "message": text(3), "line": i + 1}
+        if rng.random() < 0.7:
+            err["linked_target"] = target()
+        if rng.random() < 0.5:
+            err["context_keywords"] = keywords()
+        errors.append(err)
+    items = []
+    for i in range(rng.randint(0, 4)):
+        item = {
+            "line": i + 2,
+            "excerpt": text(rng.randint(0, 3)),
+            "patterns": rng.sample(["negation", "instruction_reminder", "expectation_check"], rng.randint(0, 2)),
+            "score": rng.randint(0, 5),
+        }
+        if rng.random() < 0.3:
+            item["linked_skill"] = "skills/a"
+        if rng.random() < 0.6:
+            item["linked_target"] = target()
+        items.append(item)
+    targets = [
+        {
+            "target": {key: value for key, value in target().items() if key in ("type", "file", "section")},
+            "errors": rng.randint(0, 3),
+            "corrections": rng.randint(0, 3),
+            "raw_blame_score": 4,
+            "blame_score": 2.5,
+            "avg_confidence": rng.choice([0.2, 0.5, 0.86, 1.0]),
+            "keywords": keywords(),
+        }
+        for _ in range(rng.randint(0, 3))
+    ]
+    return {
+        "skills_used": [{"name": "api", "count": 2, "first_line": 1, "last_line": 9}] if rng.random() < 0.5 else [],
+        "changed_files": [{"path": "src/a.py", "op": "edit", "via": "Edit"}] if rng.random() < 0.5 else [],
+        "errors": errors,
+        "user_corrections": {"count": len(items), "items": items},
+        "improvement_targets": targets,
+    }
+
+
+def feedback_corpus(count: int, seed: int = 0) -> List[str]:
+    """Stop hook / collect_feedback.sh と同じ形の fb-*.yaml の内容"""
+    from extract_transcript import format_yaml_output
+
+    rng = random.Random(seed)
+    docs = []
+    for n in range(count):
+        fields = {
+            "id": f"fb-20260401-{n:03d}",
+            "n": n,
+            "messages": rng.randint(1, 500),
+            "summary": rng.choice(["ベンチマーク", "fix \\\"quoted\\\"", "(自動抽出失敗)"]),
+            "success": rng.choice(["true", "false", "unknown"]),
+            "status": rng.choice(["open", "triaged", "fixed", "wont_fix"]),
+        }
+        if rng.random() < 0.1:
+            docs.append(MANUAL_FEEDBACK.format(**fields))
+            continue
+        doc = STOP_HOOK_HEADER.format(**fields)
+        if rng.random() < 0.9:
+            doc += "\n# 自動抽出された詳細情報\n" + format_yaml_output(_random_extracted(rng)) + "\n"
+        docs.append(doc)
+    return docs
+
+
+def _feedback_files(dirs: List[str]) -> List[str]:
+    files = []
+    for path in dirs:
+        for directory in (path, os.path.join(path, "archive")):
+            if os.path.isdir(directory):
+                files.extend(
+                    os.path.join(directory, name)
+                    for name in sorted(os.listdir(directory))
+                    if name.startswith("fb-") and name.endswith(".yaml")
+                )
+    return files
+
+
+def check_feedback_parser(args: argparse.Namespace, report: Report) -> None:
+    from feedback_parser import FeedbackParseCache, parse_feedback_yaml
+
+    with tempfile.TemporaryDirectory() as tmp:
+        written = []
+        for i, doc in enumerate(feedback_corpus(FEEDBACK_CORPUS_SIZE)):
+            path = os.path.join(tmp, f"fb-corpus-{i}.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(doc)
+            written.append(path)
+        files = _feedback_files(args.feedback_dir)
+
+        undecodable = 0
+        cache = FeedbackParseCache(os.path.join(tmp, "records.marshal"))
+        for path in written + files:
+            expected = reference_parse_feedback_yaml(path)
+            actual = parse_feedback_yaml(path)
+            if expected is None:
+                # 従来の実装は復号できないファイルを捨てていた（新しいパーサは置き換えて読む）
+                undecodable += 1
+            elif {field: actual[field] for field in REFERENCE_FIELDS} != expected:
+                report(f"{path}: expected={expected} actual={actual}")
+            header = parse_feedback_yaml(path, extracted=False)
+            if header != {key: value for key, value in actual.items() if key in header}:
+                report(f"{path}: header={header} actual={actual}")
+            if cache.parse(path) != actual:
+                report(f"{path}: cached result differs")
+        print(f"feedback-parser: {len(written)} generated, {len(files)} files ({undecodable} not decodable)")
+
+        # 保存したキャッシュを読み直しても、スレッド・プロセスで並行に解析しても同じ結果か
+        cache.save()
+        warm = FeedbackParseCache(os.path.join(tmp, "records.marshal"))
+        checked = written + files
+        for path, record in zip(checked, warm.parse_many(checked)):
+            if record != cache.parse(path):
+                report(f"{path}: cached result changed after reload")
+        parallel = FeedbackParseCache(os.path.join(tmp, "parallel.marshal"))
+        for path, record in zip(checked, parallel.parse_many(checked, jobs=4)):
+            if record != parse_feedback_yaml(path):
+                report(f"{path}: parse_many(jobs=4) differs")
+        print(f"feedback-parser cache: stat hits {warm.stat_hits}, parallel parsed {parallel.parsed}")
+
+
+def synthetic_feedback(entries: int) -> str:
+    """Stop hook と同じ形の合成フィードバック（extracted の各セクション entries 件）"""
+    from extract_transcript import format_yaml_output
+
+    linked = {"type": "skill", "file": "skills/s/SKILL.md", "section": "## 手順", "confidence": 0.5}
+    extracted = {
+        "errors": [
+            {
+                "kind": "tool_error", "tool": "Bash", "message": f"error {i} in src/f{i % 17}.py", "line": i + 1,
+                "linked_target": dict(linked, matched_keywords=[f"k{i % 29}", "git"]),
+                "context_keywords": [f"c{i % 31}", "push"],
+            }
+            for i in range(entries)
+        ],
+        "user_corrections": {
+            "count": entries,
+            "items": [
+                {
+                    "line": i + 2, "excerpt": f"いや違う {i}", "patterns": ["negation"], "score": 2,
+                    "linked_target": linked,
+                }
+                for i in range(entries)
+            ],
+        },
+        "improvement_targets": [
+            {
+                "target": {"type": "skill", "file": f"skills/s{i}/SKILL.md", "section": "## 手順"},
+                "errors": i % 5, "corrections": 1, "raw_blame_score": 4, "blame_score": 2.5,
+                "avg_confidence": i % 10 / 10, "keywords": [f"k{i % 29}", f"t{i}"],
+            }
+            for i in range(entries)
+        ],
+    }
+    fields = {"id": f"fb-bench-{entries}", "n": 0, "messages": 100, "summary": "bench", "success": "true", "status": "open"}
+    return STOP_HOOK_HEADER.format(**fields) + "\n# 自動抽出された詳細情報\n" + format_yaml_output(extracted) + "\n"
+
+
+def bench_feedback_parser(args: argparse.Namespace) -> None:
+    from feedback_parser import parse_feedback_yaml
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fb-bench.yaml")
+        print("feedback-parser（Stop hook 形式、extracted の各セクション N 件）")
+        print(f"{'N':>6} {'lines':>7} {'KiB':>7} {'reference ms':>13} {'parser ms':>10} {'parser us/line':>15}")
+        for entries in (100, 200, 400, 800, 1600):
+            text = synthetic_feedback(entries)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            lines = text.count("\n")
+            reference = best_of(reference_parse_feedback_yaml, path)
+            parser = best_of(parse_feedback_yaml, path)
+            print(
+                f"{entries:>6} {lines:>7} {len(text.encode()) / 1024:>7.0f} "
+                f"{reference * 1000:>13.2f} {parser * 1000:>10.2f} {parser / lines * 1e6:>15.2f}"
+            )
+
+
+# ===============================
+# clusters: キーワードの共起クラスタリング
+# ===============================
+
+def reference_cluster_keywords_by_cooccurrence(
+    keyword_fb_map: Dict[str, Set[str]],
+) -> List[Tuple[Set[str], Set[str]]]:
+    """従来の総当たり版"""
+    if not keyword_fb_map:
+        return []
+
+    keywords = list(keyword_fb_map.keys())
+    clusters = []
+    used = set()
+
+    for kw in keywords:
+        if kw in used:
+            continue
+
+        cluster = {kw}
+        fb_ids = set(keyword_fb_map[kw])
+
+        for other_kw in keywords:
+            if other_kw in used or other_kw == kw:
+                continue
+
+            other_fb_ids = keyword_fb_map[other_kw]
+            intersection = len(fb_ids & other_fb_ids)
+            union = len(fb_ids | other_fb_ids)
+
+            if union > 0 and intersection / union > 0.5:
+                cluster.add(other_kw)
+                fb_ids |= other_fb_ids
+
+        for c in cluster:
+            used.add(c)
+
+        clusters.append((cluster, fb_ids))
+
+    return clusters
+
+
+def synthetic_keyword_map(num_keywords: int, num_feedbacks: int, seed: int = 0) -> Dict[str, Set[str]]:
+    """
+    話題ごとに fb を共有するキーワード群の合成データ。
+
+    8 キーワード前後で1つの話題を作り、各キーワードは話題の fb の一部と少数の無関係な fb に出現する。
+    """
+    from recommend_structure import MIN_DOC_FREQUENCY
+
+    rng = random.Random(seed)
+    fb_ids = [f"fb-{i:06d}" for i in range(num_feedbacks)]
+    keyword_map: Dict[str, Set[str]] = {}
+    topic: List[str] = []
+    for i in range(num_keywords):
+        if i % 8 == 0:
+            topic = rng.sample(fb_ids, min(num_feedbacks, rng.randint(MIN_DOC_FREQUENCY, 12)))
+        picked = set(rng.sample(topic, rng.randint(min(len(topic), MIN_DOC_FREQUENCY), len(topic))))
+        picked.update(rng.sample(fb_ids, min(num_feedbacks, rng.randint(0, 2))))
+        keyword_map[f"kw{i:06d}"] = picked
+    names = list(keyword_map)
+    rng.shuffle(names)
+    return {name: keyword_map[name] for name in names}
+
+
+def _cluster_signature(clusters: List[Tuple[Set[str], Set[str]]]) -> List[Tuple[List[str], List[str]]]:
+    # クラスター内のキーワードの並び（レポートの先頭5件）も含めて比べる
+    return [(list(cluster), sorted(fb_ids)) for cluster, fb_ids in clusters]
+
+
+def check_clusters(args: argparse.Namespace, report: Report) -> None:
+    from recommend_structure import cluster_keywords_by_cooccurrence
+
+    rng = random.Random(0)
+    cases = []
+    for _ in range(2000):
+        num_feedbacks = rng.randint(1, 30)
+        fb_ids = [f"fb-{i}" for i in range(num_feedbacks)]
+        cases.append({
+            f"kw{k}": set(rng.sample(fb_ids, rng.randint(0, min(num_feedbacks, rng.choice((2, 4, 8, 30))))))
+            for k in range(rng.randint(0, 60))
+        })
+    cases.append(synthetic_keyword_map(2000, 1000, seed=1))
+
+    for i, keyword_map in enumerate(cases):
+        expected = _cluster_signature(reference_cluster_keywords_by_cooccurrence(keyword_map))
+        actual = _cluster_signature(cluster_keywords_by_cooccurrence(keyword_map))
+        if expected != actual:
+            report(f"clusters case #{i}: {len(keyword_map)} keywords")
+    print(f"clusters: {len(cases)} cases")
+
+
+def bench_clusters(args: argparse.Namespace) -> None:
+    from recommend_structure import cluster_keywords_by_cooccurrence
+
+    # 従来の総当たりはキーワード数の2乗で遅くなるので、小さい入力だけ測る
+    print("clusters（キーワード数 / fb 数）")
+    print(f"{'keywords':>9} {'feedbacks':>10} {'reference ms':>13} {'index ms':>9}")
+    for num_keywords, num_feedbacks in ((1000, 500), (2000, 1000), (5000, 2500), (20000, 10000)):
+        keyword_map = synthetic_keyword_map(num_keywords, num_feedbacks)
+        reference = "-"
+        if num_keywords <= 2000:
+            reference = f"{best_of(reference_cluster_keywords_by_cooccurrence, keyword_map, repeat=1) * 1000:.0f}"
+        indexed = best_of(cluster_keywords_by_cooccurrence, keyword_map)
+        print(f"{num_keywords:>9} {num_feedbacks:>10} {reference:>13} {indexed * 1000:>9.0f}")
+
+
+# ===============================
+# similarity: セクション間類似度（分割候補の検出）
+# ===============================
+
+def reference_similarity_pairs(keyword_sets: List[Set[str]], threshold: float) -> List[Tuple[int, int]]:
+    """従来のセクション総当たりの類似度計算部分"""
+    pairs = []
+    for i, kw1 in enumerate(keyword_sets):
+        for j, kw2 in enumerate(keyword_sets):
+            if i >= j:
+                continue
+            intersection = len(kw1 & kw2)
+            union = len(kw1 | kw2)
+            similarity = intersection / union if union > 0 else 0
+            if similarity <= threshold:
+                pairs.append((i, j))
+    return pairs
+
+
+def synthetic_section_keyword_sets(num_sections: int, seed: int = 0) -> List[Set[str]]:
+    """
+    1つの skill ファイルのセクションごとのキーワード集合の合成データ。
+
+    セクションは4つずつ話題を共有し、話題の語・セクション固有の語・共通の語から選ぶ
+    （類似度が高い組と低い組が混ざる）。
+    """
+    rng = random.Random(seed)
+    common = [f"common{i}" for i in range(10)]
+    keyword_sets = []
+    for section in range(num_sections):
+        vocabulary = [f"topic{section // 4}w{i}" for i in range(12)] + [f"own{section}w{i}" for i in range(4)] + common
+        keywords: Set[str] = set()
+        for _ in range(rng.randint(3, 8)):
+            keywords.update(rng.sample(vocabulary, 5))
+        keyword_sets.append(keywords)
+    return keyword_sets
+
+
+def _similarity_backends() -> List[str]:
+    import recommend_structure
+
+    return ["bitset"] + (["numpy"] if recommend_structure.numpy is not None else [])
+
+
+def check_similarity(args: argparse.Namespace, report: Report) -> None:
+    from recommend_structure import MAX_JACCARD_SIMILARITY, low_similarity_pairs
+
+    # 小さい語彙で、閾値ちょうどの類似度（3/10 など）や空集合の組が出やすい入力
+    rng = random.Random(0)
+    cases = []
+    for _ in range(1000):
+        vocabulary = [f"kw{i}" for i in range(rng.randint(1, 12))]
+        cases.append([
+            set(rng.sample(vocabulary, rng.randint(0, len(vocabulary)))) for _ in range(rng.randint(0, 12))
+        ])
+    cases += [synthetic_section_keyword_sets(40, seed=1), synthetic_section_keyword_sets(200, seed=2)]
+
+    backends = _similarity_backends()
+    for i, keyword_sets in enumerate(cases):
+        expected = reference_similarity_pairs(keyword_sets, MAX_JACCARD_SIMILARITY)
+        for backend in backends:
+            if low_similarity_pairs(keyword_sets, backend=backend) != expected:
+                report(f"similarity case #{i} ({backend}): {len(keyword_sets)} sections")
+    print(f"similarity: {len(cases)} cases ({', '.join(backends)})")
+
+
+def bench_similarity(args: argparse.Namespace) -> None:
+    from recommend_structure import MAX_JACCARD_SIMILARITY, low_similarity_pairs
+
+    backends = _similarity_backends()
+    print("similarity（1つの skill ファイルのセクション数）")
+    print(f"{'sections':>9} {'reference ms':>13}" + "".join(f" {backend + ' ms':>10}" for backend in backends))
+    for num_sections in (10, 25, 50, 100, 200):
+        keyword_sets = synthetic_section_keyword_sets(num_sections)
+        row = f"{num_sections:>9} {best_of(reference_similarity_pairs, keyword_sets, MAX_JACCARD_SIMILARITY) * 1000:>13.1f}"
+        for backend in backends:
+            row += f" {best_of(lambda: low_similarity_pairs(keyword_sets, backend=backend)) * 1000:>10.1f}"
+        print(row)
+
+
+# ===============================
+# split: 分割候補の検出
+# ===============================
+
+def reference_detect_split_candidates(feedbacks: List[Dict]) -> List[Dict]:
+    """従来のセクション総当たり版"""
+    from feedback_index import is_valid_keyword, normalize_keyword
+    from recommend_structure import MAX_JACCARD_SIMILARITY, MIN_CLUSTER_SIZE
+
+    # skill ファイル → セクション → キーワード集合
+    skill_sections: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+    # skill ファイル → セクション → fb_id 集合
+    skill_section_fb_ids: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+
+    for fb in feedbacks:
+        fb_id = fb.get("id")
+        if not fb_id:
+            continue
+
+        for target in fb.get("improvement_targets", []):
+            if target.get("type") != "skill":
+                continue
+
+            file_path = target.get("file")
+            section = target.get("section")
+            if not file_path or not section:
+                continue
+
+            for kw in target.get("keywords", []):
+                if is_valid_keyword(kw):
+                    normalized = normalize_keyword(kw)
+                    skill_sections[file_path][section].add(normalized)
+                    skill_section_fb_ids[file_path][section].add(fb_id)
+
+    # 分割候補を検出
+    candidates = []
+
+    for skill_file, sections in skill_sections.items():
+        if len(sections) < 2:
+            continue
+
+        # セクション間の Jaccard 類似度を計算
+        section_names = list(sections.keys())
+        clusters = []
+
+        for i, sec1 in enumerate(section_names):
+            kw1 = sections[sec1]
+            fb1 = skill_section_fb_ids[skill_file][sec1]
+
+            # 十分な fb がなければスキップ
+            if len(fb1) < MIN_CLUSTER_SIZE:
+                continue
+
+            is_distinct = True
+            for j, sec2 in enumerate(section_names):
+                if i >= j:
+                    continue
+
+                kw2 = sections[sec2]
+                fb2 = skill_section_fb_ids[skill_file][sec2]
+
+                if len(fb2) < MIN_CLUSTER_SIZE:
+                    continue
+
+                # Jaccard 類似度
+                intersection = len(kw1 & kw2)
+                union = len(kw1 | kw2)
+                similarity = intersection / union if union > 0 else 0
+
+                if similarity <= MAX_JACCARD_SIMILARITY:
+                    # 類似度が低い = 分割推奨
+                    clusters.append({
+                        "section": sec1,
+                        "keywords": list(kw1)[:5],
+                        "fb_count": len(fb1),
+                    })
+                    clusters.append({
+                        "section": sec2,
+                        "keywords": list(kw2)[:5],
+                        "fb_count": len(fb2),
+                    })
+
+        # 重複を除去してクラスターをまとめる
+        unique_clusters = {}
+        for c in clusters:
+            key = c["section"]
+            if key not in unique_clusters:
+                unique_clusters[key] = c
+
+        if len(unique_clusters) >= 2:
+            candidates.append({
+                "skill_path": skill_file,
+                "clusters": list(unique_clusters.values()),
+                "total_fb_count": sum(c["fb_count"] for c in unique_clusters.values()),
+                "proposed_splits": [
+                    f"{skill_file.replace('.md', '')}-{normalize_keyword(c['section'].replace('##', '').strip())}"
+                    for c in list(unique_clusters.values())[:2]
+                ],
+            })
+
+    # total_fb_count で降順ソート
+    candidates.sort(key=lambda x: x["total_fb_count"], reverse=True)
+
+    return candidates[:3]  # 上位3件まで
+
+
+def synthetic_split_feedbacks(num_sections: int, num_skills: int = 1, seed: int = 0) -> List[Dict]:
+    """
+    skill ファイルごとに num_sections 個の ## セクションへ指摘が分散した合成フィードバック。
+
+    セクションは4つずつ話題を共有し、話題の語と共通の語からキーワードを選ぶ（類似度が高い組と低い組が混ざる）。
+    """
+    rng = random.Random(seed)
+    common = [f"common{i}" for i in range(10)]
+    feedbacks = []
+    for skill in range(num_skills):
+        skill_file = f"skills/s{skill}/SKILL.md"
+        vocabularies = []
+        for section in range(num_sections):
+            topic = [f"topic{skill}x{section // 4}w{i}" for i in range(12)]
+            vocabularies.append(topic + [f"own{skill}x{section}w{i}" for i in range(4)] + common)
+        for n in range(num_sections * 6):
+            targets = []
+            for section in rng.sample(range(num_sections), min(num_sections, rng.randint(1, 3))):
+                targets.append({
+                    "type": "skill",
+                    "file": skill_file,
+                    "section": f"## セクション {section}",
+                    "keywords": rng.sample(vocabularies[section], 5),
+                    "avg_confidence": 1.0,
+                })
+            feedbacks.append({"id": f"fb-{skill}-{n:05d}", "improvement_targets": targets})
+    return feedbacks
+
+
+def _random_split_feedbacks(rng: random.Random) -> List[Dict]:
+    """小さい語彙・少ない fb で、閾値ちょうどの類似度や fb 不足のセクションが出やすい入力"""
+    vocabulary = [f"kw{i}" for i in range(rng.randint(1, 12))]
+    feedbacks = []
+    for n in range(rng.randint(0, 40)):
+        targets = []
+        for _ in range(rng.randint(0, 3)):
+            targets.append({
+                "type": rng.choice(("skill", "skill", "claude_md")),
+                "file": rng.choice(("skills/a/SKILL.md", "skills/b/SKILL.md")),
+                "section": rng.choice(("## A", "## B", "## C", "## D", "## E", "")),
+                "keywords": rng.sample(vocabulary, rng.randint(0, len(vocabulary))),
+            })
+        feedbacks.append({"id": rng.choice((f"fb-{n}", f"fb-{n}", None)), "improvement_targets": targets})
+    return feedbacks
+
+
+def check_split(args: argparse.Namespace, report: Report) -> None:
+    from recommend_structure import KeywordPostings, detect_split_candidates
+
+    rng = random.Random(0)
+    cases = [_random_split_feedbacks(rng) for _ in range(1000)]
+    cases += [synthetic_split_feedbacks(40, num_skills=3, seed=1), synthetic_split_feedbacks(120, seed=2)]
+    backends = _similarity_backends()
+    for i, feedbacks in enumerate(cases):
+        expected = reference_detect_split_candidates(feedbacks)
+        postings = KeywordPostings.from_feedbacks(feedbacks)
+        for backend in backends:
+            if detect_split_candidates(postings, backend=backend) != expected:
+                report(f"split case #{i} ({backend}): {len(feedbacks)} feedbacks")
+    print(f"split: {len(cases)} cases ({', '.join(backends)})")
+
+
+def bench_split(args: argparse.Namespace) -> None:
+    from recommend_structure import KeywordPostings, detect_split_candidates
+
+    # reference はキーワードの正規化を含む（新しい版はインデックスに保存済みのポスティングから始める）
+    backends = _similarity_backends()
+    print("split（1つの skill ファイルのセクション数）")
+    print(f"{'sections':>9} {'reference ms':>13}" + "".join(f" {backend + ' ms':>10}" for backend in backends))
+    for num_sections in (10, 25, 50, 100, 200):
+        feedbacks = synthetic_split_feedbacks(num_sections)
+        postings = KeywordPostings.from_feedbacks(feedbacks)
+        row = f"{num_sections:>9} {best_of(reference_detect_split_candidates, feedbacks) * 1000:>13.1f}"
+        for backend in backends:
+            row += f" {best_of(lambda: detect_split_candidates(postings, backend=backend)) * 1000:>10.1f}"
+        print(row)
+
+
+# ===============================
+# near-duplicates: 未検出の指摘の近似重複グループ化
+# ===============================
+
+def reference_near_duplicate_groups(texts: List[str]) -> List[List[int]]:
+    """全組の Jaccard 類似度を求める総当たり版（閾値・シングルの文字数は near_duplicates.py の既定値）"""
+    from near_duplicates import DEFAULT_THRESHOLD, SHINGLE_SIZE, _group_indices, _shingle_hashes, _unique_texts, jaccard
+
+    by_text, uniques = _unique_texts(texts)
+    sets = [_shingle_hashes(text, SHINGLE_SIZE) for text in uniques]
+    parent = list(range(len(uniques)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(sets)):
+        for j in range(i + 1, len(sets)):
+            if jaccard(sets[i], sets[j]) >= DEFAULT_THRESHOLD:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+    return _group_indices(by_text, uniques, parent)
+
+
+EXCERPT_PHRASES = [
+    "なんでそうなるの", "さっき言ったよね", "テストを先に書いて", "勝手にファイルを消さないで",
+    "型を確認してから直して", "そのブランチじゃない", "コミットは分けて", "ログを見てから判断して",
+    "don't touch the config", "why did you rebase", "use the existing helper", "stop adding comments",
+]
+EXCERPT_FILLER = "あいうえおかきくけこさしすせそたちつてとなにぬねのabcdefghij 0123456789"
+
+# 総当たりで Jaccard 0.8 以上の組のうち、同じグループに入っているべき割合
+MIN_STRONG_PAIR_RECALL = 0.99
+
+
+def _mutate(rng: random.Random, text: str, edits: int) -> str:
+    chars = list(text)
+    for _ in range(edits):
+        op = rng.random()
+        position = rng.randrange(len(chars) + 1)
+        if op < 0.4 or not chars:
+            chars.insert(position, rng.choice(EXCERPT_FILLER))
+        elif op < 0.7:
+            del chars[min(position, len(chars) - 1)]
+        else:
+            chars[min(position, len(chars) - 1)] = rng.choice(EXCERPT_FILLER)
+    return "".join(chars)
+
+
+def synthetic_excerpts(count: int, seed: int = 0) -> List[str]:
+    """定型の言い回しを少しずつ崩したもの・前後に文脈を足したもの・無関係な文の混ざった合成データ"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            phrase = rng.choice(EXCERPT_PHRASES)
+            text = _mutate(rng, phrase, rng.randint(0, 3))
+            if rng.random() < 0.5:
+                text = "".join(rng.choice(EXCERPT_FILLER) for _ in range(rng.randint(0, 8))) + text
+        elif roll < 0.6:
+            text = rng.choice(EXCERPT_PHRASES)
+        else:
+            text = "".join(rng.choice(EXCERPT_FILLER) for _ in range(rng.randint(6, 60)))
+        texts.append(text)
+    return texts
+
+
+def _near_duplicate_backends() -> List[str]:
+    import near_duplicates
+
+    return ["python"] + (["numpy"] if near_duplicates.numpy is not None else [])
+
+
+def check_near_duplicates(args: argparse.Namespace, report: Report) -> None:
+    from near_duplicates import _unique_texts, common_phrase, jaccard, near_duplicate_groups, shingles
+
+    rng = random.Random(0)
+    cases = [synthetic_excerpts(rng.randint(0, 60), seed=i) for i in range(300)]
+    cases += [synthetic_excerpts(1500, seed=1000), ["", "  ", "ab", "ab", "AB", "ａｂ"]]
+    backends = _near_duplicate_backends()
+
+    strong_pairs = 0
+    strong_found = 0
+    for i, texts in enumerate(cases):
+        expected = reference_near_duplicate_groups(texts)
+        group_of = {index: g for g, members in enumerate(expected) for index in members}
+        results = {backend: near_duplicate_groups(texts, backend=backend) for backend in backends}
+        if any(groups != results["python"] for groups in results.values()):
+            report(f"near-duplicates case #{i}: backends disagree")
+        groups = results["python"]
+
+        # 誤結合がない: どのグループも総当たりの1つのグループに収まる
+        for members in groups:
+            if len({group_of.get(index) for index in members}) != 1 or group_of.get(members[0]) is None:
+                report(f"near-duplicates case #{i}: group {members[:5]} spans reference groups")
+
+        # 取りこぼし: Jaccard 0.8 以上の組が同じグループに入っているか
+        found_group = {index: g for g, members in enumerate(groups) for index in members}
+        by_text, uniques = _unique_texts(texts)
+        sets = [shingles(text) for text in uniques]
+        for a in range(len(uniques)):
+            for b in range(a + 1, len(uniques)):
+                if jaccard(sets[a], sets[b]) >= 0.8:
+                    strong_pairs += 1
+                    index_a, index_b = by_text[uniques[a]][0], by_text[uniques[b]][0]
+                    if index_a in found_group and found_group.get(index_a) == found_group.get(index_b):
+                        strong_found += 1
+
+        # 正規化後に同じテキストは必ず同じグループ
+        for indices in by_text.values():
+            if len(indices) >= 2 and len({found_group.get(index) for index in indices}) != 1:
+                report(f"near-duplicates case #{i}: identical texts split")
+
+    recall = strong_found / strong_pairs if strong_pairs else 1.0
+    print(
+        f"near-duplicates: {len(cases)} cases ({', '.join(backends)}), "
+        f"Jaccard >= 0.8 の組の再現率 {recall:.4f} ({strong_found}/{strong_pairs})"
+    )
+    if recall < MIN_STRONG_PAIR_RECALL:
+        report(f"near-duplicates: recall {recall:.4f} < {MIN_STRONG_PAIR_RECALL}")
+
+    phrase = common_phrase(["なんでそうなるの？", "えっ なんでそうなるの", "なんでそうなるのかな", "全然違う"])
+    if phrase != "なんでそうなるの":
+        report(f"common_phrase: {phrase!r}")
+
+
+def bench_near_duplicates(args: argparse.Namespace) -> None:
+    from near_duplicates import near_duplicate_groups
+
+    # 総当たりは件数の2乗で遅くなるので、小さい入力だけ測る
+    backends = _near_duplicate_backends()
+    print("near-duplicates（excerpt 数）")
+    print(f"{'excerpts':>9} {'reference ms':>13}" + "".join(f" {backend + ' ms':>10}" for backend in backends))
+    for count in (1000, 2000, 10000, 50000):
+        texts = synthetic_excerpts(count)
+        reference = "-"
+        if count <= 2000:
+            reference = f"{best_of(reference_near_duplicate_groups, texts, repeat=1) * 1000:.0f}"
+        row = f"{count:>9} {reference:>13}"
+        for backend in backends:
+            row += f" {best_of(lambda: near_duplicate_groups(texts, backend=backend), repeat=1) * 1000:>10.0f}"
+        print(row)
+
+
+# ===============================
+# spool: Stop hook のジョブのスプールとワーカー
+# ===============================
+
+def _expire_backoff(spool) -> None:
+    """pending のジョブのバックオフを解除する（待たずに次の試行をさせる）"""
+    from feedback_spool import META_KEY
+
+    for _, path in spool.pending():
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        job.get(META_KEY, {})["not_before"] = 0
+        spool._write(spool.pending_dir, os.path.basename(path), job)
+
+
+def _concurrent_spool_run(directory: str, sessions: int, producers: int, workers: int, jobs: int) -> Tuple[Dict, Dict]:
+    """
+    producers 個のスレッドが jobs 件ずつ置き、workers 個のワーカーが同時に処理する。
+    （session_id ごとに処理した n の列, session_id ごとに最後に置いた n）を返す
+    """
+    import threading
+
+    from feedback_spool import Spool
+
+    spool = Spool(directory)
+    names = [f"c-{i}" for i in range(sessions)]
+    processed: Dict[str, List[int]] = {}
+    latest: Dict[str, int] = {}
+    lock = threading.Lock()
+    enqueue_lock = threading.Lock()
+
+    def processor(job):
+        with lock:
+            processed.setdefault(job["session_id"], []).append(job["n"])
+        time.sleep(0.001)
+        return True, ""
+
+    def producer(offset):
+        for n in range(jobs):
+            session = names[(n + offset) % len(names)]
+            with enqueue_lock:
+                spool.enqueue({"session_id": session, "n": n * 10 + offset})
+                latest[session] = n * 10 + offset
+
+    def worker():
+        for _ in range(20):
+            Spool(directory).work(processor)
+
+    threads = [threading.Thread(target=producer, args=(o,)) for o in range(producers)]
+    threads += [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    spool.work(processor)
+    return processed, latest
+
+
+def check_spool(args: argparse.Namespace, report: Report) -> None:
+    from feedback_spool import MAX_ATTEMPTS, Spool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = Spool(tmp)
+
+        # 同じ session_id のジョブは最新の1件にまとまる
+        for i in range(5):
+            spool.enqueue({"session_id": "s-1", "transcript_path": f"/t/{i}.jsonl"})
+        spool.enqueue({"session_id": "s-2", "transcript_path": "/t/x.jsonl"})
+        seen = []
+        stats = spool.work(lambda job: (seen.append(job["transcript_path"]) or True, ""))
+        if sorted(seen) != ["/t/4.jsonl", "/t/x.jsonl"] or stats["done"] != 2:
+            report(f"spool coalesce by session_id: {seen} {stats}")
+
+        # 失敗は再試行され、MAX_ATTEMPTS 回で dead に移る
+        spool.enqueue({"session_id": "s-3", "transcript_path": "/t/3.jsonl"})
+        for _ in range(MAX_ATTEMPTS):
+            spool.work(lambda job: (False, "boom"), once=True)
+            _expire_backoff(spool)
+        if spool.counts() != {"pending": 0, "running": 0, "dead": 1}:
+            report(f"spool dead after retries: {spool.counts()}")
+        if spool.retry_dead() != 1 or spool.counts()["pending"] != 1:
+            report(f"spool retry-dead: {spool.counts()}")
+        spool.work(lambda job: (True, ""))
+
+        # 失敗中に新しいジョブが来たら古いジョブは捨てる
+        spool.enqueue({"session_id": "s-4", "transcript_path": "/t/old.jsonl"})
+
+        def fail_and_enqueue(job):
+            spool.enqueue({"session_id": "s-4", "transcript_path": "/t/new.jsonl"})
+            return False, "boom"
+
+        stats = spool.work(fail_and_enqueue, once=True)
+        with open(spool.pending()[0][1], "r", encoding="utf-8") as f:
+            pending = json.load(f)
+        if stats["superseded"] != 1 or pending["transcript_path"] != "/t/new.jsonl":
+            report(f"spool superseded: {stats} {pending}")
+        spool.work(lambda job: (True, ""))
+
+        # 異常終了したワーカーのジョブは次のワーカーが（バックオフの後に）拾う
+        spool.enqueue({"session_id": "s-5", "transcript_path": "/t/5.jsonl"})
+        spool.claim(spool.pending()[0][1])
+        seen = []
+        spool.work(lambda job: (seen.append(job["session_id"]) or True, ""), max_wait=0)
+        _expire_backoff(spool)
+        spool.work(lambda job: (seen.append(job["session_id"]) or True, ""))
+        if seen != ["s-5"]:
+            report(f"spool recover running: {seen}")
+
+    # 同時に動くワーカーと hook が多数あっても、各セッションの最新のジョブが最後に処理される
+    with tempfile.TemporaryDirectory() as tmp:
+        processed, latest = _concurrent_spool_run(tmp, sessions=20, producers=4, workers=3, jobs=50)
+        if {session: ns[-1] for session, ns in processed.items()} != latest:
+            report("spool concurrent: the latest job of some session was not processed last")
+        counts = Spool(tmp).counts()
+        if counts != {"pending": 0, "running": 0, "dead": 0}:
+            report(f"spool concurrent: left {counts}")
+    total = sum(len(ns) for ns in processed.values())
+    print(f"spool: {total} extractions for 200 enqueued jobs (20 sessions)")
+
+
+def bench_spool(args: argparse.Namespace) -> None:
+    print("spool（4 つの hook が置いたジョブを 3 つのワーカーで処理。処理は 1 件 1ms）")
+    print(f"{'sessions':>9} {'enqueued':>9} {'processed':>10} {'ms':>8}")
+    for sessions in (1, 20, 50):
+        with tempfile.TemporaryDirectory() as tmp:
+            started = time.perf_counter()
+            processed, _ = _concurrent_spool_run(tmp, sessions=sessions, producers=4, workers=3, jobs=50)
+            elapsed = time.perf_counter() - started
+        total = sum(len(ns) for ns in processed.values())
+        print(f"{sessions:>9} {200:>9} {total:>10} {elapsed * 1000:>8.0f}")
+
+
+# ===============================
+# id-allocator: 同時に保存するセッションからの採番
+# ===============================
+
+# 子プロセス: id_allocator.allocate を count 回呼び、払い出した ID を1行ずつ出力する
+_ALLOCATE_CHILD = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from id_allocator import allocate
+directory, prefix, dates, count = sys.argv[2], sys.argv[3], sys.argv[4].split(","), int(sys.argv[5])
+for i in range(count):
+    print(allocate(directory, prefix, dates[i % len(dates)]), flush=True)
+"""
+
+
+def _concurrent_allocate(directory: str, prefix: str, dates: List[str], workers: int, count: int) -> Tuple[List[str], bool]:
+    """workers 個のプロセスから同時に count 回ずつ採番する（払い出した ID, すべて正常終了したか）"""
+    import subprocess
+
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-c", _ALLOCATE_CHILD, SCRIPTS_DIR, directory, prefix, ",".join(dates), str(count)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    issued = []
+    succeeded = True
+    for proc in procs:
+        out, _ = proc.communicate()
+        issued.extend(out.split())
+        succeeded = succeeded and proc.returncode == 0
+    return issued, succeeded
+
+
+def check_id_allocator(args: argparse.Namespace, report: Report) -> None:
+    """
+    16 プロセスから同時に 100 回ずつ採番し、重複・欠番・予約漏れがないことを確かめる。
+    2つの日付を交互に使い、片方は 999 を跨ぐようにカウンタを進めておく。
+    採番を通さずに作られたファイル・残った予約ファイルを飛ばすことと、カウンタの破損からの復旧も確かめる。
+    """
+    from id_allocator import ARCHIVE_SUBDIR, allocate, format_id, reservation_path
+
+    prefix = "fb"
+    dates = ["20260101", "20260102"]
+    workers, count = 16, 100
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1日目は 990 まで払い出し済み。手で作られたファイル・中断で残った予約と、アーカイブ済みの ID もある
+        with open(os.path.join(tmp, f".seq-{prefix}"), "w", encoding="utf-8") as f:
+            json.dump({dates[0]: 990}, f)
+        manual = [format_id(prefix, dates[0], 995), format_id(prefix, dates[1], 3)]
+        for name in manual:
+            open(os.path.join(tmp, name + ".yaml"), "w").close()
+        leftover = format_id(prefix, dates[0], 997)
+        open(reservation_path(tmp, leftover), "w").close()
+        os.makedirs(os.path.join(tmp, ARCHIVE_SUBDIR))
+        open(os.path.join(tmp, ARCHIVE_SUBDIR, format_id(prefix, dates[1], 1) + ".yaml"), "w").close()
+
+        issued, succeeded = _concurrent_allocate(tmp, prefix, dates, workers, count)
+        if not succeeded:
+            report("id-allocator: a child process failed")
+        if len(issued) != workers * count:
+            report(f"id-allocator: {len(issued)} ids issued (expected {workers * count})")
+        if len(set(issued)) != len(issued):
+            report(f"id-allocator: {len(issued) - len(set(issued))} duplicate ids")
+        if not all(os.path.exists(reservation_path(tmp, i)) for i in issued):
+            report("id-allocator: an issued id has no reservation file")
+        if any(os.path.exists(os.path.join(tmp, i + ".yaml")) for i in issued):
+            report("id-allocator: an empty fb-*.yaml exists for an issued id")
+        # 1日目はカウンタの続きから（手で作られた 995・残った予約 997 は飛ばす）、2日目はディレクトリの最大番号 3 の次から
+        for date, first in ((dates[0], 991), (dates[1], 4)):
+            numbers = sorted(int(i.rsplit("-", 1)[1]) for i in issued if f"-{date}-" in i)
+            skipped = {int(m.rsplit("-", 1)[1]) for m in manual + [leftover] if f"-{date}-" in m} - set(range(first))
+            expected = [n for n in range(first, first + len(numbers) + len(skipped)) if n not in skipped]
+            if numbers != expected:
+                report(f"id-allocator {date}: not contiguous from {first} (skipping existing files)")
+        if format_id(prefix, dates[0], 1000) not in issued:
+            report("id-allocator: did not go past 999 per day")
+
+        # カウンタが壊れてもディレクトリから番号を求め直す（まだ rename されていない予約も数える）
+        issued_second = sorted(i for i in issued if f"-{dates[1]}-" in i)
+        for new_id in issued_second[:-1]:
+            os.rename(reservation_path(tmp, new_id), os.path.join(tmp, new_id + ".yaml"))
+        with open(os.path.join(tmp, f".seq-{prefix}"), "w", encoding="utf-8") as f:
+            f.write("{broken")
+        largest = max(int(i.rsplit("-", 1)[1]) for i in issued_second)
+        recovered = allocate(tmp, prefix, dates[1])
+        if recovered != format_id(prefix, dates[1], largest + 1):
+            report(f"id-allocator: corrupt counter recovered to {recovered}")
+    print(f"id-allocator: {workers * count} ids from {workers} concurrent processes")
+
+
+def bench_id_allocator(args: argparse.Namespace) -> None:
+    from id_allocator import allocate
+
+    # カウンタから進めるので、ディレクトリの fb 数に依らないはず
+    print("id-allocator（ディレクトリの fb 数。serial: このプロセスで 200 回、concurrent: 16 プロセスから 100 回ずつで起動を含む）")
+    print(f"{'files':>7} {'serial ids/s':>13} {'concurrent ids/s':>17}")
+    for files in (0, 1000, 10000):
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in range(1, files + 1):
+                open(os.path.join(tmp, f"fb-20260101-{n:03d}.yaml"), "w").close()
+            serial = best_of(lambda: [allocate(tmp, "fb", "20260101") for _ in range(200)], repeat=1)
+            concurrent = best_of(_concurrent_allocate, tmp, "fb", ["20260101"], 16, 100, repeat=1)
+        print(f"{files:>7} {200 / serial:>13.0f} {1600 / concurrent:>17.0f}")
+
+
+# ===============================
+# CLI
+# ===============================
+
+# 名前 → (一致確認, 時間計測)
+CHECKS: Dict[str, Tuple[Callable, Callable]] = {
+    "correction": (check_correction, bench_correction),
+    "feedback-parser": (check_feedback_parser, bench_feedback_parser),
+    "clusters": (check_clusters, bench_clusters),
+    "similarity": (check_similarity, bench_similarity),
+    "split": (check_split, bench_split),
+    "near-duplicates": (check_near_duplicates, bench_near_duplicates),
+    "spool": (check_spool, bench_spool),
+    "id-allocator": (check_id_allocator, bench_id_allocator),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高速化した処理と従来の実装の一致確認・時間計測")
+    parser.add_argument("names", nargs="*", help=f"対象（{' / '.join(CHECKS)}。既定: すべて）")
+    parser.add_argument("--bench", action="store_true", help="一致確認の代わりに基準実装と時間を比べる")
+    parser.add_argument(
+        "--transcript", action="append", default=[], help="correction の追加コーパスにするトランスクリプト JSONL"
+    )
+    parser.add_argument(
+        "--feedback-dir",
+        action="append",
+        default=[],
+        help="feedback-parser で生成したものに加えて確かめる fb-*.yaml のディレクトリ（archive/ も含む）",
+    )
+    args = parser.parse_args()
+
+    names = args.names or list(CHECKS)
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown check: {', '.join(unknown)}")
+    if args.bench:
+        for i, name in enumerate(names):
+            if i:
+                print()
+            CHECKS[name][1](args)
+        return 0
+
+    report = Report()
+    for name in names:
+        CHECKS[name][0](args, report)
+    if report.failures:
+        print(f"{report.failures} mismatches", file=sys.stderr)
+        return 1
+    print("ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
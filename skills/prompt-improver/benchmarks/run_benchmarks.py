@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py - 抽出・解析処理のベンチマーク（サイズ別・ベースライン比較つき）
+
+gen_transcript.py / gen_feedback.py で seed 固定の合成データを作業ディレクトリに生成し
+（同じ seed・サイズのデータがあれば再利用）、次の処理を時間計測する:
+
+    process_transcript           extract_transcript.py（チェックポイントなし）
+    process_session_trace        hurikaeri の extract_session_trace.py（チェックポイントなし）
+    parse_feedback_yaml          フィードバック YAML すべてを限定パーサで解析
+    detect_new_skill_candidates  recommend_structure.py の検出処理
+    detect_split_candidates      （入力は status: open のフィードバックから作った KeywordPostings）
+    detect_self_improvement_candidates
+
+計測はベンチマーク × サイズごとに新しいプロセスで行い、
+- wall_secs: repeat 回のうち最短の経過時間
+- throughput: 1秒あたりの処理量（unit: トランスクリプトと YAML は行、検出はフィードバック件数）
+- peak_rss_kb: そのプロセスの最大常駐メモリ（入力の読み込みを含む）
+を JSON で出力する。--baseline に以前の出力を渡すと、wall_secs か peak_rss_kb が
+--threshold の割合を超えて悪化した項目を表示し、終了コード 1 を返す
+（wall_secs は差が --min-delta 秒を超えるものだけ）。
+
+使用方法:
+    python3 run_benchmarks.py [--tiers small,medium] [--only NAME,...] [--repeat N]
+                              [--work-dir DIR] [--output FILE]
+                              [--baseline FILE] [--threshold 0.2] [--min-delta 0.01]
+
+依存: Python 3.x 標準ライブラリのみ（resource を使うため Unix 系のみ）
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "scripts"))
+HURIKAERI_SCRIPTS_DIR = os.path.normpath(os.path.join(BENCH_DIR, "..", "..", "hurikaeri", "scripts"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from gen_feedback import generate_feedback_dir  # noqa: E402
+from gen_transcript import generate_transcript  # noqa: E402
+
+RESULT_VERSION = 1
+
+# サイズ: (トランスクリプトの行数, フィードバック件数)
+TIERS = {
+    "small": (2_000, 200),
+    "medium": (20_000, 2_000),
+    "large": (100_000, 10_000),
+}
+DEFAULT_TIERS = "small,medium"
+
+TRANSCRIPT_BENCHMARKS = ["process_transcript", "process_session_trace"]
+FEEDBACK_BENCHMARKS = [
+    "parse_feedback_yaml",
+    "detect_new_skill_candidates",
+    "detect_split_candidates",
+    "detect_self_improvement_candidates",
+]
+BENCHMARKS = TRANSCRIPT_BENCHMARKS + FEEDBACK_BENCHMARKS
+
+DEFAULT_THRESHOLD = 0.2  # ベースラインからの悪化の許容割合
+DEFAULT_MIN_DELTA = 0.01  # これ以下の wall_secs の差（秒）は誤差として悪化とみなさない
+
+
+# ===============================
+# 入力データ
+# ===============================
+
+def transcript_path(work_dir: str, tier: str, seed: int) -> str:
+    return os.path.join(work_dir, f"transcript-{tier}-s{seed}.jsonl")
+
+
+def feedback_dir(work_dir: str, tier: str, seed: int) -> str:
+    return os.path.join(work_dir, f"feedback-{tier}-s{seed}")
+
+
+def ensure_inputs(work_dir: str, tier: str, seed: int, benchmarks: List[str]) -> None:
+    """必要な合成データがなければ生成する（途中で止まったものは作り直す）"""
+    lines, count = TIERS[tier]
+    if any(name in TRANSCRIPT_BENCHMARKS for name in benchmarks):
+        path = transcript_path(work_dir, tier, seed)
+        if not os.path.exists(path):
+            generate_transcript(path + ".tmp", lines, seed)
+            os.replace(path + ".tmp", path)
+    if any(name in FEEDBACK_BENCHMARKS for name in benchmarks):
+        directory = feedback_dir(work_dir, tier, seed)
+        if not os.path.isdir(directory):
+            shutil.rmtree(directory + ".tmp", ignore_errors=True)
+            generate_feedback_dir(directory + ".tmp", count, seed)
+            os.replace(directory + ".tmp", directory)
+
+
+def _count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+# ===============================
+# 計測（子プロセス）
+# ===============================
+
+def _prepare(name: str, tier: str, work_dir: str, seed: int) -> Tuple[Callable[[], object], int, str]:
+    """(計測する処理, 処理量, 単位) を返す。入力の読み込みはここで済ませる"""
+    if name in TRANSCRIPT_BENCHMARKS:
+        path = transcript_path(work_dir, tier, seed)
+        lines = _count_lines(path)
+        if name == "process_transcript":
+            from extract_transcript import process_transcript
+            return lambda: process_transcript(path, use_checkpoint=False), lines, "lines"
+        sys.path.insert(0, HURIKAERI_SCRIPTS_DIR)
+        from extract_session_trace import process_session_trace
+        return lambda: process_session_trace(path, use_checkpoint=False), lines, "lines"
+
+    from feedback_parser import parse_feedback_yaml
+    directory = feedback_dir(work_dir, tier, seed)
+    paths = sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".yaml"))
+    if name == "parse_feedback_yaml":
+        lines = sum(_count_lines(path) for path in paths)
+        return lambda: [parse_feedback_yaml(path) for path in paths], lines, "lines"
+
+    import recommend_structure
+    feedbacks = [fb for fb in map(parse_feedback_yaml, paths) if fb is not None]
+    feedbacks = [fb for fb in feedbacks if recommend_structure.status_matches(fb["triage_status"], "open")]
+    postings = recommend_structure.KeywordPostings.from_feedbacks(feedbacks)
+    detect = getattr(recommend_structure, name)
+    return lambda: detect(postings), len(feedbacks), "feedbacks"
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_child(name: str, tier: str, work_dir: str, seed: int, repeat: int) -> Dict:
+    func, size, unit = _prepare(name, tier, work_dir, seed)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return {
+        "name": name,
+        "tier": tier,
+        "size": size,
+        "unit": unit,
+        "wall_secs": round(best, 6),
+        "throughput": round(size / best, 1) if best > 0 else None,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def run_benchmark(name: str, tier: str, work_dir: str, seed: int, repeat: int) -> Dict:
+    """新しいプロセスで1項目を計測する（最大常駐メモリを項目ごとに分けるため）"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", name,
+        "--tiers", tier, "--work-dir", work_dir, "--seed", str(seed), "--repeat", str(repeat),
+    ]
+    # 子プロセスはチェックポイントも解析結果のキャッシュも使わないが、念のため作業ディレクトリに向ける
+    env = {**os.environ, "FEEDBACK_PARSE_CACHE_DIR": os.path.join(work_dir, "parse-cache")}
+    completed = subprocess.run(command, stdout=subprocess.PIPE, env=env, check=True)
+    return json.loads(completed.stdout)
+
+
+# ===============================
+# ベースライン比較
+# ===============================
+
+def compare(results: List[Dict], baseline: Dict, threshold: float, min_delta: float = DEFAULT_MIN_DELTA) -> List[str]:
+    """
+    ベースラインより threshold を超えて悪化した項目の説明を返す（表は標準エラーに出力）。
+    wall_secs は差が min_delta 秒以下なら悪化とみなさない（1ms 未満の処理の揺れを拾わない）。
+    """
+    base = {(r["name"], r["tier"]): r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"{'benchmark':<36} {'tier':<7} {'wall':>10} {'base':>10} {'Δ':>7} {'rss MiB':>8} {'base':>8} {'Δ':>7}",
+          file=sys.stderr)
+    for result in results:
+        old = base.get((result["name"], result["tier"]))
+        if old is None:
+            print(f"{result['name']:<36} {result['tier']:<7} {result['wall_secs']:>10.4f} {'-':>10}", file=sys.stderr)
+            continue
+        wall_change = result["wall_secs"] / old["wall_secs"] - 1 if old["wall_secs"] else 0.0
+        rss_change = result["peak_rss_kb"] / old["peak_rss_kb"] - 1 if old["peak_rss_kb"] else 0.0
+        print(
+            f"{result['name']:<36} {result['tier']:<7} {result['wall_secs']:>10.4f} {old['wall_secs']:>10.4f}"
+            f" {wall_change:>+7.1%} {result['peak_rss_kb'] / 1024:>8.1f} {old['peak_rss_kb'] / 1024:>8.1f}"
+            f" {rss_change:>+7.1%}",
+            file=sys.stderr,
+        )
+        if result["size"] != old["size"]:
+            print(f"  (入力の大きさが違います: {old['size']} → {result['size']})", file=sys.stderr)
+        if wall_change > threshold and result["wall_secs"] - old["wall_secs"] > min_delta:
+            regressions.append(f"{result['name']} [{result['tier']}]: wall {wall_change:+.1%}")
+        if rss_change > threshold:
+            regressions.append(f"{result['name']} [{result['tier']}]: peak RSS {rss_change:+.1%}")
+    return regressions
+
+
+def _environment() -> Dict:
+    optional = {}
+    for module in ("numpy", "orjson"):
+        try:
+            __import__(module)
+            optional[module] = True
+        except ImportError:
+            optional[module] = False
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "optional": optional,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抽出・解析処理のベンチマーク")
+    parser.add_argument(
+        "--tiers", default=DEFAULT_TIERS, help=f"サイズ（{', '.join(TIERS)} をカンマ区切り。既定: %(default)s）"
+    )
+    parser.add_argument("--only", help="計測するベンチマーク名（カンマ区切り。既定: すべて）")
+    parser.add_argument("--repeat", type=int, default=3, help="繰り返し回数（最短を採用。既定: %(default)s）")
+    parser.add_argument("--seed", type=int, default=0, help="合成データの seed（既定: %(default)s）")
+    parser.add_argument("--work-dir", help="合成データの置き場所（既定: 一時ディレクトリ。指定すれば次回も再利用）")
+    parser.add_argument("--output", help="結果の JSON の書き出し先（既定: 標準出力）")
+    parser.add_argument("--baseline", help="比較するベースライン（以前の --output）")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help="wall_secs / peak_rss_kb の悪化の許容割合（既定: %(default)s = 20%%）"
+    )
+    parser.add_argument(
+        "--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+        help="悪化とみなす wall_secs の最小の差（秒。既定: %(default)s）"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    tiers = [tier.strip() for tier in args.tiers.split(",") if tier.strip()]
+    unknown = [tier for tier in tiers if tier not in TIERS]
+    benchmarks = [name.strip() for name in args.only.split(",")] if args.only else BENCHMARKS
+    unknown += [name for name in benchmarks if name not in BENCHMARKS]
+    if unknown or args.repeat < 1:
+        print(f"Error: 不明なサイズ・ベンチマーク名、または --repeat が 1 未満です: {', '.join(unknown)}",
+              file=sys.stderr)
+        return 1
+
+    if args.child:
+        print(json.dumps(run_child(args.child, tiers[0], args.work_dir, args.seed, args.repeat)))
+        return 0
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: ベースラインを読めません: {e}", file=sys.stderr)
+            return 1
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prompt-improver-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for tier in tiers:
+            started = time.perf_counter()
+            ensure_inputs(work_dir, tier, args.seed, benchmarks)
+            print(f"[{tier}] inputs ready ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+            for name in benchmarks:
+                result = run_benchmark(name, tier, work_dir, args.seed, args.repeat)
+                print(
+                    f"[{tier}] {name}: {result['wall_secs']:.4f}s, {result['throughput']:.0f} {result['unit']}/s,"
+                    f" peak RSS {result['peak_rss_kb'] / 1024:.1f} MiB",
+                    file=sys.stderr,
+                )
+                results.append(result)
+    except subprocess.CalledProcessError as e:
+        print(f"Error: 計測に失敗しました: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    document = {
+        "version": RESULT_VERSION,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "environment": _environment(),
+        "results": results,
+    }
+    text = json.dumps(document, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"REGRESSION（許容 {args.threshold:.0%}）:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("ok", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,27 +6,42 @@ set -euo pipefail
 shopt -s nullglob
 
 FEEDBACK_DIR="${HOME}/.claude/feedback"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
+
+# インデックス（feedback_index.py）への問い合わせ
+# python3 / feedback_index.py が使えなければ失敗を返し、呼び出し側は YAML を直接読む
+index_query() {
+  [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null || return 1
+  python3 "$INDEX_SCRIPT" --feedback-dir "$FEEDBACK_DIR" "$@"
+}
 
 # 統計表示
 show_stats() {
   local total=0 success=0 failure=0
+  local counts
 
-  for file in "$FEEDBACK_DIR"/*.yaml; do
-    [[ -f "$file" ]] || continue
-
-    # YAML破損チェック
-    if ! grep -q "^id:" "$file" 2>/dev/null; then
-      echo "Warning: $file をスキップ" >&2
-      continue
-    fi
-
-    ((total++)) || true
-    if grep -q "success: true" "$file" 2>/dev/null; then
-      ((success++)) || true
-    else
-      ((failure++)) || true
-    fi
-  done
+  if counts=$(index_query stats); then
+    read -r total success <<< "$counts"
+    failure=$((total - success))
+  else
+    for file in "$FEEDBACK_DIR"/*.yaml; do
+      [[ -f "$file" ]] || continue
+
+      # YAML破損チェック
+      if ! grep -q "^id:" "$file" 2>/dev/null; then
+        echo "Warning: $file をスキップ" >&2
+        continue
+      fi
+
+      ((total++)) || true
+      if grep -q "success: true" "$file" 2>/dev/null; then
+        ((success++)) || true
+      else
+        ((failure++)) || true
+      fi
+    done
+  fi
 
   echo "=========================================="
   echo "フィードバック統計"
@@ -40,17 +55,12 @@ show_stats() {
   fi
 }
 
-# 問題パターン分析
-analyze_patterns() {
+# issue.type を1行1件で出力（target はパスの部分一致で絞る）
+list_issue_types() {
   local target_filter="${1:-}"
 
-  echo "=========================================="
-  echo "フィードバック分析レポート"
-  echo "=========================================="
-  echo ""
+  index_query issue-types --target "$target_filter" && return 0
 
-  # issue.type集計
-  echo "【頻出問題タイプ】"
   for file in "$FEEDBACK_DIR"/*.yaml; do
     [[ -f "$file" ]] || continue
 
@@ -60,15 +70,36 @@ analyze_patterns() {
     fi
 
     # issue typeを抽出
-    grep "^    type:" "$file" 2>/dev/null | sed 's/.*type: //'
-  done | sort | uniq -c | sort -rn | head -5 || true
+    grep "^    type:" "$file" 2>/dev/null | sed 's/.*type: //' || true
+  done
+}
+
+# issue のターゲットパスを1行1件で出力
+list_issue_paths() {
+  index_query issue-paths && return 0
 
-  echo ""
-  echo "【ターゲットファイル別】"
   for file in "$FEEDBACK_DIR"/*.yaml; do
     [[ -f "$file" ]] || continue
-    grep "^      path:" "$file" 2>/dev/null | sed 's/.*path: //'
-  done | sort | uniq -c | sort -rn | head -5 || true
+    grep "^      path:" "$file" 2>/dev/null | sed 's/.*path: //' || true
+  done
+}
+
+# 問題パターン分析
+analyze_patterns() {
+  local target_filter="${1:-}"
+
+  echo "=========================================="
+  echo "フィードバック分析レポート"
+  echo "=========================================="
+  echo ""
+
+  # issue.type集計
+  echo "【頻出問題タイプ】"
+  list_issue_types "$target_filter" | sort | uniq -c | sort -rn | head -5 || true
+
+  echo ""
+  echo "【ターゲットファイル別】"
+  list_issue_paths | sort | uniq -c | sort -rn | head -5 || true
 
   echo ""
   echo "=========================================="
@@ -6,6 +6,8 @@ set -euo pipefail
 
 FEEDBACK_DIR="${FEEDBACK_DIR:-${HOME}/.claude/feedback}"
 ARCHIVE_DIR="${FEEDBACK_DIR}/archive"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
 
 usage() {
   local exit_code="${1:-0}"
@@ -51,13 +53,34 @@ get_triage_status() {
 
 get_mtime_epoch() {
   local filepath="$1"
+  # Linux / GNU（GNU の stat -f はファイルシステム情報を出すため先に試す）
+  stat -c "%Y" "$filepath" 2>/dev/null || \
   # macOS / BSD
   stat -f "%m" "$filepath" 2>/dev/null || \
-  # Linux / GNU
-  stat -c "%Y" "$filepath" 2>/dev/null || \
   echo ""
 }
 
+# インデックス（feedback_index.py）への問い合わせ
+# python3 / feedback_index.py が使えなければ失敗を返し、呼び出し側は YAML を直接読む
+index_query() {
+  [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null || return 1
+  python3 "$INDEX_SCRIPT" --feedback-dir "$FEEDBACK_DIR" "$@"
+}
+
+# fb-*.yaml を「ファイル名<TAB>triage.status<TAB>mtime」で列挙（取得できない値は -）
+list_feedback() {
+  index_query list --prefix fb- && return 0
+
+  local filepath
+  for filepath in "${FEEDBACK_DIR}"/fb-*.yaml; do
+    [[ ! -f "$filepath" ]] && continue
+    local triage_status file_date
+    triage_status="$(get_triage_status "$filepath")"
+    file_date="$(get_mtime_epoch "$filepath")"
+    printf '%s\t%s\t%s\n' "$(basename "$filepath")" "${triage_status:--}" "${file_date:--}"
+  done
+}
+
 # メイン処理
 main() {
   local target_status=""
@@ -65,6 +88,7 @@ main() {
   local older_than=""
   local dry_run=false
   local archived_count=0
+  local moved=()
 
   while [[ $# -gt 0 ]]; do
     case "$1" in
@@ -102,9 +126,14 @@ main() {
     [[ "$older_than" =~ ^[0-9]+$ ]] || die "--older-than は数値を指定してください: $older_than"
   fi
 
-  # アーカイブディレクトリ作成
+  # アーカイブディレクトリ作成（インデックスを使うときは書き換え中の印のディレクトリも）
+  local journal_dir=""
   if [[ "$dry_run" == false ]]; then
     mkdir -p "$ARCHIVE_DIR"
+    if [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null; then
+      journal_dir="$FEEDBACK_DIR/.index.journal"
+      mkdir -p "$journal_dir"
+    fi
   fi
 
   echo "=========================================="
@@ -114,14 +143,11 @@ main() {
   echo ""
 
   # 対象ファイルを検索
-  for filepath in "${FEEDBACK_DIR}"/fb-*.yaml; do
+  while IFS=$'\t' read -r filename triage_status file_date; do
+    local filepath="${FEEDBACK_DIR}/${filename}"
     [[ ! -f "$filepath" ]] && continue
 
     local should_archive=false
-    local filename
-    filename=$(basename "$filepath")
-    local triage_status
-    triage_status="$(get_triage_status "$filepath")"
 
     # ステータスでフィルタ
     if [[ -n "$target_status" ]]; then
@@ -139,9 +165,7 @@ main() {
 
     # 日数フィルタ
     if [[ -n "$older_than" ]]; then
-      local file_date
-      file_date="$(get_mtime_epoch "$filepath")"
-      if [[ -z "$file_date" ]]; then
+      if [[ "$file_date" == "-" ]]; then
         echo "Warning: mtime取得に失敗したためスキップ: $filename" >&2
         continue
       fi
@@ -159,12 +183,28 @@ main() {
       if [[ "$dry_run" == true ]]; then
         echo "  [対象] $filename"
       else
+        # インデックスから外すまでの間は書き換え中の印を置く（途中で落ちても件数がずれない）
+        [[ -n "$journal_dir" ]] && : > "$journal_dir/$filename"
         mv "$filepath" "$ARCHIVE_DIR/"
+        # 抽出情報のサイドカーも一緒に移動
+        local sidecar="${filepath%.yaml}.extracted.json"
+        [[ -f "$sidecar" ]] && mv "$sidecar" "$ARCHIVE_DIR/"
+        moved+=("$filepath")
         echo "  [移動] $filename → archive/"
       fi
       ((archived_count++)) || true
     fi
-  done
+  done < <(list_feedback)
+
+  # 移動したファイルをインデックスから外す
+  if [[ ${#moved[@]} -gt 0 ]]; then
+    index_query remove "${moved[@]}" || true
+  fi
+
+  # 旧形式のクールダウンファイル（最終保存時刻は Stop hook がインデックスから引く）を片付ける
+  if [[ "$dry_run" != true ]]; then
+    rm -f "$FEEDBACK_DIR"/.last_save_*
+  fi
 
   echo ""
   echo "=========================================="
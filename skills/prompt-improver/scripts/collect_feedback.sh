@@ -5,23 +5,33 @@
 set -euo pipefail
 
 FEEDBACK_DIR="${HOME}/.claude/feedback"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
+ALLOCATOR_SCRIPT="$SCRIPT_DIR/id_allocator.py"
 
 # ディレクトリ作成
 mkdir -p "$FEEDBACK_DIR"
 
 # 原子的ID生成
+# id_allocator.py（Stop hook と共有のカウンタ）で払い出し、使えなければ noclobber で空き番号を探す。
+# どちらも隠しファイル .reserve-<ID>.yaml を空で予約する（書き終えてから <ID>.yaml へ rename する）
 generate_id() {
   local today
   today=$(date -u +%Y%m%d)
-  local seq=1
 
-  while [[ $seq -le 999 ]]; do
+  if [[ -f "$ALLOCATOR_SCRIPT" ]] && command -v python3 &> /dev/null; then
+    python3 "$ALLOCATOR_SCRIPT" "$FEEDBACK_DIR" fb --date "$today" && return 0
+  fi
+
+  [[ -w "$FEEDBACK_DIR" ]] || { echo "Error: ID生成失敗（書き込めません）" >&2; return 1; }
+  local seq=1
+  while [[ $seq -le 99999 ]]; do
     local id
     id=$(printf "fb-%s-%03d" "$today" "$seq")
-    local file="${FEEDBACK_DIR}/${id}.yaml"
+    local file="${FEEDBACK_DIR}/.reserve-${id}.yaml"
 
     # 原子的作成（noclobber）
-    if (set -o noclobber; : > "$file") 2>/dev/null; then
+    if [[ ! -e "${FEEDBACK_DIR}/${id}.yaml" ]] && (set -o noclobber; : > "$file") 2>/dev/null; then
       echo "$id"
       return 0
     fi
@@ -68,9 +78,13 @@ main() {
   local id
   id=$(generate_id) || exit 1
   local filepath="${FEEDBACK_DIR}/${id}.yaml"
+  local reserved="${FEEDBACK_DIR}/.reserve-${id}.yaml"
 
-  # YAML生成
-  cat > "$filepath" << EOF
+  # YAML生成（インデックスに反映するまでの間は書き換え中の印を置く）
+  if [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null; then
+    mkdir -p "$FEEDBACK_DIR/.index.journal" && : > "$FEEDBACK_DIR/.index.journal/${id}.yaml"
+  fi
+  if ! cat > "$reserved" << EOF
 id: ${id}
 created_at: ${created_at}
 task_summary: "${task_summary}"
@@ -83,6 +97,17 @@ triage:
   status: open
   priority: low
 EOF
+  then
+    rm -f "$reserved"
+    echo "Error: 書き込み失敗: $reserved" >&2
+    exit 1
+  fi
+  mv -f "$reserved" "$filepath"
+
+  # インデックスに反映（失敗しても次の問い合わせ時に stat の照合で追いつく）
+  if [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null; then
+    python3 "$INDEX_SCRIPT" --feedback-dir "$FEEDBACK_DIR" update "$filepath" 2>/dev/null || true
+  fi
 
   echo "保存完了: $filepath"
 }
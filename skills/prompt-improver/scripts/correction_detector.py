@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+correction_detector.py - ユーザー修正指示の融合検出器
+
+CORRECTION_PATTERNS の各正規表現とボーナス判定（ファイル拡張子・CamelCase）から
+「マッチの先頭になりうるリテラル（トリガー）」を抽出し、全パターンのトリガーを
+1本の正規表現（リテラルの単純な選択）に結合する。テキストはこの正規表現で1回走査し、
+トリガーが現れた位置でだけ該当パターンを match で検証する。
+判定結果（マッチしたパターン・スコア・excerpt）は従来のパターンごとの search ループと同一。
+
+補足:
+    - パターンごとの名前付きグループをそのまま選択で結合すると、re モジュールの
+      先頭文字による高速スキップが効かず、かえって遅くなるためトリガー方式にしている。
+    - トリガーを抽出できないパターン（^ で始まる・文字クラスで始まる等）は従来どおり
+      個別に search する。
+    - トリガーは小文字化したテキストで探す。IGNORECASE で ASCII 文字とマッチする
+      非 ASCII 文字（İ ı ſ K）を含むテキストは、全パターンを個別に search する。
+
+従来のループ実装との一致は benchmarks/reference_checks.py correction で確認する
+（--transcript で指定したトランスクリプトのユーザー発言も比べる）。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python 3.10 以前
+    import sre_constants
+    import sre_parse
+
+# ボーナス判定（大文字小文字を区別する）
+FILE_EXTENSION_RE = re.compile(r"\.\w{2,4}\b")  # ファイル拡張子
+CAMEL_CASE_RE = re.compile(r"[A-Z][a-z]+[A-Z]")  # CamelCase
+
+# スコア
+HIGH_SCORE = 3
+NORMAL_SCORE = 2
+BONUS_SCORE = 1
+SCORE_THRESHOLD = 3
+EXCERPT_LENGTH = 120
+
+# 1パターンあたりのトリガー数の上限（超える場合は短いトリガーで打ち切る）
+MAX_TRIGGERS = 64
+
+# これより短いトリガーしか持たないパターンは個別に search する
+MIN_TRIGGER_LENGTH = 2
+
+# IGNORECASE で ASCII 英字とマッチする非 ASCII 文字（小文字化で位置がずれる/対応しない）
+_CASE_SPECIAL_RE = re.compile("[\u0130\u0131\u017f\u212a]")
+
+# ASCII 英字だけを小文字化する変換表（文字数が変わらない）
+_ASCII_LOWER = {c: c + 32 for c in range(ord("A"), ord("Z") + 1)}
+
+
+def _literal_prefixes(items) -> Tuple[Set[str], bool]:
+    """パースしたパターンから、マッチの先頭になりうるリテラル集合を求める
+
+    Returns:
+        (プレフィックス集合, パターン全体がリテラルのみか)
+    """
+    prefixes = {""}
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            ch = chr(av)
+            prefixes = {p + ch for p in prefixes}
+            continue
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if add_flags or del_flags:
+                return prefixes, False
+            sub_prefixes, complete = _literal_prefixes(sub)
+        elif op is sre_constants.BRANCH:
+            sub_prefixes = set()
+            complete = True
+            for alt in av[1]:
+                alt_prefixes, alt_complete = _literal_prefixes(alt)
+                sub_prefixes |= alt_prefixes
+                complete = complete and alt_complete
+        else:
+            return prefixes, False
+        combined = {p + s for p in prefixes for s in sub_prefixes}
+        if len(combined) > MAX_TRIGGERS:
+            return prefixes, False
+        prefixes = combined
+        if not complete:
+            return prefixes, False
+    return prefixes, True
+
+
+def _caseless(ch: str) -> bool:
+    return ch.isascii() or (ch.lower() == ch and ch.upper() == ch)
+
+
+def extract_triggers(pattern: re.Pattern) -> Optional[Tuple[str, ...]]:
+    """パターンのトリガー（小文字化済み）。抽出できない場合は None"""
+    if not isinstance(pattern.pattern, str):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except (re.error, TypeError):
+        return None
+    prefixes, _ = _literal_prefixes(parsed.data)
+    if not prefixes or "" in prefixes:
+        return None
+    if not all(_caseless(ch) for p in prefixes for ch in p):
+        return None
+    return tuple(sorted({p.translate(_ASCII_LOWER) for p in prefixes}))
+
+
+class CorrectionDetector:
+    """パターン辞書をコンパイルした修正指示検出器"""
+
+    def __init__(self, patterns: Dict[str, re.Pattern], high_score_patterns: Iterable[str]):
+        self.patterns = patterns
+        self.high_score_patterns = set(high_score_patterns)
+        # 判定対象: パターン（辞書順）→ ボーナス2種
+        self._names: List[str] = list(patterns)
+        self._items: List[re.Pattern] = [patterns[name] for name in self._names]
+        self._ext_index = len(self._items)
+        self._items.append(FILE_EXTENSION_RE)
+        self._camel_index = len(self._items)
+        self._items.append(CAMEL_CASE_RE)
+
+        # トリガー方式で判定するもの / 個別に search するもの
+        # （1文字のトリガーは頻出するため、個別 search の方が速い）
+        self._triggered: List[Tuple[int, Tuple[str, ...]]] = []
+        self._separate: List[int] = []
+        for i, pattern in enumerate(self._items):
+            triggers = extract_triggers(pattern)
+            if triggers is None or min(len(t) for t in triggers) < MIN_TRIGGER_LENGTH:
+                self._separate.append(i)
+            else:
+                self._triggered.append((i, triggers))
+        # 未検出パターンの組み合わせ → トリガーの結合正規表現
+        self._trigger_res: Dict[Tuple[int, ...], re.Pattern] = {}
+
+    def _trigger_re(self, remaining: List[Tuple[int, Tuple[str, ...]]]) -> re.Pattern:
+        key = tuple(i for i, _ in remaining)
+        regex = self._trigger_res.get(key)
+        if regex is None:
+            triggers = {t for _, ts in remaining for t in ts}
+            # 長いトリガーを先に並べる（位置だけを使うので順序は結果に影響しない）
+            regex = self._trigger_res[key] = re.compile(
+                "|".join(re.escape(t) for t in sorted(triggers, key=lambda t: (-len(t), t)))
+            )
+        return regex
+
+    def _lowered(self, text: str) -> Optional[str]:
+        """トリガー探索用の小文字化テキスト（位置が元テキストと一致しない場合は None）"""
+        if text.isascii():
+            return text.lower()
+        if _CASE_SPECIAL_RE.search(text):
+            return None
+        lowered = text.lower()
+        # 全文字が1文字に写像された場合のみ位置が一致する
+        if len(lowered) == len(text):
+            return lowered
+        return text.translate(_ASCII_LOWER)
+
+    def matched_indices(self, text: str) -> set:
+        """マッチした判定対象のインデックス集合"""
+        items = self._items
+        lowered = self._lowered(text) if self._triggered else None
+        if lowered is None:
+            return {i for i, pattern in enumerate(items) if pattern.search(text)}
+
+        found = set()
+        remaining = self._triggered
+        pos = 0
+        while remaining:
+            m = self._trigger_re(remaining).search(lowered, pos)
+            if m is None:
+                break
+            q = m.start()
+            # この位置から始まるトリガーを持つパターンだけを検証
+            for i, triggers in remaining:
+                if lowered.startswith(triggers, q) and items[i].match(text, q):
+                    found.add(i)
+            if found:
+                remaining = [(i, t) for i, t in remaining if i not in found]
+            pos = q + 1
+        for i in self._separate:
+            if items[i].search(text):
+                found.add(i)
+        return found
+
+    def detect(self, text: str) -> Optional[dict]:
+        """detect_user_correction と同じ判定"""
+        found = self.matched_indices(text)
+
+        score = 0
+        patterns_matched = []
+        for i, name in enumerate(self._names):
+            if i in found:
+                # 明示的な指摘パターンは高スコア（単独で閾値を超える）
+                score += HIGH_SCORE if name in self.high_score_patterns else NORMAL_SCORE
+                patterns_matched.append(name)
+
+        # ファイル名や具体名詞があればボーナス
+        if self._ext_index in found:
+            score += BONUS_SCORE
+        if self._camel_index in found:
+            score += BONUS_SCORE
+
+        if score >= SCORE_THRESHOLD:
+            return {
+                "score": score,
+                "patterns": patterns_matched,
+                "excerpt": text[:EXCERPT_LENGTH]
+            }
+        return None
@@ -0,0 +1,1328 @@
+#!/usr/bin/env python3
+"""
+feedback_index.py - フィードバック YAML の SQLite インデックス
+
+~/.claude/feedback/*.yaml を毎回 grep / 正規表現で読み直す代わりに、
+フィードバックごとの要約（id・session_id・成否・トリアージ状態・issue のターゲット）と
+recommend_structure.py 用の抽出情報（改善ターゲット・キーワード・エラー・修正指示）を
+<feedback_dir>/.index.sqlite に保持する。
+抽出情報からは正規化済みキーワードのポスティング（*_postings テーブル: キーワード・
+skill のセクション別キーワード・低信頼度の件数・リンク不十分なキーワード）も作っておき、
+recommend_structure.py は毎回キーワードを正規化し直さずにこれを集計する。
+さらにキーワード・改善ターゲット・修正パターンごとに、created_at で指数減衰させた件数
+（トレンド）を半減期ごとに1行ずつ持ち、問い合わせは履歴を読み直さずに1行あたり定数時間で答える。
+
+- 正は YAML（とサイドカー）。インデックスはいつでも rebuild で作り直せる
+- 書き手（stop_hook_collect.sh / collect_feedback.sh / update_triage.sh /
+  archive_feedback.sh）が保存・更新・移動のたびに update / remove で反映する
+- 読み手は問い合わせの前に各ファイルの (mtime, size) を stat で照合し、
+  手で編集されたファイルや消えたファイルだけを反映し直す（ファイル本体は読まない）。
+  Stop hook の find-session は --no-refresh で、見つかったファイルだけを照合する（件数に依らない）
+- session_id ごとの最終保存時刻（sessions。fb-*.yaml の created_at の最大）はファイルを消したり
+  archive/ に移したりしても残し、rebuild でも消さない（Stop hook のクールダウン用。
+  作り直した側にない行は比べず、作り直した側の時刻より古い行だけを食い違いとする）
+- triage.status ごとの件数（status_counts）は triage の行と同じトランザクションで増減させ、
+  Stop hook の閾値チェック（count-status --no-refresh）は1行を引くだけで済ませる
+- 書き手は YAML を書き換える前に <feedback_dir>/.index.journal/<ファイル名> に印を置き、
+  update / remove のコミット後に消す。--no-refresh の問い合わせは残っている印のファイルだけを
+  反映し直すので、書き換えと反映の間で書き手が落ちても件数はずれない
+  （JOURNAL_STALE_SECS より古い印は落ちた書き手のものとして反映後に消す）
+- --no-refresh の問い合わせは、さらにディレクトリの一覧（名前と inode。readdir だけで stat しない）を
+  行に保存した inode と比べ、増えた・消えた・置き換わったファイル（rm / sed -i / git checkout など
+  書き手を通さない変更）があれば refresh する。ディレクトリの mtime は SQLite の -wal / -shm の
+  作成・削除で毎回変わるので使わない。同じ inode のまま中身だけ書き換えた場合は refresh まで反映されない
+- 要約は feedback_parser.py の1パス限定パーサで読む（recommend_structure.py の解析と共通）
+- 抽出情報はサイドカー（fb-*.extracted.json）から作る。サイドカーがないファイルは
+  recommend_structure.py が初回の読み出し時に YAML を解析して書き戻す
+- ポスティングはファイル単位の行なので、保存・ステータス変更はそのファイルの行を
+  差し替えるだけで反映される（status での絞り込みは問い合わせ時に triage と結合する）
+- トレンドは保存・更新・削除のたびにそのファイルの寄与を引いて足し直す
+  （多数のファイルをまとめて反映するときは作り直す）
+- verify は YAML とサイドカーから別のインデックスを作り直し、全テーブルの行を突き合わせる
+  （status_counts は triage の行の集計とも突き合わせる）
+
+使用方法:
+    python3 feedback_index.py [--feedback-dir DIR] rebuild [--jobs N]
+    python3 feedback_index.py [--feedback-dir DIR] update <fb.yaml> [...]
+    python3 feedback_index.py [--feedback-dir DIR] remove <fb.yaml> [...]
+    python3 feedback_index.py [--feedback-dir DIR] stats
+    python3 feedback_index.py [--feedback-dir DIR] [--no-refresh] count-status <status>
+    python3 feedback_index.py [--feedback-dir DIR] [--no-refresh] find-session <session_id>
+    python3 feedback_index.py [--feedback-dir DIR] issue-types [--status S] [--target T] [--path P]
+    python3 feedback_index.py [--feedback-dir DIR] issue-paths [--status S] [--target T]
+    python3 feedback_index.py [--feedback-dir DIR] list [--prefix fb-]
+    python3 feedback_index.py [--feedback-dir DIR] trends [--half-lives 7,30] [--kind keyword]
+    python3 feedback_index.py [--feedback-dir DIR] verify
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import argparse
+import math
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from feedback_parser import parse_feedback_yaml
+from structured_output import SIDECAR_SUFFIX, load_sidecar, sidecar_path
+
+DEFAULT_FEEDBACK_DIR = os.path.expanduser("~/.claude/feedback")
+
+INDEX_FILENAME = ".index.sqlite"
+
+# テーブル構成を変えたら上げる（不一致なら作り直す）
+SCHEMA_VERSION = 6
+
+# ロック待ちの上限（秒）。Stop hook と手動コマンドが同時に書くことがある
+BUSY_TIMEOUT_SECS = 10
+
+# find_session が見つけたファイルを反映し直して引き直す回数の上限（書き換えが続いている場合）
+FIND_SESSION_ATTEMPTS = 3
+
+# 書き手が書き換え前に印を置くディレクトリ（<feedback_dir> 直下）と、落ちた書き手の印とみなす経過秒数
+JOURNAL_DIRNAME = ".index.journal"
+JOURNAL_STALE_SECS = 300
+
+SCHEMA = """
+CREATE TABLE feedback (
+    name TEXT PRIMARY KEY,
+    id TEXT,
+    session_id TEXT,
+    created_at TEXT,
+    message_count INTEGER,
+    success TEXT,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sidecar_mtime_ns INTEGER NOT NULL,
+    analyzed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX feedback_session ON feedback(session_id);
+
+CREATE TABLE sessions (
+    session_id TEXT PRIMARY KEY,
+    last_saved_at REAL NOT NULL
+);
+
+CREATE TABLE triage (
+    name TEXT PRIMARY KEY,
+    status TEXT,
+    priority TEXT
+);
+CREATE INDEX triage_status ON triage(status);
+
+CREATE TABLE status_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+
+CREATE TABLE issues (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    type TEXT,
+    target_path TEXT
+);
+CREATE INDEX issues_name ON issues(name);
+
+CREATE TABLE improvement_targets (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    file TEXT,
+    section TEXT,
+    type TEXT,
+    avg_confidence REAL
+);
+CREATE INDEX improvement_targets_name ON improvement_targets(name);
+
+CREATE TABLE keywords (
+    name TEXT NOT NULL,
+    target_ord INTEGER NOT NULL,
+    ord INTEGER NOT NULL,
+    keyword TEXT NOT NULL
+);
+CREATE INDEX keywords_name ON keywords(name);
+
+CREATE TABLE errors (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    keyword TEXT NOT NULL
+);
+CREATE INDEX errors_name ON errors(name);
+
+CREATE TABLE corrections (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    excerpt TEXT,
+    linked INTEGER NOT NULL
+);
+CREATE INDEX corrections_name ON corrections(name);
+
+CREATE TABLE correction_patterns (
+    name TEXT NOT NULL,
+    correction_ord INTEGER NOT NULL,
+    ord INTEGER NOT NULL,
+    pattern TEXT NOT NULL
+);
+CREATE INDEX correction_patterns_name ON correction_patterns(name);
+
+CREATE TABLE keyword_postings (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    low_confidence INTEGER NOT NULL
+);
+CREATE INDEX keyword_postings_name ON keyword_postings(name, ord);
+
+CREATE TABLE section_postings (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    section TEXT NOT NULL,
+    keyword TEXT NOT NULL
+);
+CREATE INDEX section_postings_name ON section_postings(name, ord);
+
+CREATE TABLE unlinked_postings (
+    name TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    raw TEXT NOT NULL
+);
+CREATE INDEX unlinked_postings_name ON unlinked_postings(name, ord);
+
+CREATE TABLE trend_half_lives (
+    half_life_days REAL PRIMARY KEY
+);
+
+CREATE TABLE trends (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    half_life_days REAL NOT NULL,
+    count INTEGER NOT NULL,
+    value REAL NOT NULL,
+    ref_time REAL NOT NULL,
+    PRIMARY KEY (kind, key, half_life_days)
+);
+"""
+
+# name を持つ子テーブル（削除・差し替えの対象）
+POSTING_TABLES = ("keyword_postings", "section_postings", "unlinked_postings")
+CHILD_TABLES = (
+    "triage", "issues", "improvement_targets", "keywords", "errors", "corrections", "correction_patterns",
+    *POSTING_TABLES,
+)
+ANALYSIS_TABLES = ("improvement_targets", "keywords", "errors", "corrections", "correction_patterns", *POSTING_TABLES)
+
+# トレンドの種類と、最初から保持する半減期（日）。ほかの半減期は初めて問い合わせたときに追加する
+TREND_KINDS = ("keyword", "target", "pattern")
+DEFAULT_TREND_HALF_LIVES = (7.0, 30.0)
+
+# これ以上のファイルをまとめて反映するときは、トレンドを1件ずつ引き足しせずに作り直す
+TREND_REBUILD_MIN_FILES = 256
+
+# ポスティングに保存する件数の閾値（変えたら SCHEMA_VERSION を上げて作り直す）
+LOW_CONFIDENCE_THRESHOLD = 0.5  # 新スキル候補の低信頼度
+UNLINKED_CONFIDENCE_THRESHOLD = 0.3  # 自己改善のキーワード提案で「リンク不十分」とみなす信頼度
+
+# 無視するキーワード（汎用すぎるもの）
+STOP_WORDS = {
+    "the", "a", "an", "is", "are", "was", "were", "be", "been",
+    "have", "has", "had", "do", "does", "did", "will", "would",
+    "could", "should", "may", "might", "must", "shall",
+    "this", "that", "these", "those", "it", "its",
+    "and", "or", "but", "if", "then", "else",
+    "for", "to", "from", "with", "by", "at", "in", "on", "of",
+    "file", "files", "code", "error", "errors", "test", "tests",
+}
+
+
+# ===============================
+# 抽出情報（recommend_structure.py の分析用フィールド）
+# ===============================
+
+def feedback_from_extracted(extracted: Dict) -> Dict:
+    """構造化された extracted セクションから分析用フィールドを組み立てる"""
+    improvement_targets = []
+    for target in extracted.get("improvement_targets", []):
+        t = target.get("target") or {}
+        improvement_targets.append({
+            "keywords": list(target.get("keywords", [])),
+            "avg_confidence": float(target.get("avg_confidence", 1.0)),
+            "file": t.get("file"),
+            "section": t.get("section"),
+            "type": t.get("type"),
+        })
+
+    errors = []
+    for err in extracted.get("errors", []):
+        errors.extend(
+            kw for kw in (err.get("linked_target") or {}).get("matched_keywords", []) if kw
+        )
+
+    corrections = []
+    correction_items = []
+    for item in (extracted.get("user_corrections") or {}).get("items", []):
+        patterns = list(item.get("patterns", []))
+        corrections.extend(p for p in patterns if p)
+        correction_items.append({
+            "excerpt": (item.get("excerpt") or "")[:100],
+            "patterns": patterns,
+            "linked_target": True if "linked_target" in item else None,
+        })
+
+    return {
+        "improvement_targets": improvement_targets,
+        "errors": errors,
+        "user_corrections": corrections,
+        "user_correction_items": correction_items,
+    }
+
+
+# ===============================
+# キーワードのポスティング
+# ===============================
+
+def normalize_keyword(keyword: str) -> str:
+    """キーワードを正規化（大小文字、Unicode正規化）"""
+    # Unicode正規化（NFKC）
+    normalized = unicodedata.normalize("NFKC", keyword)
+    # 小文字化
+    normalized = normalized.lower()
+    # 記号除去（アンダースコア、ハイフンは残す）
+    normalized = re.sub(r"[^\w\s-]", "", normalized)
+    return normalized.strip()
+
+
+def is_valid_keyword(keyword: str) -> bool:
+    """有効なキーワードかどうか"""
+    normalized = normalize_keyword(keyword)
+    if len(normalized) < 2:
+        return False
+    if normalized in STOP_WORDS:
+        return False
+    return True
+
+
+def posting_rows(analysis: Dict) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    """
+    1フィードバック分のポスティング。いずれも重複を除いたファイル内の初出順:
+    - キーワード: (正規化キーワード, 低信頼度の improvement_targets での出現回数)
+      （improvement_targets → errors → user_corrections の順）
+    - skill のセクション: (file, section, 正規化キーワード)
+    - リンク不十分な improvement_targets（低信頼度またはファイルなし）: (正規化キーワード, 元の表記)
+    """
+    keywords: Dict[str, int] = {}
+    sections: Dict[tuple, None] = {}
+    unlinked: Dict[tuple, None] = {}
+    for target in analysis.get("improvement_targets", []):
+        confidence = target.get("avg_confidence", 1.0)
+        file_path = target.get("file")
+        section = target.get("section")
+        in_section = target.get("type") == "skill" and file_path and section
+        low = 1 if confidence < LOW_CONFIDENCE_THRESHOLD else 0
+        weak = confidence < UNLINKED_CONFIDENCE_THRESHOLD or not file_path
+        for kw in target.get("keywords", []):
+            if not is_valid_keyword(kw):
+                continue
+            normalized = normalize_keyword(kw)
+            keywords[normalized] = keywords.get(normalized, 0) + low
+            if in_section:
+                sections.setdefault((file_path, section, normalized))
+            if weak:
+                unlinked.setdefault((normalized, kw))
+    for key in ("errors", "user_corrections"):
+        for kw in analysis.get(key, []):
+            if is_valid_keyword(kw):
+                keywords.setdefault(normalize_keyword(kw), 0)
+    return list(keywords.items()), list(sections), list(unlinked)
+
+
+# ===============================
+# トレンド（指数減衰付きの件数）
+# ===============================
+#
+# 1行は (種類, キー, 半減期) ごとに、寄与しているフィードバック数 count と、
+# 時刻 ref_time における減衰済みの件数 value = Σ 2^-((ref_time - t_i) / 半減期) を持つ。
+# 追加・削除は ref_time との差だけで引き足しでき、任意の時刻 now の値は
+# value × 2^-((now - ref_time) / 半減期) で求まる（履歴を読み直さない）。
+
+def parse_created_at(value: Optional[str]) -> Optional[float]:
+    """created_at（ISO 8601。タイムゾーンがなければ UTC とみなす）を UNIX 秒に。読めなければ None"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def decay(elapsed_secs: float, half_life_days: float) -> float:
+    """elapsed_secs だけ経過した件数に掛ける減衰率（負の経過は未来の件数の重み）"""
+    return 2.0 ** (-elapsed_secs / (half_life_days * 86400))
+
+
+def trend_rate(score: float, half_life_days: float) -> float:
+    """減衰付き件数を1日あたりの件数に直す（一定の頻度 r なら定常状態の件数は r × 半減期 / ln 2）"""
+    return score * math.log(2) / half_life_days
+
+
+# ===============================
+# インデックス本体
+# ===============================
+
+# FeedbackIndex._index_file の read 省略時の印
+_NOT_READ = object()
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+class FeedbackIndex:
+    """
+    フィードバックディレクトリ直下の *.yaml のインデックス。
+
+    analyzer を渡すと、サイドカーのないファイルの分析用フィールドを
+    load_postings の初回にその関数で YAML から作り、インデックスに書き戻す。
+    analyzer はパスのリストを受け取り、同じ順に解析結果（読めなければ None）のリストを返す。
+    index_path を省略するとインデックスは <feedback_dir>/.index.sqlite。
+    """
+
+    def __init__(
+        self,
+        feedback_dir: str = DEFAULT_FEEDBACK_DIR,
+        analyzer: Optional[Callable[[List[str]], List[Optional[Dict]]]] = None,
+        index_path: Optional[str] = None,
+    ):
+        self.feedback_dir = feedback_dir
+        self.analyzer = analyzer
+        self.path = index_path or os.path.join(feedback_dir, INDEX_FILENAME)
+        self.journal_dir = os.path.join(feedback_dir, JOURNAL_DIRNAME)
+        self.conn = self._connect()
+
+    # ---- 接続・スキーマ ----
+
+    def _connect(self) -> sqlite3.Connection:
+        try:
+            conn = self._open()
+        except sqlite3.DatabaseError:
+            # 壊れたインデックスは捨てて作り直す（正は YAML）
+            self._unlink()
+            conn = self._open()
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECS, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                with self._transaction(conn):
+                    for (table,) in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table'"
+                    ).fetchall():
+                        conn.execute(f'DROP TABLE "{table}"')
+                    for statement in SCHEMA.split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.executemany(
+                        "INSERT INTO trend_half_lives (half_life_days) VALUES (?)",
+                        [(h,) for h in DEFAULT_TREND_HALF_LIVES],
+                    )
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def _unlink(self) -> None:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.unlink(self.path + suffix)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _transaction(conn: sqlite3.Connection):
+        return _Transaction(conn)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---- 書き込み ----
+
+    def _delete(self, name: str, track_trends: bool = True) -> None:
+        if track_trends:
+            self._add_trends(name, -1)
+        for (status,) in self.conn.execute("SELECT status FROM triage WHERE name = ?", (name,)).fetchall():
+            self._count_status(status, -1)
+        self.conn.execute("DELETE FROM feedback WHERE name = ?", (name,))
+        for table in CHILD_TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+
+    def _read_file(self, name: str) -> Optional[Tuple[Dict, Optional[os.stat_result], Optional[Dict]]]:
+        """1ファイルの (要約, サイドカーの stat, 抽出情報) を読む（接続に触れないのでスレッドから呼べる）"""
+        filepath = os.path.join(self.feedback_dir, name)
+        header = parse_feedback_yaml(filepath, extracted=False)
+        if header is None:
+            return None
+
+        sidecar = sidecar_path(filepath)
+        sidecar_st = _stat(sidecar)
+        analysis = None
+        if sidecar_st is not None:
+            extracted = load_sidecar(sidecar, "extracted")
+            if extracted is not None:
+                analysis = feedback_from_extracted(extracted)
+        return header, sidecar_st, analysis
+
+    def _read_files(self, names: List[str], jobs: int = 1) -> List:
+        """_read_file を names の順に。jobs > 1 ならスレッドで並行に読む（ネットワーク越しのホーム向け）"""
+        if jobs > 1 and len(names) > 1:
+            with ThreadPoolExecutor(max_workers=min(jobs, len(names))) as pool:
+                return list(pool.map(self._read_file, names))
+        return [self._read_file(name) for name in names]
+
+    def _index_file(self, name: str, st: os.stat_result, read=_NOT_READ, track_trends: bool = True) -> None:
+        """
+        1ファイルの行を差し替える（トランザクション内で呼ぶ）。read は _read_file の結果（省略時は読む）。
+        track_trends が偽ならトレンドは更新しない（呼び出し側が後で _rebuild_trends する）
+        """
+        self._delete(name, track_trends)
+        if read is _NOT_READ:
+            read = self._read_file(name)
+        if read is None:
+            return
+        header, sidecar_st, analysis = read
+
+        self.conn.execute(
+            "INSERT INTO feedback (name, id, session_id, created_at, message_count, success,"
+            " mtime_ns, size, inode, sidecar_mtime_ns, analyzed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                header["id"],
+                header["session_id"],
+                header["created_at"],
+                header["message_count"],
+                header["success"],
+                st.st_mtime_ns,
+                st.st_size,
+                st.st_ino,
+                sidecar_st.st_mtime_ns if sidecar_st is not None else 0,
+                1 if analysis is not None else 0,
+            ),
+        )
+        self.conn.execute(
+            "INSERT INTO triage (name, status, priority) VALUES (?, ?, ?)",
+            (name, header["triage_status"], header["triage_priority"]),
+        )
+        self._count_status(header["triage_status"], 1)
+        if name.startswith("fb-"):
+            self._touch_session(header["session_id"], parse_created_at(header["created_at"]))
+        self.conn.executemany(
+            "INSERT INTO issues (name, ord, type, target_path) VALUES (?, ?, ?, ?)",
+            [(name, i, issue["type"], issue["target_path"]) for i, issue in enumerate(header["issues"])],
+        )
+        if analysis is not None:
+            self._insert_analysis(name, analysis)
+        if track_trends:
+            self._add_trends(name, 1)
+
+    def _touch_session(self, session_id: Optional[str], saved_at: Optional[float]) -> None:
+        """session_id の最終保存時刻を saved_at まで進める（ファイルを消しても行は残す）"""
+        if not session_id or saved_at is None:
+            return
+        self.conn.execute(
+            "INSERT OR IGNORE INTO sessions (session_id, last_saved_at) VALUES (?, ?)", (session_id, saved_at)
+        )
+        self.conn.execute(
+            "UPDATE sessions SET last_saved_at = ? WHERE session_id = ? AND last_saved_at < ?",
+            (saved_at, session_id, saved_at),
+        )
+
+    def _count_status(self, status: Optional[str], delta: int) -> None:
+        if status is None:
+            return
+        cursor = self.conn.execute("UPDATE status_counts SET count = count + ? WHERE status = ?", (delta, status))
+        if cursor.rowcount == 0:
+            self.conn.execute("INSERT INTO status_counts (status, count) VALUES (?, ?)", (status, delta))
+        else:
+            self.conn.execute("DELETE FROM status_counts WHERE status = ? AND count = 0", (status,))
+
+    def _insert_analysis(self, name: str, analysis: Dict) -> None:
+        targets = analysis.get("improvement_targets", [])
+        self.conn.executemany(
+            "INSERT INTO improvement_targets (name, ord, file, section, type, avg_confidence)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (name, i, t.get("file"), t.get("section"), t.get("type"), t.get("avg_confidence", 1.0))
+                for i, t in enumerate(targets)
+            ],
+        )
+        self.conn.executemany(
+            "INSERT INTO keywords (name, target_ord, ord, keyword) VALUES (?, ?, ?, ?)",
+            [
+                (name, i, j, kw)
+                for i, t in enumerate(targets)
+                for j, kw in enumerate(t.get("keywords", []))
+            ],
+        )
+        self.conn.executemany(
+            "INSERT INTO errors (name, ord, keyword) VALUES (?, ?, ?)",
+            [(name, i, kw) for i, kw in enumerate(analysis.get("errors", []))],
+        )
+        items = analysis.get("user_correction_items", [])
+        self.conn.executemany(
+            "INSERT INTO corrections (name, ord, excerpt, linked) VALUES (?, ?, ?, ?)",
+            [(name, i, item.get("excerpt"), 1 if item.get("linked_target") else 0) for i, item in enumerate(items)],
+        )
+        self.conn.executemany(
+            "INSERT INTO correction_patterns (name, correction_ord, ord, pattern) VALUES (?, ?, ?, ?)",
+            [
+                (name, i, j, p)
+                for i, item in enumerate(items)
+                for j, p in enumerate(item.get("patterns", []))
+            ],
+        )
+        keywords, sections, unlinked = posting_rows(analysis)
+        self.conn.executemany(
+            "INSERT INTO keyword_postings (name, ord, keyword, low_confidence) VALUES (?, ?, ?, ?)",
+            [(name, i, *row) for i, row in enumerate(keywords)],
+        )
+        self.conn.executemany(
+            "INSERT INTO section_postings (name, ord, file, section, keyword) VALUES (?, ?, ?, ?, ?)",
+            [(name, i, *row) for i, row in enumerate(sections)],
+        )
+        self.conn.executemany(
+            "INSERT INTO unlinked_postings (name, ord, keyword, raw) VALUES (?, ?, ?, ?)",
+            [(name, i, *row) for i, row in enumerate(unlinked)],
+        )
+
+    # ---- トレンド ----
+
+    def _half_lives(self) -> List[float]:
+        return [h for (h,) in self.conn.execute("SELECT half_life_days FROM trend_half_lives ORDER BY half_life_days")]
+
+    def _trend_keys(self, where: str, params: list) -> Dict[str, Set[Tuple[str, str]]]:
+        """ファイル名 → そのファイルが寄与する (種類, キー)（1ファイル内の重複は1件）"""
+        keys: Dict[str, Set[Tuple[str, str]]] = {}
+        for kind, sql in (
+            ("keyword", "SELECT name, keyword FROM keyword_postings"),
+            ("target", "SELECT name, file FROM improvement_targets WHERE file IS NOT NULL AND file <> ''"),
+            ("pattern", "SELECT name, pattern FROM correction_patterns WHERE pattern <> ''"),
+        ):
+            joiner = " AND " if " WHERE " in sql else " WHERE "
+            for name, key in self.conn.execute(sql + joiner + where, params):
+                keys.setdefault(name, set()).add((kind, key))
+        return keys
+
+    def _trend_time(self, name: str) -> Optional[float]:
+        """トレンドに数えるファイルなら created_at の UNIX 秒（fb-*.yaml で id と created_at があるもの）"""
+        if not name.startswith("fb-"):
+            return None
+        row = self.conn.execute(
+            "SELECT created_at FROM feedback WHERE name = ? AND id IS NOT NULL", (name,)
+        ).fetchone()
+        return parse_created_at(row[0]) if row else None
+
+    def _add_trends(self, name: str, sign: int) -> None:
+        """1ファイルの寄与をトレンドに足す（sign = 1）/ 引く（sign = -1）。行を書き換える前後に呼ぶ"""
+        t = self._trend_time(name)
+        if t is None:
+            return
+        keys = self._trend_keys("name = ?", [name]).get(name, set())
+        for half_life in self._half_lives():
+            for kind, key in keys:
+                self._update_trend(kind, key, half_life, t, sign)
+
+    def _update_trend(self, kind: str, key: str, half_life: float, t: float, sign: int) -> None:
+        row = self.conn.execute(
+            "SELECT count, value, ref_time FROM trends WHERE kind = ? AND key = ? AND half_life_days = ?",
+            (kind, key, half_life),
+        ).fetchone()
+        if row is None:
+            if sign > 0:
+                self.conn.execute(
+                    "INSERT INTO trends (kind, key, half_life_days, count, value, ref_time) VALUES (?, ?, ?, 1, 1.0, ?)",
+                    (kind, key, half_life, t),
+                )
+            return
+        count, value, ref_time = row
+        count += sign
+        if count <= 0:
+            self.conn.execute(
+                "DELETE FROM trends WHERE kind = ? AND key = ? AND half_life_days = ?", (kind, key, half_life)
+            )
+            return
+        if sign > 0 and t > ref_time:
+            # 基準時刻を新しい件数に進める（value が際限なく大きくならないように）
+            value = value * decay(t - ref_time, half_life) + 1.0
+            ref_time = t
+        else:
+            # 足した件数は ref_time 以前なので、引くときも重みは 1 以下
+            value = max(0.0, value + sign * decay(ref_time - t, half_life))
+        self.conn.execute(
+            "UPDATE trends SET count = ?, value = ?, ref_time = ? WHERE kind = ? AND key = ? AND half_life_days = ?",
+            (count, value, ref_time, kind, key, half_life),
+        )
+
+    def _rebuild_trends(self, half_lives: Optional[List[float]] = None) -> None:
+        """トレンドの行を（指定した半減期だけ）全ファイルから作り直す（トランザクション内で呼ぶ）"""
+        if half_lives is None:
+            half_lives = self._half_lives()
+        times = {}
+        for name, created_at in self.conn.execute(
+            "SELECT name, created_at FROM feedback WHERE substr(name, 1, 3) = 'fb-' AND id IS NOT NULL"
+        ):
+            t = parse_created_at(created_at)
+            if t is not None:
+                times[name] = t
+        events: Dict[Tuple[str, str], List[float]] = {}
+        for name, keys in self._trend_keys("substr(name, 1, 3) = 'fb-'", []).items():
+            t = times.get(name)
+            if t is None:
+                continue
+            for kind_key in keys:
+                events.setdefault(kind_key, []).append(t)
+
+        rows = []
+        for half_life in half_lives:
+            self.conn.execute("DELETE FROM trends WHERE half_life_days = ?", (half_life,))
+            for (kind, key), ts in events.items():
+                ref_time = max(ts)
+                value = sum(decay(ref_time - t, half_life) for t in ts)
+                rows.append((kind, key, half_life, len(ts), value, ref_time))
+        self.conn.executemany(
+            "INSERT INTO trends (kind, key, half_life_days, count, value, ref_time) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def trends(
+        self, half_lives: Iterable[float] = DEFAULT_TREND_HALF_LIVES, now: Optional[float] = None
+    ) -> Dict[str, Dict[str, Dict]]:
+        """
+        時刻 now（省略時は現在）の減衰付き件数を 種類 → キー → {'count': 件数, 半減期: 減衰付き件数, ...} で返す。
+        保持していない半減期は追加して全ファイルから埋める（以降は保存のたびに更新される）。
+        """
+        half_lives = [float(h) for h in half_lives]
+        missing = [h for h in half_lives if h not in self._half_lives()]
+        if missing:
+            with self._transaction(self.conn):
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO trend_half_lives (half_life_days) VALUES (?)", [(h,) for h in missing]
+                )
+                self._rebuild_trends(missing)
+        if now is None:
+            now = time.time()
+
+        result: Dict[str, Dict[str, Dict]] = {kind: {} for kind in TREND_KINDS}
+        placeholders = ", ".join("?" for _ in half_lives)
+        for kind, key, half_life, count, value, ref_time in self.conn.execute(
+            "SELECT kind, key, half_life_days, count, value, ref_time FROM trends"
+            f" WHERE half_life_days IN ({placeholders}) ORDER BY kind, key",
+            half_lives,
+        ):
+            entry = result.setdefault(kind, {}).setdefault(key, {"count": count})
+            entry[half_life] = value * decay(now - ref_time, half_life)
+        return result
+
+    def update(self, paths: Iterable[str], clear_marks: bool = True) -> int:
+        """
+        指定ファイルを反映する（存在しなければ行を消す）。反映した件数を返す。
+        clear_marks が真ならコミット後にそのファイルの書き換え中の印を消す
+        """
+        names = [os.path.basename(path) for path in paths]
+        with self._transaction(self.conn):
+            for name in names:
+                st = _stat(os.path.join(self.feedback_dir, name))
+                if st is None:
+                    self._delete(name)
+                else:
+                    self._index_file(name, st)
+        if clear_marks:
+            self._clear_marks(names)
+        return len(names)
+
+    def remove(self, paths: Iterable[str]) -> int:
+        names = [os.path.basename(path) for path in paths]
+        with self._transaction(self.conn):
+            for name in names:
+                self._delete(name)
+        self._clear_marks(names)
+        return len(names)
+
+    def _clear_marks(self, names: Iterable[str]) -> None:
+        for name in names:
+            try:
+                os.unlink(os.path.join(self.journal_dir, name))
+            except OSError:
+                pass
+
+    def replay_journal(self) -> int:
+        """
+        書き換え中の印が残っているファイルだけを反映し直す（印がなければディレクトリを1つ読むだけ）。
+        書き手がまだ動いている印は残し（その書き手が反映し直して消す）、
+        JOURNAL_STALE_SECS より古い印は落ちた書き手のものとして反映後に消す。反映した件数を返す
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.journal_dir) if entry.name.endswith(".yaml")]
+        except OSError:
+            return 0
+        if not entries:
+            return 0
+        stale = []
+        now = time.time()
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime >= JOURNAL_STALE_SECS:
+                    stale.append(entry.name)
+            except OSError:
+                pass
+        self.update([entry.name for entry in entries], clear_marks=False)
+        self._clear_marks(stale)
+        return len(entries)
+
+    def rebuild(self, jobs: int = 1) -> int:
+        """全行を捨てて YAML から作り直す（jobs はファイルを並行に読むスレッド数）"""
+        files = self._scan_dir()
+        names = list(files)
+        reads = self._read_files(names, jobs)
+        with self._transaction(self.conn):
+            self.conn.execute("DELETE FROM feedback")
+            self.conn.execute("DELETE FROM status_counts")
+            for table in CHILD_TABLES:
+                self.conn.execute(f"DELETE FROM {table}")
+            for name, read in zip(names, reads):
+                self._index_file(name, files[name][0], read, track_trends=False)
+            self._rebuild_trends()
+        return len(files)
+
+    @staticmethod
+    def _is_indexed(entry: os.DirEntry) -> bool:
+        """インデックスに載せるファイルか（直下の *.yaml。隠しファイル = 採番の予約 .reserve-* は除く）"""
+        return entry.name.endswith(".yaml") and not entry.name.startswith(".")
+
+    def _scan_dir(self) -> Dict[str, Tuple[os.stat_result, int]]:
+        """直下の *.yaml（_is_indexed）→ (stat, サイドカーの mtime_ns または 0)"""
+        files = {}
+        try:
+            entries = list(os.scandir(self.feedback_dir))
+        except OSError:
+            return files
+        sidecars = {}
+        for entry in entries:
+            if entry.name.endswith(SIDECAR_SUFFIX):
+                try:
+                    sidecars[entry.name[: -len(SIDECAR_SUFFIX)]] = entry.stat().st_mtime_ns
+                except OSError:
+                    pass
+        for entry in entries:
+            if not self._is_indexed(entry):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            files[entry.name] = (st, sidecars.get(entry.name[:-5], 0))
+        return files
+
+    def refresh(self, jobs: int = 1) -> int:
+        """
+        stat で照合し、変わった・増えた・消えたファイルだけ反映する。反映した件数を返す。
+        jobs > 1 なら反映するファイルをスレッドで並行に読む（書き込みは1つのトランザクションで順に）。
+        """
+        self.replay_journal()  # 落ちた書き手の印を片付ける（反映したファイルは下の照合で一致する）
+        return self._sync(jobs)
+
+    def _sync(self, jobs: int = 1) -> int:
+        """refresh の照合部分（書き換え中の印は扱わない）"""
+        files = self._scan_dir()
+        known = {
+            name: (mtime_ns, size, inode, sidecar_mtime_ns)
+            for name, mtime_ns, size, inode, sidecar_mtime_ns in self.conn.execute(
+                "SELECT name, mtime_ns, size, inode, sidecar_mtime_ns FROM feedback"
+            )
+        }
+        stale = [
+            name
+            for name, (st, sidecar_mtime_ns) in files.items()
+            if known.get(name) != (st.st_mtime_ns, st.st_size, st.st_ino, sidecar_mtime_ns)
+        ]
+        removed = [name for name in known if name not in files]
+        if not stale and not removed:
+            return 0
+        reads = self._read_files(stale, jobs)
+        track_trends = len(stale) + len(removed) < TREND_REBUILD_MIN_FILES
+        with self._transaction(self.conn):
+            for name in removed:
+                self._delete(name, track_trends)
+            for name, read in zip(stale, reads):
+                self._index_file(name, files[name][0], read, track_trends)
+            if not track_trends:
+                self._rebuild_trends()
+        return len(stale) + len(removed)
+
+    def reconcile(self, jobs: int = 1) -> int:
+        """
+        --no-refresh の問い合わせ前の照合。書き換え中の印を反映し直したうえで、ディレクトリの一覧の
+        名前と inode（readdir で得られるので stat しない）を行と比べ、食い違えば refresh する。反映した件数を返す
+        """
+        replayed = self.replay_journal()
+        try:
+            listing = {
+                entry.name: entry.inode()
+                for entry in os.scandir(self.feedback_dir)
+                if self._is_indexed(entry) and entry.is_file()
+            }
+        except OSError:
+            return replayed
+        known = dict(self.conn.execute("SELECT name, inode FROM feedback"))
+        if listing == known:
+            return replayed
+        # 一覧と stat の inode が食い違うファイルシステムでは毎回ここに来る（結果は refresh と同じ）
+        return replayed + self._sync(jobs)
+
+    # ---- 問い合わせ ----
+
+    def stats(self) -> Tuple[int, int, List[str]]:
+        """(id のある件数, うち outcome.success が true の件数, id のないファイル名)"""
+        total, success = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(success = 'true'), 0) FROM feedback WHERE id IS NOT NULL"
+        ).fetchone()
+        broken = [name for (name,) in self.conn.execute("SELECT name FROM feedback WHERE id IS NULL ORDER BY name")]
+        return total, success, broken
+
+    def count_status(self, status: str) -> int:
+        """triage.status が status の件数（保存・更新のたびに増減させている値を引くだけ）"""
+        row = self.conn.execute("SELECT count FROM status_counts WHERE status = ?", (status,)).fetchone()
+        return row[0] if row else 0
+
+    def find_session(self, session_id: str) -> Optional[Tuple[Optional[str], Optional[int], Optional[float]]]:
+        """
+        同じ session_id の fb-*.yaml（ファイル名順で最初のもの）・message_count・最終保存時刻
+        （sessions の created_at の最大の UNIX 秒）。ファイルがなければファイル名と message_count は None
+        （消したり archive/ に移したりしたセッションも最終保存時刻は返す）。どちらもなければ None。
+
+        見つかったファイルだけを stat で照合し、手で編集・削除されていればそのファイルを反映し直して
+        引き直す（ディレクトリ全体を照合しなくても古い行を返さない）。
+        """
+        name = message_count = None
+        for _ in range(FIND_SESSION_ATTEMPTS):
+            row = self.conn.execute(
+                "SELECT name, message_count, mtime_ns, size FROM feedback"
+                " WHERE session_id = ? AND name LIKE 'fb-%' ORDER BY name LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                name = message_count = None
+                break
+            name, message_count, mtime_ns, size = row
+            st = _stat(os.path.join(self.feedback_dir, name))
+            if st is not None and (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+                break
+            self.update([name])
+        row = self.conn.execute("SELECT last_saved_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        saved_at = row[0] if row else None
+        if name is None and saved_at is None:
+            return None
+        return name, message_count, saved_at
+
+    def _filter_sql(self, status: Optional[str], target: Optional[str]) -> Tuple[str, list]:
+        """id のあるフィードバックを status（triage.status）と target（issue のパスの部分一致）で絞る"""
+        clauses = ["f.id IS NOT NULL"]
+        params: list = []
+        if status:
+            clauses.append("t.status = ?")
+            params.append(status)
+        if target:
+            clauses.append(
+                "EXISTS (SELECT 1 FROM issues x WHERE x.name = f.name AND instr(x.target_path, ?) > 0)"
+            )
+            params.append(target)
+        return " AND ".join(clauses), params
+
+    def issue_types(
+        self, status: Optional[str] = None, target: Optional[str] = None, path: Optional[str] = None
+    ) -> List[str]:
+        """issue.type の一覧（target はフィードバック単位、path は issue 単位の完全一致で絞る）"""
+        where, params = self._filter_sql(status, target)
+        if path:
+            where += " AND i.target_path = ?"
+            params.append(path)
+        return [
+            issue_type
+            for (issue_type,) in self.conn.execute(
+                "SELECT i.type FROM issues i JOIN feedback f ON f.name = i.name"
+                " LEFT JOIN triage t ON t.name = f.name"
+                f" WHERE {where} AND i.type IS NOT NULL ORDER BY f.name, i.ord",
+                params,
+            )
+        ]
+
+    def issue_paths(self, status: Optional[str] = None, target: Optional[str] = None) -> List[str]:
+        """issue.target.path の一覧"""
+        where, params = self._filter_sql(status, target)
+        return [
+            target_path
+            for (target_path,) in self.conn.execute(
+                "SELECT i.target_path FROM issues i JOIN feedback f ON f.name = i.name"
+                " LEFT JOIN triage t ON t.name = f.name"
+                f" WHERE {where} AND i.target_path IS NOT NULL ORDER BY f.name, i.ord",
+                params,
+            )
+        ]
+
+    def list_files(self, prefix: str = "") -> List[Tuple[str, Optional[str], int]]:
+        """(ファイル名, triage.status, mtime 秒) をファイル名順に"""
+        return [
+            (name, status, mtime_ns // 1_000_000_000)
+            for name, status, mtime_ns in self.conn.execute(
+                "SELECT f.name, t.status, f.mtime_ns FROM feedback f LEFT JOIN triage t ON t.name = f.name"
+                " WHERE substr(f.name, 1, ?) = ? ORDER BY f.name",
+                (len(prefix), prefix),
+            )
+        ]
+
+    def _select(self, status: Optional[str], prefix: str) -> Tuple[str, list]:
+        """load_postings の対象（status が 'open' なら triage.status が open またはないもの）"""
+        if status == "open":
+            where, params = "(t.status = 'open' OR t.status IS NULL)", []
+        elif status:
+            where, params = "t.status = ?", [status]
+        else:
+            where, params = "1", []
+        return f"substr(f.name, 1, ?) = ? AND {where}", [len(prefix), prefix, *params]
+
+    def _analyze(self, names: List[str]) -> List[str]:
+        """
+        未解析のファイルを analyzer でまとめて解析して書き戻す。解析できなかったファイル名を返す
+        （analyzer がなければ何もしない）
+        """
+        if self.analyzer is None or not names:
+            return []
+        analyses = self.analyzer([os.path.join(self.feedback_dir, name) for name in names])
+        failed = [name for name, analysis in zip(names, analyses) if analysis is None]
+        track_trends = len(names) - len(failed) < TREND_REBUILD_MIN_FILES
+        with self._transaction(self.conn):
+            for name, analysis in zip(names, analyses):
+                if analysis is None:
+                    continue
+                if track_trends:
+                    self._add_trends(name, -1)
+                for table in ANALYSIS_TABLES:
+                    self.conn.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+                self._insert_analysis(name, analysis)
+                self.conn.execute("UPDATE feedback SET analyzed = 1 WHERE name = ?", (name,))
+                if track_trends:
+                    self._add_trends(name, 1)
+            if not track_trends:
+                self._rebuild_trends()
+        return failed
+
+    def load_postings(self, status: Optional[str] = None, prefix: str = "fb-") -> Tuple[int, Dict[str, List[tuple]]]:
+        """
+        recommend_structure.py 用の集計元を (対象のフィードバック数, 行) で返す。行はファイル名順・ファイル内の初出順:
+            keywords:    (id, 正規化キーワード, 低信頼度での出現回数)     ※ id のあるものだけ
+            sections:    (id, skill ファイル, セクション, 正規化キーワード) ※ id のあるものだけ
+            unlinked:    (id, 正規化キーワード, 元の表記)
+            corrections: (id, excerpt)  検出パターンのない修正指示
+
+        status で絞った後の未解析ファイルだけを analyzer に渡し、解析できなかったものは数えない。
+        """
+        where, params = self._select(status, prefix)
+        rows = self.conn.execute(
+            "SELECT f.name, f.analyzed FROM feedback f LEFT JOIN triage t ON t.name = f.name"
+            f" WHERE {where}",
+            params,
+        ).fetchall()
+        failed = self._analyze([name for name, analyzed in rows if not analyzed])
+
+        def select(columns: str, table: str, condition: str = "1") -> List[tuple]:
+            return self.conn.execute(
+                f"SELECT f.id, {columns} FROM {table} p JOIN feedback f ON f.name = p.name"
+                " LEFT JOIN triage t ON t.name = f.name"
+                f" WHERE {where} AND {condition} ORDER BY p.name, p.ord",
+                params,
+            ).fetchall()
+
+        with_id = "f.id IS NOT NULL AND f.id <> ''"
+        return len(rows) - len(failed), {
+            "keywords": select("p.keyword, p.low_confidence", "keyword_postings", with_id),
+            "sections": select("p.file, p.section, p.keyword", "section_postings", with_id),
+            "unlinked": select("p.keyword, p.raw", "unlinked_postings"),
+            "corrections": select(
+                "p.excerpt",
+                "corrections",
+                "NOT EXISTS (SELECT 1 FROM correction_patterns cp"
+                " WHERE cp.name = p.name AND cp.correction_ord = p.ord)",
+            ),
+        }
+
+    # ---- 検証 ----
+
+    def _table_rows(self, table: str, excluded: Set[str]) -> List[tuple]:
+        return [row for row in self.conn.execute(f"SELECT * FROM {table}") if row[0] not in excluded]
+
+    def _diff_status_counts(self, other: "FeedbackIndex") -> List[str]:
+        """増減させてきた status_counts を、自分の triage の集計と作り直した側の値の両方と比べる"""
+        counts = dict(self.conn.execute("SELECT status, count FROM status_counts"))
+        tallied = dict(
+            self.conn.execute("SELECT status, COUNT(*) FROM triage WHERE status IS NOT NULL GROUP BY status")
+        )
+        rebuilt = dict(other.conn.execute("SELECT status, count FROM status_counts"))
+        mismatches = []
+        for status in sorted(set(counts) | set(tallied) | set(rebuilt)):
+            a, b, c = counts.get(status, 0), tallied.get(status, 0), rebuilt.get(status, 0)
+            if not a == b == c:
+                mismatches.append(f"status_counts: {status!r} 逐次={a} triage={b} 再構築={c}")
+        return mismatches
+
+    def _diff_trends(self, other: "FeedbackIndex") -> List[str]:
+        def load(index):
+            return {
+                (kind, key, half_life): (count, value, ref_time)
+                for kind, key, half_life, count, value, ref_time in index.conn.execute(
+                    "SELECT kind, key, half_life_days, count, value, ref_time FROM trends"
+                )
+            }
+
+        incremental, rebuilt = load(self), load(other)
+        times = [ref_time for _, _, ref_time in (*incremental.values(), *rebuilt.values())]
+        now = max(times) if times else 0.0
+        mismatches = []
+        for trend_key in sorted(incremental.keys() | rebuilt.keys()):
+            a, b = incremental.get(trend_key), rebuilt.get(trend_key)
+            if a is not None and b is not None and a[0] == b[0]:
+                half_life = trend_key[2]
+                if math.isclose(
+                    a[1] * decay(now - a[2], half_life), b[1] * decay(now - b[2], half_life),
+                    rel_tol=1e-9, abs_tol=1e-9,
+                ):
+                    continue
+            mismatches.append(f"trends: {trend_key!r} 逐次={a!r} 再構築={b!r}")
+        return mismatches
+
+    def _diff_sessions(self, other: "FeedbackIndex") -> List[str]:
+        """作り直した側（いまあるファイル）の最終保存時刻より古い・ない行（消えたファイルの分の行は比べない）"""
+        kept = dict(self.conn.execute("SELECT session_id, last_saved_at FROM sessions"))
+        mismatches = []
+        rebuilt = other.conn.execute("SELECT session_id, last_saved_at FROM sessions ORDER BY session_id")
+        for session_id, saved_at in rebuilt:
+            if kept.get(session_id, float("-inf")) < saved_at:
+                mismatches.append(f"sessions: {session_id!r} 逐次={kept.get(session_id)!r} 再構築={saved_at!r}")
+        return mismatches
+
+    def verify(self, jobs: int = 1) -> Tuple[List[str], int]:
+        """
+        逐次反映してきた行を、YAML とサイドカーから一時ディレクトリに作り直したインデックスと
+        テーブルごとに突き合わせる。(食い違い, 比べなかったファイル数) を返す（食い違いが空なら一致）。
+
+        analyzer で書き戻した解析結果は作り直す側でも同じ analyzer で解析する。
+        analyzer がなければそのファイルは比べない（トレンドは引き足しの順で丸め誤差が出るため、
+        件数が同じで減衰付き件数が同じ時刻で十分近ければ一致とみなす。比べないファイルがあれば比べない）。
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fresh = FeedbackIndex(self.feedback_dir, self.analyzer, os.path.join(tmpdir, INDEX_FILENAME))
+            try:
+                with fresh._transaction(fresh.conn):
+                    fresh.conn.execute("DELETE FROM trend_half_lives")
+                    fresh.conn.executemany(
+                        "INSERT INTO trend_half_lives (half_life_days) VALUES (?)", [(h,) for h in self._half_lives()]
+                    )
+                fresh.rebuild(jobs)
+                analyzed = {name for (name,) in self.conn.execute("SELECT name FROM feedback WHERE analyzed = 1")}
+                lazy = [
+                    name
+                    for (name,) in fresh.conn.execute("SELECT name FROM feedback WHERE analyzed = 0 ORDER BY name")
+                    if name in analyzed
+                ]
+                excluded = set() if self.analyzer is not None else set(lazy)
+                fresh._analyze(lazy)
+
+                mismatches = []
+                for table in ("feedback", *CHILD_TABLES):
+                    incremental = Counter(self._table_rows(table, excluded))
+                    rebuilt = Counter(fresh._table_rows(table, excluded))
+                    for row in sorted(incremental - rebuilt, key=repr):
+                        mismatches.append(f"{table}: -{row!r}")
+                    for row in sorted(rebuilt - incremental, key=repr):
+                        mismatches.append(f"{table}: +{row!r}")
+                mismatches.extend(self._diff_status_counts(fresh))
+                mismatches.extend(self._diff_sessions(fresh))
+                if not excluded:
+                    mismatches.extend(self._diff_trends(fresh))
+            finally:
+                fresh.close()
+        return mismatches, len(excluded)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT（例外時は ROLLBACK）"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# ===============================
+# CLI
+# ===============================
+
+def main():
+    parser = argparse.ArgumentParser(description="フィードバック YAML の SQLite インデックス")
+    parser.add_argument("--feedback-dir", default=DEFAULT_FEEDBACK_DIR, help="フィードバックディレクトリ")
+    parser.add_argument(
+        "--no-refresh",
+        action="store_true",
+        help="問い合わせ前のファイルごとの照合を省き、書き換え中の印が残っているファイルと、"
+        "ディレクトリの一覧（名前・inode）が行と食い違う場合だけ反映する",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="YAML からインデックスを作り直す")
+    rebuild_parser.add_argument("--jobs", type=int, default=1, help="ファイルを並行に読むスレッド数（既定: 1）")
+    update_parser = subparsers.add_parser("update", help="指定ファイルを反映（なければ削除）")
+    update_parser.add_argument("files", nargs="+")
+    remove_parser = subparsers.add_parser("remove", help="指定ファイルの行を削除")
+    remove_parser.add_argument("files", nargs="+")
+
+    subparsers.add_parser("stats", help="「総数 成功数」を出力（id のないファイルは警告）")
+    count_parser = subparsers.add_parser("count-status", help="triage.status ごとの件数")
+    count_parser.add_argument("status")
+    session_parser = subparsers.add_parser(
+        "find-session",
+        help="同じ session_id の「ファイル名<TAB>message_count<TAB>最終保存時刻（UNIX 秒）」"
+        "（ファイルがなければ最終保存時刻だけ）",
+    )
+    session_parser.add_argument("session_id")
+
+    types_parser = subparsers.add_parser("issue-types", help="issue.type を1行1件で出力")
+    paths_parser = subparsers.add_parser("issue-paths", help="issue.target.path を1行1件で出力")
+    for sub in (types_parser, paths_parser):
+        sub.add_argument("--status", help="triage.status で絞る")
+        sub.add_argument("--target", help="issue のパスにこの文字列を含むフィードバックに絞る")
+    types_parser.add_argument("--path", help="target.path がこのパスの issue に絞る")
+
+    list_parser = subparsers.add_parser("list", help="「ファイル名<TAB>status<TAB>mtime」を出力")
+    list_parser.add_argument("--prefix", default="fb-", help="ファイル名の接頭辞（既定: fb-）")
+    trends_parser = subparsers.add_parser("trends", help="「種類<TAB>キー<TAB>件数<TAB>減衰付き件数...」を出力")
+    trends_parser.add_argument(
+        "--half-lives",
+        default=",".join(f"{h:g}" for h in DEFAULT_TREND_HALF_LIVES),
+        help="半減期（日）のカンマ区切り（既定: %(default)s）",
+    )
+    trends_parser.add_argument("--kind", choices=TREND_KINDS, help="種類で絞る")
+    subparsers.add_parser(
+        "verify",
+        help="YAML から作り直したインデックスと全行を比べる（サイドカーのないファイルの解析結果は比べない）",
+    )
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.feedback_dir):
+        print(f"Error: フィードバックディレクトリが存在しません: {args.feedback_dir}", file=sys.stderr)
+        return 1
+
+    try:
+        index = FeedbackIndex(args.feedback_dir)
+    except sqlite3.Error as e:
+        print(f"Error: インデックスを開けません: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == "rebuild":
+            print(f"indexed: {index.rebuild(args.jobs)}")
+            return 0
+        if args.command == "update":
+            index.update(args.files)
+            return 0
+        if args.command == "remove":
+            index.remove(args.files)
+            return 0
+
+        if args.no_refresh:
+            index.reconcile()
+        else:
+            index.refresh()
+
+        if args.command == "stats":
+            total, success, broken = index.stats()
+            for name in broken:
+                print(f"Warning: {os.path.join(args.feedback_dir, name)} をスキップ", file=sys.stderr)
+            print(f"{total} {success}")
+        elif args.command == "count-status":
+            print(index.count_status(args.status))
+        elif args.command == "find-session":
+            found = index.find_session(args.session_id)
+            if found:
+                name, message_count, saved_at = found
+                print(
+                    f"{name or ''}\t{'' if message_count is None else message_count}"
+                    f"\t{'' if saved_at is None else int(saved_at)}"
+                )
+        elif args.command == "issue-types":
+            for issue_type in index.issue_types(args.status, args.target, args.path):
+                print(issue_type)
+        elif args.command == "issue-paths":
+            for target_path in index.issue_paths(args.status, args.target):
+                print(target_path)
+        elif args.command == "list":
+            for name, status, mtime in index.list_files(args.prefix):
+                print(f"{name}\t{status or '-'}\t{mtime}")
+        elif args.command == "trends":
+            try:
+                half_lives = [float(h) for h in args.half_lives.split(",")]
+            except ValueError:
+                print(f"Error: 半減期を読めません: {args.half_lives}", file=sys.stderr)
+                return 1
+            if not half_lives or min(half_lives) <= 0:
+                print(f"Error: 半減期は正の数で指定してください: {args.half_lives}", file=sys.stderr)
+                return 1
+            for kind, entries in index.trends(half_lives).items():
+                if args.kind and kind != args.kind:
+                    continue
+                for key, entry in entries.items():
+                    scores = "\t".join(f"{entry.get(h, 0.0):.3f}" for h in half_lives)
+                    print(f"{kind}\t{key}\t{entry['count']}\t{scores}")
+        elif args.command == "verify":
+            mismatches, skipped = index.verify()
+            for line in mismatches[:10]:
+                print(line, file=sys.stderr)
+            note = f" (サイドカーのない解析済みファイル {skipped} 件は比べていません)" if skipped else ""
+            if mismatches:
+                print(f"MISMATCH: {len(mismatches)} 行{note}")
+                return 1
+            print(f"ok{note}")
+    except sqlite3.Error as e:
+        print(f"Error: インデックスの問い合わせに失敗しました: {e}", file=sys.stderr)
+        return 1
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
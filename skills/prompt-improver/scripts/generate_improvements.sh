@@ -6,18 +6,21 @@ set -euo pipefail
 shopt -s nullglob
 
 FEEDBACK_DIR="${HOME}/.claude/feedback"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
+
+# インデックス（feedback_index.py）への問い合わせ
+# python3 / feedback_index.py が使えなければ失敗を返し、呼び出し側は YAML を直接読む
+index_query() {
+  [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null || return 1
+  python3 "$INDEX_SCRIPT" --feedback-dir "$FEEDBACK_DIR" "$@"
+}
 
-# ターゲットファイル別に改善提案を生成
-generate() {
+# open ステータスのフィードバックの issue ターゲットパスを1行1件で出力
+list_open_targets() {
   local target_filter="${1:-}"
 
-  echo "=========================================="
-  echo "改善提案レポート"
-  echo "=========================================="
-  echo ""
-
-  # openステータスのフィードバックを抽出
-  local targets=()
+  index_query issue-paths --status open --target "$target_filter" && return 0
 
   for file in "$FEEDBACK_DIR"/*.yaml; do
     [[ -f "$file" ]] || continue
@@ -39,12 +42,43 @@ generate() {
     fi
 
     # ターゲットパスを抽出（全issue分）
-    while IFS= read -r target_path; do
-      if [[ -n "$target_path" ]]; then
-        targets+=("$target_path")
-      fi
-    done < <(grep "^      path:" "$file" 2>/dev/null | sed 's/.*path: //')
+    grep "^      path:" "$file" 2>/dev/null | sed 's/.*path: //' || true
+  done
+}
+
+# open ステータスかつ target.path が一致する issue のタイプを "    - type" 形式で出力
+list_open_issue_types() {
+  local path="$1"
+
+  index_query issue-types --status open --path "$path" | sed 's/^/    - /' && return 0
+
+  for file in "$FEEDBACK_DIR"/*.yaml; do
+    # openステータスかつ該当pathを含むファイルのみ
+    if grep -q "status: open" "$file" 2>/dev/null && \
+       grep -F "$path" "$file" 2>/dev/null | grep -q "path:"; then
+      # 簡易的にissue配下のtypeを抽出（完全な紐付けにはyq等が必要）
+      grep "^    type:" "$file" 2>/dev/null | sed 's/.*type: /    - /' || true
+    fi
   done
+}
+
+# ターゲットファイル別に改善提案を生成
+generate() {
+  local target_filter="${1:-}"
+
+  echo "=========================================="
+  echo "改善提案レポート"
+  echo "=========================================="
+  echo ""
+
+  # openステータスのフィードバックを抽出
+  local targets=()
+
+  while IFS= read -r target_path; do
+    if [[ -n "$target_path" ]]; then
+      targets+=("$target_path")
+    fi
+  done < <(list_open_targets "$target_filter")
 
   # ユニークなターゲット別に集計
   if [[ ${#targets[@]} -eq 0 ]]; then
@@ -64,14 +98,7 @@ generate() {
 
     # 該当ファイルの問題タイプを表示（open ステータスかつ該当pathのissueのみ）
     echo "   問題タイプ:"
-    for file in "$FEEDBACK_DIR"/*.yaml; do
-      # openステータスかつ該当pathを含むファイルのみ
-      if grep -q "status: open" "$file" 2>/dev/null && \
-         grep -F "$path" "$file" 2>/dev/null | grep -q "path:"; then
-        # 簡易的にissue配下のtypeを抽出（完全な紐付けにはyq等が必要）
-        grep "^    type:" "$file" 2>/dev/null | sed 's/.*type: /    - /'
-      fi
-    done | sort | uniq
+    list_open_issue_types "$path" | sort | uniq
   done
 
   echo ""
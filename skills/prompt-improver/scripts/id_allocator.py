@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+id_allocator.py - fb- / kpt- などの日付付き連番 ID の採番
+
+<prefix>-YYYYMMDD-NNN の ID を払い出し、隠しファイル <dir>/.reserve-<ID><suffix> を空で作って予約する。
+呼び出し側は予約ファイルに書き込んでから <dir>/<ID><suffix> へ mv（rename）する。
+書きかけの内容や空のファイルが <ID><suffix> として見えることはなく（一覧・インデックスは隠しファイルを読まない）、
+書き込みを中断するときは予約ファイルを消せばよい。同時に終了した複数のセッションから呼ばれても
+同じ ID を返さず、ディレクトリのファイル数に依らず一定時間で払い出す。
+
+- <dir>/.seq-<prefix> に日付ごとの最後の番号を JSON で持ち、flock で排他して1つ進める
+- 予約は O_CREAT | O_EXCL で作る。採番を通さずに作られたファイル（古いスクリプト・手作業）や
+  残った予約と重なったときは次の番号に進む
+- カウンタにその日付の番号がない（初回・ファイルの破損・削除）ときだけ、<dir> と <dir>/archive の
+  同じ日付の最大番号（予約ファイルを含む）をディレクトリの走査で求めてから続ける
+- 番号は3桁で0埋めし、999 を超えたら桁を増やす（fb-20260101-999 の次は fb-20260101-1000）
+- カウンタには直近 KEEP_DATES 日分だけを残す（UTC と現地時刻の日付が混ざっても前の日付を走査し直さない）
+
+使用方法:
+    python3 id_allocator.py <dir> <prefix> [--date YYYYMMDD] [--suffix .yaml]   # ID を出力
+
+依存: Python 3.x 標準ライブラリのみ（Unix 系のみ。fcntl を使用）
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, Optional
+
+KEEP_DATES = 7
+ARCHIVE_SUBDIR = "archive"
+RESERVATION_PREFIX = ".reserve-"
+
+
+def format_id(prefix: str, date: str, number: int) -> str:
+    return f"{prefix}-{date}-{number:03d}"
+
+
+def reservation_path(directory: str, new_id: str, suffix: str = ".yaml") -> str:
+    """予約ファイルのパス（書き終えたら <directory>/<new_id><suffix> へ rename する）"""
+    return os.path.join(directory, RESERVATION_PREFIX + new_id + suffix)
+
+
+def _read_counter(fd: int) -> Dict[str, int]:
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = b""
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    try:
+        counter = json.loads(data.decode("utf-8")) if data.strip() else {}
+    except ValueError:
+        return {}  # 書きかけで壊れていれば作り直す（番号はディレクトリから求め直す）
+    if not isinstance(counter, dict):
+        return {}
+    return {date: n for date, n in counter.items() if isinstance(n, int)}
+
+
+def _write_counter(fd: int, counter: Dict[str, int]) -> None:
+    recent = dict(sorted(counter.items())[-KEEP_DATES:])
+    data = json.dumps(recent, sort_keys=True).encode("utf-8") + b"\n"
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, data, 0)
+
+
+def _max_existing(directory: str, prefix: str, date: str, suffix: str) -> int:
+    """directory（と archive）にある同じ日付の ID の最大番号（予約ファイルを含む。なければ 0）"""
+    pattern = re.compile(
+        "(?:" + re.escape(RESERVATION_PREFIX) + ")?" + re.escape(f"{prefix}-{date}-") + r"(\d+)" + re.escape(suffix) + "$"
+    )
+    largest = 0
+    for path in (directory, os.path.join(directory, ARCHIVE_SUBDIR)):
+        try:
+            names = os.listdir(path)
+        except OSError:
+            continue
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                largest = max(largest, int(match.group(1)))
+    return largest
+
+
+def allocate(directory: str, prefix: str, date: Optional[str] = None, suffix: str = ".yaml") -> str:
+    """次の ID を払い出し、予約ファイル（reservation_path）を空で作って ID を返す"""
+    date = date or time.strftime("%Y%m%d")
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, f".seq-{prefix}"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        counter = _read_counter(fd)
+        number = counter.get(date)
+        if number is None:
+            number = _max_existing(directory, prefix, date, suffix)
+        while True:
+            number += 1
+            new_id = format_id(prefix, date, number)
+            if os.path.lexists(os.path.join(directory, new_id + suffix)):
+                continue
+            try:
+                os.close(os.open(reservation_path(directory, new_id, suffix), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                break
+            except FileExistsError:
+                continue
+        counter[date] = number
+        _write_counter(fd, counter)
+    finally:
+        os.close(fd)  # ロックも外れる
+    return new_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日付付き連番 ID の採番（<dir>/.reserve-<ID><suffix> を予約して ID を出力）")
+    parser.add_argument("directory", help="ID のファイルを置くディレクトリ")
+    parser.add_argument("prefix", help="ID の接頭辞（fb / kpt など）")
+    parser.add_argument("--date", help="日付 YYYYMMDD（既定: 現地時刻の今日）")
+    parser.add_argument("--suffix", default=".yaml", help="予約するファイルの拡張子（既定: %(default)s）")
+    args = parser.parse_args()
+
+    if args.date and not re.fullmatch(r"\d{8}", args.date):
+        parser.error(f"--date must be YYYYMMDD: {args.date}")
+    if not re.fullmatch(r"[A-Za-z0-9_]+", args.prefix):
+        parser.error(f"invalid prefix: {args.prefix}")
+
+    try:
+        print(allocate(args.directory, args.prefix, args.date, args.suffix))
+    except OSError as e:
+        print(f"Error: ID を払い出せません: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+keyword_matcher.py - 複数キーワードの一括マッチャ（Aho-Corasick）
+
+section_keywords.json の全キーワードを1つのオートマトンにコンパイルし、
+コンテキストを1回走査するだけで全セクションのスコアを算出する。
+判定結果は従来の「keyword.lower() in context_text.lower()」をセクションごとに
+繰り返す方式と同一（部分一致・大文字小文字無視・重なり合うマッチも検出）。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import deque
+from typing import Iterable, Optional, Tuple
+
+# 弱キーワード（汎用的すぎるため、単独ではマッチしない）
+WEAK_KEYWORDS = {"error", "debug", "test", "file", "code", "data", "config", "エラー", "テスト", "ファイル"}
+
+# 弱キーワード / 強キーワードのスコア
+WEAK_SCORE = 0.5
+STRONG_SCORE = 1.0
+
+# active_skill と一致するスキルセクションへのボーナス
+ACTIVE_SKILL_BONUS = 0.5
+
+# confidence 100% とみなすスコア
+FULL_CONFIDENCE_SCORE = 3.0
+
+# コンパイル済みインデックスのディスクキャッシュ形式（構造を変えたら上げる）。
+# キャッシュは dict / list だけの JSON（読み込みでコードが実行される形式は使わない）
+INDEX_CACHE_VERSION = 2
+
+
+class KeywordMatcher:
+    """小文字化済みキーワード集合の Aho-Corasick オートマトン
+
+    遷移は goto + failure リンクで構築し、走査中に解決した遷移はメモ化する
+    （同じ文字列を繰り返し走査するため、2回目以降はほぼ dict 参照のみ）。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        # patterns[i] は小文字化済みのキーワード（重複除去済み）
+        self.patterns = []
+        self._pattern_ids = {}
+        # 空文字列は常にマッチ（"" in text と同じ）
+        self.always = []
+
+        goto = [{}]
+        outputs = [[]]
+        for kw in keywords:
+            if kw in self._pattern_ids:
+                continue
+            pid = len(self.patterns)
+            self._pattern_ids[kw] = pid
+            self.patterns.append(kw)
+            if not kw:
+                self.always.append(pid)
+                continue
+            state = 0
+            for ch in kw:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pid)
+
+        # failure リンク（BFS）。出力は failure 先の出力を合併して保持する
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                cand = goto[f].get(ch, 0)
+                fail[nxt] = cand if cand != nxt else 0
+                if outputs[fail[nxt]]:
+                    outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        # 走査時に解決済みの遷移（goto に加えて failure 経由の遷移もキャッシュ）
+        self._delta = [dict(g) for g in goto]
+        self._outputs = [tuple(o) for o in outputs]
+
+    def to_tables(self) -> dict:
+        """ディスクキャッシュ用の表（走査時のメモ化遷移は含めず、読み込み時に goto から作り直す）"""
+        return {
+            "patterns": self.patterns,
+            "always": self.always,
+            "goto": self._goto,
+            "fail": self._fail,
+            "outputs": self._outputs,
+        }
+
+    @classmethod
+    def from_tables(cls, tables: dict) -> "KeywordMatcher":
+        matcher = cls.__new__(cls)
+        matcher.patterns = list(tables["patterns"])
+        matcher._pattern_ids = {kw: pid for pid, kw in enumerate(matcher.patterns)}
+        matcher.always = list(tables["always"])
+        matcher._goto = [dict(g) for g in tables["goto"]]
+        matcher._fail = list(tables["fail"])
+        matcher._outputs = [tuple(o) for o in tables["outputs"]]
+        if not len(matcher._goto) == len(matcher._fail) == len(matcher._outputs):
+            raise ValueError("inconsistent automaton tables")
+        matcher._delta = [dict(g) for g in matcher._goto]
+        return matcher
+
+    def pattern_id(self, keyword: str) -> Optional[int]:
+        return self._pattern_ids.get(keyword)
+
+    def _resolve(self, state: int, ch: str) -> int:
+        s = state
+        goto = self._goto
+        fail = self._fail
+        while s and ch not in goto[s]:
+            s = fail[s]
+        nxt = goto[s].get(ch, 0)
+        self._delta[state][ch] = nxt
+        return nxt
+
+    def find_ids(self, lowered_text: str) -> set:
+        """小文字化済みテキストに出現するキーワード ID の集合を返す"""
+        found = set(self.always)
+        delta = self._delta
+        outputs = self._outputs
+        resolve = self._resolve
+        state = 0
+        for ch in lowered_text:
+            nxt = delta[state].get(ch)
+            if nxt is None:
+                nxt = resolve(state, ch)
+            state = nxt
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+
+class SectionKeywordIndex:
+    """section_keywords をコンパイルしたもの（キーワード → セクションの転置リスト付き）"""
+
+    def __init__(self, section_keywords: dict):
+        # sections[i] = (type, owner, section) を従来の走査順（claude_md → skills）で保持
+        self.sections = []
+        postings = {}
+        lowered_keywords = []
+
+        def add_sections(kind: str, groups: dict) -> None:
+            for owner, sections in groups.items():
+                for section, section_kws in sections.items():
+                    idx = len(self.sections)
+                    self.sections.append((kind, owner, section))
+                    for kw in section_kws:
+                        low = kw.lower()
+                        lowered_keywords.append(low)
+                        weak = low in WEAK_KEYWORDS
+                        # 同一セクション内の重複キーワードも従来どおり重複して加点する
+                        postings.setdefault(low, []).append((idx, kw, weak))
+
+        add_sections("claude_md", section_keywords.get("claude_md", {}))
+        add_sections("skills", section_keywords.get("skills", {}))
+
+        self.matcher = KeywordMatcher(lowered_keywords)
+        # 空白を含むキーワードは " " 区切りで連結したエントリの境界をまたいでマッチしうる
+        self.spanning_max_len = max((len(k) for k in self.matcher.patterns if " " in k), default=0)
+        # pattern_id → [(section_idx, 元のキーワード, weak)]
+        self._postings = [postings[p] for p in self.matcher.patterns]
+
+    def to_tables(self) -> dict:
+        """ディスクキャッシュ用の表（JSON にそのまま書ける dict / list）"""
+        return {
+            "sections": self.sections,
+            "matcher": self.matcher.to_tables(),
+            "spanning_max_len": self.spanning_max_len,
+            "postings": self._postings,
+        }
+
+    @classmethod
+    def from_tables(cls, tables: dict) -> "SectionKeywordIndex":
+        index = cls.__new__(cls)
+        index.sections = [tuple(section) for section in tables["sections"]]
+        index.matcher = KeywordMatcher.from_tables(tables["matcher"])
+        index.spanning_max_len = int(tables["spanning_max_len"])
+        index._postings = [[tuple(p) for p in plist] for plist in tables["postings"]]
+        if len(index._postings) != len(index.matcher.patterns):
+            raise ValueError("inconsistent postings")
+        return index
+
+    def section_scores(self, context_text: str) -> dict:
+        """コンテキストを1回走査し、マッチしたセクションごとの集計を返す
+
+        Returns:
+            {section_idx: [score, strong_count, matched_keywords]}
+        """
+        return self.section_scores_from_ids(self.matcher.find_ids(context_text.lower()))
+
+    def section_scores_from_ids(self, pattern_ids: Iterable[int]) -> dict:
+        """マッチ済みキーワード ID からセクションごとの集計を返す"""
+        scores = {}
+        postings = self._postings
+        for pid in pattern_ids:
+            for idx, kw, weak in postings[pid]:
+                entry = scores.get(idx)
+                if entry is None:
+                    entry = scores[idx] = [0.0, 0, []]
+                entry[2].append(kw)
+                if weak:
+                    entry[0] += WEAK_SCORE
+                else:
+                    entry[0] += STRONG_SCORE
+                    entry[1] += 1
+        return scores
+
+    def find_linked_target(self, context_text: str, active_skill: Optional[str]) -> Optional[dict]:
+        """コンテキストに最もよく一致するセクションを返す（find_linked_target と同じ判定）"""
+        if not context_text.strip():
+            return None
+        return self.best_target(self.section_scores(context_text), active_skill)
+
+    def best_target(self, scores: dict, active_skill: Optional[str]) -> Optional[dict]:
+        """section_scores の集計から最良のセクションを選ぶ"""
+        best_match = None
+        best_score = 0.0
+        best_strong_count = 0
+
+        # 同点時は先に現れたセクションを優先するため、定義順に評価する
+        for idx in sorted(scores):
+            score, strong_count, matched_kws = scores[idx]
+            # 強キーワードが1つ以上必要（弱キーワードだけではマッチしない）
+            if strong_count == 0:
+                continue
+            kind, owner, section = self.sections[idx]
+            active_bonus = 0.0
+            if kind == "skills" and active_skill and owner == active_skill:
+                active_bonus = ACTIVE_SKILL_BONUS
+                score += active_bonus
+
+            if score > best_score or (score == best_score and strong_count > best_strong_count):
+                best_score = score
+                best_strong_count = strong_count
+                if kind == "claude_md":
+                    best_match = {
+                        "type": "claude_md",
+                        "file": owner,
+                        "section": section,
+                        "confidence": round(min(score / FULL_CONFIDENCE_SCORE, 1.0), 2),
+                        "matched_keywords": sorted(matched_kws),
+                    }
+                else:
+                    # confidence はキーワード根拠のみ（active_bonusは含めない）
+                    evidence_score = max(score - active_bonus, 0.0)
+                    best_match = {
+                        "type": "skill",
+                        "file": f"skills/{owner}/SKILL.md",
+                        "section": section,
+                        "confidence": round(min(evidence_score / FULL_CONFIDENCE_SCORE, 1.0), 2),
+                        "matched_keywords": sorted(matched_kws),
+                    }
+
+        return best_match if best_score > 0 else None
+
+
+def compile_section_keywords(section_keywords: dict) -> SectionKeywordIndex:
+    """section_keywords をマッチャにコンパイル"""
+    return SectionKeywordIndex(section_keywords)
+
+
+def keywords_fingerprint(section_keywords: dict) -> str:
+    """section_keywords の内容ハッシュ（チェックポイント互換性の判定に使用）"""
+    payload = json.dumps(section_keywords, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _read_index_cache(cache_path: str, stat: os.stat_result, content_sha1: Optional[str]) -> Optional[dict]:
+    """キャッシュを読み込み、JSON の mtime・サイズ（一致しなければ内容ハッシュ）で検証"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != INDEX_CACHE_VERSION:
+        return None
+    if not (
+        (cached.get("mtime_ns") == stat.st_mtime_ns and cached.get("size") == stat.st_size)
+        or (content_sha1 is not None and cached.get("sha1") == content_sha1)
+    ):
+        return None
+    try:
+        cached["index"] = SectionKeywordIndex.from_tables(cached["index"])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None  # 形の合わないキャッシュは作り直す
+    return cached
+
+
+def _write_index_cache(cache_path: str, cached: dict) -> bool:
+    """キャッシュを原子的に書き込む（同時に再構築しても読み手は常に完全なファイルを見る）"""
+    cache_dir = os.path.dirname(cache_path) or "."
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".index-", suffix=".tmp")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({**cached, "index": cached["index"].to_tables()}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def load_compiled_keywords(json_path: str, cache_path: str) -> Optional[Tuple[dict, str, SectionKeywordIndex]]:
+    """section_keywords.json をコンパイル済みインデックスとして読み込む
+
+    cache_path（ユーザーのキャッシュディレクトリ）に JSON の mtime・サイズが一致するキャッシュ
+    （一致しなくても内容ハッシュが同じもの）があればそれを使う。なければ JSON をパースして
+    コンパイルし、cache_path へ保存する（書き込めなければ保存しない）。
+
+    Returns:
+        (section_keywords, keywords_fingerprint, SectionKeywordIndex)。JSON を読めない場合は None
+    """
+    try:
+        stat = os.stat(json_path)
+    except OSError:
+        return None
+
+    content_sha1 = None
+    for attempt in range(2):
+        cached = _read_index_cache(cache_path, stat, content_sha1)
+        if cached is not None:
+            if cached["mtime_ns"] != stat.st_mtime_ns and content_sha1 is not None:
+                # 内容は同じで mtime だけ変わった: 次回から高速判定できるよう更新
+                _write_index_cache(cache_path, {**cached, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+            return cached["section_keywords"], cached["fingerprint"], cached["index"]
+        if attempt == 0:
+            # mtime が合わない場合のみ、内容ハッシュで再検証する
+            try:
+                with open(json_path, "rb") as f:
+                    raw = f.read()
+            except OSError:
+                return None
+            content_sha1 = hashlib.sha1(raw).hexdigest()
+
+    try:
+        section_keywords = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    if not isinstance(section_keywords, dict):
+        return None
+    fingerprint = keywords_fingerprint(section_keywords)
+    index = compile_section_keywords(section_keywords)
+    cached = {
+        "version": INDEX_CACHE_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": content_sha1,
+        "section_keywords": section_keywords,
+        "fingerprint": fingerprint,
+        "index": index,
+    }
+    _write_index_cache(cache_path, cached)
+    return section_keywords, fingerprint, index
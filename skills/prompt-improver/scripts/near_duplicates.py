@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+near_duplicates.py - 短いテキストの近似重複グループ化（MinHash / LSH）
+
+未検出の修正指示（excerpt）のように、似た言い回しが少しずつ違う形で繰り返されるテキストを、
+全組を比べずにおおむね線形時間でグループにまとめる。
+
+1. 正規化（NFKC・小文字化・空白の圧縮）したテキストの文字 n-gram（既定 3 文字）をシングルにする
+2. シングル集合の MinHash 署名（NUM_PERM 個のハッシュ (a·x + b) mod (2^31 − 1) の最小値）を求める
+3. 署名を BANDS 個の帯に分け、どれかの帯が一致したものだけを候補にする（LSH）
+4. 候補はシングル集合の Jaccard 類似度で確かめ、threshold 以上の組を union-find でつなぐ
+
+正規化後に同じテキストは最初にまとめるので、同じ excerpt が大量にあっても比較は増えない。
+同じ帯のバケットでは、先頭と直前に入ったものとだけ比べる（大きなバケットでも線形）。
+候補は確かめてからつなぐので誤結合はない（総当たりのグループを細かくしたものになる）。
+取りこぼしは確率的で、Jaccard 0.8 の組を見落とす確率は 1 組あたり約 0.02%。
+NumPy がインストールされていれば署名の計算を行列演算で行う（結果は同じ）。
+
+総当たりと比べた誤結合・取りこぼしの確認と時間比較は benchmarks/reference_checks.py near-duplicates。
+
+依存: Python 3.x 標準ライブラリのみ（NumPy は任意）
+"""
+
+import math
+import random
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy  # 任意: インストールされていれば MinHash 署名を行列演算で求める
+except ImportError:
+    numpy = None
+
+SHINGLE_SIZE = 3  # シングルの文字数
+NUM_PERM = 64  # MinHash 署名の長さ
+BANDS = 16  # LSH の帯の数（1帯 4 行。候補になる類似度の目安は (1/16)^(1/4) = 0.5）
+DEFAULT_THRESHOLD = 0.5  # 同じグループとみなす Jaccard 類似度
+
+# 2^31 − 1（メルセンヌ素数）。a, x < 2^31 なので a·x + b は int64 に収まる
+_PRIME = (1 << 31) - 1
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ===============================
+# シングル・MinHash
+# ===============================
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化・小文字化・空白の圧縮"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _shingle_hashes(normalized: str, size: int) -> Set[int]:
+    if len(normalized) <= size:
+        grams = [normalized] if normalized else []
+    else:
+        grams = [normalized[i:i + size] for i in range(len(normalized) - size + 1)]
+    return {zlib.crc32(gram.encode("utf-8")) % _PRIME for gram in grams}
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """正規化したテキストの文字 n-gram のハッシュ集合（size 文字以下のテキストは全体で1つ）"""
+    return _shingle_hashes(normalize_text(text), size)
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+class MinHasher:
+    """
+    シングル集合の MinHash 署名。backend:
+        'numpy'  : 全ハッシュ関数 × 全シングルを1回の行列演算で（NumPy があるときの既定）
+        'python' : ハッシュ関数ごとに min をとる（NumPy がないときの既定）
+    どちらも整数演算なので署名は同じ。
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 0, backend: Optional[str] = None):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        if backend is None:
+            backend = "numpy" if numpy is not None else "python"
+        if backend == "numpy":
+            if numpy is None:
+                raise RuntimeError("numpy がインストールされていません")
+            self._a = numpy.array([a for a, _ in self.params], dtype=numpy.int64)[:, None]
+            self._b = numpy.array([b for _, b in self.params], dtype=numpy.int64)[:, None]
+        elif backend != "python":
+            raise ValueError(f"unknown backend: {backend}")
+        self.backend = backend
+
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        """空集合の署名はすべて _PRIME（どのシングルのハッシュ値よりも大きい）"""
+        if not hashes:
+            return (_PRIME,) * len(self.params)
+        if self.backend == "numpy":
+            x = numpy.fromiter(hashes, dtype=numpy.int64, count=len(hashes))
+            return tuple(((self._a * x + self._b) % _PRIME).min(axis=1).tolist())
+        xs = list(hashes)
+        return tuple(min([(a * x + b) % _PRIME for x in xs]) for a, b in self.params)
+
+    def signatures(self, hash_sets: Sequence[Set[int]], block: int = 2048) -> List[Tuple[int, ...]]:
+        """複数集合の署名（numpy では block 件ずつ連結して1回の行列演算と minimum.reduceat で求める）"""
+        if self.backend != "numpy":
+            return [self.signature(hashes) for hashes in hash_sets]
+        result: List[Tuple[int, ...]] = []
+        for start in range(0, len(hash_sets), block):
+            chunk = hash_sets[start:start + block]
+            lengths = [len(hashes) for hashes in chunk]
+            if not all(lengths):
+                result.extend(self.signature(hashes) for hashes in chunk)
+                continue
+            x = numpy.fromiter((h for hashes in chunk for h in hashes), dtype=numpy.int64, count=sum(lengths))
+            offsets = numpy.zeros(len(chunk), dtype=numpy.int64)
+            numpy.cumsum(lengths[:-1], out=offsets[1:])
+            minima = numpy.minimum.reduceat((self._a * x + self._b) % _PRIME, offsets, axis=1)
+            result.extend(map(tuple, minima.T.tolist()))
+        return result
+
+
+# ===============================
+# グループ化
+# ===============================
+
+def _group_indices(by_text: Dict[str, List[int]], uniques: List[str], parent: List[int]) -> List[List[int]]:
+    """union-find の結果を元の添字のグループ（2件以上）に展開する（グループ内も先頭の添字の順も昇順）"""
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    components: Dict[int, List[int]] = {}
+    for u, text in enumerate(uniques):
+        components.setdefault(find(u), []).extend(by_text[text])
+    groups = [sorted(indices) for indices in components.values() if len(indices) >= 2]
+    groups.sort(key=lambda indices: indices[0])
+    return groups
+
+
+def _unique_texts(texts: Sequence[str]) -> Tuple[Dict[str, List[int]], List[str]]:
+    """正規化テキスト → 元の添字（空になるテキストは除く）と、正規化テキストの一覧（初出順）"""
+    by_text: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        normalized = normalize_text(text)
+        if normalized:
+            by_text.setdefault(normalized, []).append(i)
+    return by_text, list(by_text)
+
+
+def near_duplicate_groups(
+    texts: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+    shingle_size: int = SHINGLE_SIZE,
+    seed: int = 0,
+    backend: Optional[str] = None,
+) -> List[List[int]]:
+    """
+    近似重複のグループ（texts の添字のリスト、2件以上）を返す。
+    グループ内は添字の昇順、グループは先頭の添字の順。
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm は bands で割り切れる必要があります")
+    rows = num_perm // bands
+    by_text, uniques = _unique_texts(texts)
+    sets = [_shingle_hashes(text, shingle_size) for text in uniques]
+    hasher = MinHasher(num_perm, seed, backend)
+
+    parent = list(range(len(uniques)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked: Set[Tuple[int, int]] = set()
+
+    def link(i: int, j: int) -> None:
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            return
+        pair = (i, j) if i < j else (j, i)
+        if pair in checked:
+            return
+        checked.add(pair)
+        if jaccard(sets[i], sets[j]) >= threshold:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # 帯 → [先頭, 直前] のバケット
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for u, sig in enumerate(hasher.signatures(sets)):
+        for band in range(bands):
+            key = (band, sig[band * rows:(band + 1) * rows])
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [u, u]
+                continue
+            first, last = bucket
+            link(first, u)
+            if last != first:
+                link(last, u)
+            bucket[1] = u
+
+    return _group_indices(by_text, uniques, parent)
+
+
+def common_phrase(texts: Sequence[str], min_share: float = 0.5, min_length: int = SHINGLE_SIZE) -> str:
+    """
+    グループの代表的な言い回し: 先頭のテキスト（正規化後）の部分文字列のうち、
+    半数（min_share、最低 2 件）以上のテキストに含まれる最長のもの。なければ空文字列。
+    長いグループは先頭 50 件だけを見る。
+    """
+    normalized = [normalize_text(text) for text in texts[:50]]
+    if len(normalized) < 2:
+        return ""
+    representative = normalized[0]
+    need = max(2, math.ceil(len(normalized) * min_share))
+
+    def found(length: int) -> str:
+        for start in range(len(representative) - length + 1):
+            candidate = representative[start:start + length]
+            if sum(1 for text in normalized if candidate in text) >= need:
+                return candidate
+        return ""
+
+    # 長さ L で見つかれば L − 1 でも見つかるので二分探索できる
+    best = found(min_length) if len(representative) >= min_length else ""
+    if not best:
+        return ""
+    low, high = min_length, len(representative)
+    while low < high:
+        middle = (low + high + 1) // 2
+        candidate = found(middle)
+        if candidate:
+            best, low = candidate, middle
+        else:
+            high = middle - 1
+    return best.strip()
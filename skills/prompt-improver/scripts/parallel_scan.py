@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+parallel_scan.py - 巨大トランスクリプトの並列チャンク解析
+
+トランスクリプトを mmap して改行位置でチャンクに分割し、チャンクごとにプロセスプールで
+解析した部分集計（件数・ファイル別編集回数・スキル使用・行番号付きタイムラインなど）を
+前から順に結合する。結合結果は transcript_scanner.scan_transcript（直列）と同じになる。
+
+- ターン番号: チャンクは直前のエントリ種別を知らずに数えるため、結合時に境界で補正する
+  （ScanContext.merge_state）
+- 前のチャンクのツール使用を参照する tool_result: チャンク内では保留し、結合時に解決する
+  （ToolTimelineCollector.merge_state）
+
+対象は結合可能なコレクタ（merge_state を持つもの）のみ。linked_targets は直前の
+コンテキストに依存するため含まない。チェックポイントは使わない。
+
+使用方法:
+    python3 parallel_scan.py verify <transcript.jsonl> [--jobs N] [--chunk-bytes N ...]
+
+    直列スキャンと並列スキャンの結果（コンテキストと全コレクタの状態）を比較し、
+    一致しなければ終了コード 1 を返す。
+
+依存: Python 3.x 標準ライブラリのみ（orjson があればデコードに使用）
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from transcript_scanner import (
+    DEFAULT_JSON_BACKEND,
+    DEFAULT_PREFILTER,
+    Collector,
+    CorrectionCollector,
+    EntryDecoder,
+    ErrorCollector,
+    LinkedTargetCollector,
+    MetricsCollector,
+    ScanContext,
+    SkillUsageCollector,
+    TaskSummaryCollector,
+    ToolTimelineCollector,
+    add_decode_arguments,
+    add_limit_arguments,
+    default_collectors,
+    limits_from_args,
+    scan_transcript,
+)
+
+# チャンクの最小サイズ（これより小さいファイルは分割しない）
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+
+# ワーカーあたりのチャンク数の目安（チャンクごとの処理時間のばらつきを均す）
+CHUNKS_PER_JOB = 4
+
+
+def parallel_collectors(limits: Optional[dict] = None, chunk_mode: bool = False) -> List[Collector]:
+    """並列スキャンで結合できるコレクタ構成（default_collectors から linked_targets を除いたもの）"""
+    return [
+        MetricsCollector(),
+        TaskSummaryCollector(),
+        SkillUsageCollector(),
+        ToolTimelineCollector(limits, chunk_mode=chunk_mode),
+        ErrorCollector(limits),
+        CorrectionCollector(limits=limits),
+    ]
+
+
+def _entry_decoder(collectors: List[Collector], prefilter: bool, json_backend: str) -> EntryDecoder:
+    # 直列の既定構成と同じ行をデコードする（事前フィルタの判定をそろえる）ため、
+    # linked_targets の decode_markers も含める
+    return EntryDecoder([*collectors, LinkedTargetCollector], prefilter, json_backend)
+
+
+def split_chunks(mm, size: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """[start, end) のバイト範囲に分割（各チャンクは行の途中で切れない）"""
+    ranges = []
+    start = 0
+    while start < size:
+        end = start + chunk_bytes
+        if end >= size:
+            end = size
+        else:
+            newline = mm.find(b"\n", end - 1)
+            end = size if newline < 0 else newline + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _scan_chunk(task: tuple) -> dict:
+    """1チャンクを単独で解析し、結合用の部分集計を返す（ワーカープロセスで実行）"""
+    jsonl_path, start, end, prefilter, json_backend, limits = task
+    # 全体の初出ファイルを結合時に決めるため、チャンク内の初出はすべて残す
+    chunk_limits = {**(limits or {}), "unique_changed": sys.maxsize}
+    collectors = parallel_collectors(chunk_limits, chunk_mode=True)
+    decoder = _entry_decoder(collectors, prefilter, json_backend)
+    ctx = ScanContext()
+    first_entry_type = None
+    entry_seen = False
+
+    with open(jsonl_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            raw = mm.readline()
+            ctx.line_number += 1
+            for c in collectors:
+                c.feed_raw(raw, ctx)
+
+            entry = decoder.decode(raw)
+            if entry is None:
+                continue
+            if not entry_seen:
+                entry_seen = True
+                first_entry_type = entry.get("type")
+
+            ctx.begin_entry(entry)
+            for c in collectors:
+                c.feed(ctx)
+
+    return {
+        "first_entry_type": first_entry_type,
+        "entry_seen": entry_seen,
+        "context": ctx.get_state(),
+        "collectors": {c.name: c.get_state() for c in collectors},
+    }
+
+
+def scan_parallel(
+    jsonl_path: str,
+    jobs: Optional[int] = None,
+    prefilter: bool = DEFAULT_PREFILTER,
+    json_backend: str = DEFAULT_JSON_BACKEND,
+    limits: Optional[dict] = None,
+    chunk_bytes: Optional[int] = None,
+) -> Tuple[ScanContext, Dict[str, Collector]]:
+    """チャンクに分割して並列に解析し、直列スキャンと同じ結果に結合する
+
+    jobs が None / 0 以下なら CPU 数。chunk_bytes を省略すると
+    ワーカー数 × CHUNKS_PER_JOB 程度に分割する（最小 MIN_CHUNK_BYTES）。
+
+    Returns:
+        (スキャンコンテキスト, コレクタ名 → コレクタ)  ※ linked_targets は含まない
+    """
+    if not jobs or jobs <= 0:
+        jobs = os.cpu_count() or 1
+    size = os.path.getsize(jsonl_path)
+    if chunk_bytes is None:
+        chunk_bytes = max(MIN_CHUNK_BYTES, -(-size // (jobs * CHUNKS_PER_JOB)))
+
+    ranges = []
+    if size:
+        with open(jsonl_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ranges = split_chunks(mm, size, max(1, chunk_bytes))
+    tasks = [(jsonl_path, start, end, prefilter, json_backend, limits) for start, end in ranges]
+
+    if jobs == 1 or len(tasks) <= 1:
+        partials = [_scan_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            partials = list(pool.map(_scan_chunk, tasks))
+
+    # 前のチャンクから順に結合（行番号・ターン番号を全体の通し番号に直す）
+    ctx = ScanContext()
+    collectors = parallel_collectors(limits)
+    for partial in partials:
+        line_offset, turn_offset = ctx.merge_state(
+            partial["context"], partial["first_entry_type"], partial["entry_seen"]
+        )
+        for c in collectors:
+            c.merge_state(partial["collectors"][c.name], line_offset, turn_offset)
+
+    return ctx, {c.name: c for c in collectors}
+
+
+# ===============================
+# 直列スキャンとの差分検証
+# ===============================
+
+def _state_json(state: dict) -> str:
+    # dict の順序（初出順）も出力に影響するため sort_keys しない
+    return json.dumps(state, ensure_ascii=False)
+
+
+def verify_parallel(
+    jsonl_path: str,
+    jobs: Optional[int] = None,
+    chunk_bytes: Optional[int] = None,
+    prefilter: bool = DEFAULT_PREFILTER,
+    json_backend: str = DEFAULT_JSON_BACKEND,
+    limits: Optional[dict] = None,
+    serial: Optional[Tuple[ScanContext, Dict[str, Collector]]] = None,
+) -> List[str]:
+    """直列スキャンと並列スキャンの状態を比較し、一致しない項目名を返す（空なら一致）"""
+    if serial is None:
+        serial = scan_transcript(jsonl_path, default_collectors(limits), None, prefilter, json_backend)
+    serial_ctx, serial_collectors = serial
+    ctx, collectors = scan_parallel(jsonl_path, jobs, prefilter, json_backend, limits, chunk_bytes)
+
+    mismatches = []
+    if _state_json(ctx.get_state()) != _state_json(serial_ctx.get_state()):
+        mismatches.append("context")
+    for name, collector in collectors.items():
+        if _state_json(collector.get_state()) != _state_json(serial_collectors[name].get_state()):
+            mismatches.append(name)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="トランスクリプトの並列チャンク解析")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = subparsers.add_parser("verify", help="直列スキャンと並列スキャンの結果を比較")
+    verify_parser.add_argument("transcript", help="トランスクリプト JSONL のパス")
+    verify_parser.add_argument("--jobs", type=int, default=0, help="ワーカー数（既定: CPU 数）")
+    verify_parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        action="append",
+        help="チャンクサイズ（複数指定可。既定: 自動分割と 64KiB の2通り）",
+    )
+    add_decode_arguments(verify_parser)
+    add_limit_arguments(verify_parser)
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.transcript):
+        print(f"Error: File not found: {args.transcript}", file=sys.stderr)
+        return 1
+
+    limits = limits_from_args(args)
+    started = time.perf_counter()
+    serial = scan_transcript(args.transcript, default_collectors(limits), None, args.prefilter, args.json_backend)
+    serial_secs = time.perf_counter() - started
+    print(f"serial: {serial_secs:.2f}s ({serial[0].line_number} lines)")
+
+    failed = False
+    for chunk_bytes in args.chunk_bytes or [None, 64 * 1024]:
+        started = time.perf_counter()
+        mismatches = verify_parallel(
+            args.transcript, args.jobs, chunk_bytes, args.prefilter, args.json_backend, limits, serial
+        )
+        label = "auto" if chunk_bytes is None else str(chunk_bytes)
+        status = "ok" if not mismatches else "MISMATCH: " + ", ".join(mismatches)
+        print(f"parallel (chunk-bytes={label}): {time.perf_counter() - started:.2f}s {status}")
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
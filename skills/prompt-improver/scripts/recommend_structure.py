@@ -3,19 +3,45 @@
 構造改善レポート生成スクリプト
 
 フィードバック YAML を分析して、新スキル作成・スキル分割の推奨を生成する。
-PyYAML なしで動作する限定パーサを使用。
+Stop hook が書き出したサイドカー（fb-*.extracted.json）があれば抽出情報はそこから読み、
+なければ PyYAML なしで動作する限定パーサ（feedback_parser.py）で YAML から読み取る。
+検出処理は feedback_index.py のインデックスが保存時に作っておいた正規化済みキーワードの
+ポスティングを集計した KeywordPostings を入力にする（インデックスが使えなければ YAML から作る）。
 
 Usage:
-    python3 recommend_structure.py [--feedback-dir DIR] [--status STATUS]
+    python3 recommend_structure.py [--feedback-dir DIR] [--status STATUS] [--jobs N] [--excerpt-scope SCOPE]
+    python3 recommend_structure.py --verify-index # インデックスの逐次反映を作り直した結果と比べる
 """
 
 import argparse
+import heapq
 import os
 import re
-import unicodedata
+import sqlite3
+import sys
+from bisect import bisect_right
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Optional
+from typing import Callable, Dict, List, Set, Tuple, Optional
+
+try:
+    import numpy  # 任意: インストールされていればセクション間類似度を行列演算でまとめて求める
+except ImportError:
+    numpy = None
+
+from feedback_index import (
+    DEFAULT_TREND_HALF_LIVES,
+    TREND_KINDS,
+    FeedbackIndex,
+    feedback_from_extracted,
+    normalize_keyword,
+    posting_rows,
+    trend_rate,
+)
+from feedback_parser import FeedbackParseCache, parse_feedback_yaml
+from near_duplicates import common_phrase, near_duplicate_groups
+from structured_output import load_sidecar, sidecar_path
 
 
 # ===============================
@@ -24,218 +50,191 @@ from typing import Dict, List, Set, Tuple, Optional
 
 # 新スキル候補の閾値
 MIN_DOC_FREQUENCY = 3  # 同系統キーワードが出現する最小 fb 数
-LOW_CONFIDENCE_THRESHOLD = 0.5  # 低信頼度の閾値
+# 低信頼度の閾値（LOW_CONFIDENCE_THRESHOLD）はインデックスに件数を保存するため feedback_index.py にある
 
 # 分割候補の閾値
 MIN_CLUSTER_SIZE = 3  # クラスターに必要な最小 fb 数
 MAX_JACCARD_SIMILARITY = 0.3  # クラスター間の最大類似度（これ以下で分割推奨）
 
-# 無視するキーワード（汎用すぎるもの）
-STOP_WORDS = {
-    "the", "a", "an", "is", "are", "was", "were", "be", "been",
-    "have", "has", "had", "do", "does", "did", "will", "would",
-    "could", "should", "may", "might", "must", "shall",
-    "this", "that", "these", "those", "it", "its",
-    "and", "or", "but", "if", "then", "else",
-    "for", "to", "from", "with", "by", "at", "in", "on", "of",
-    "file", "files", "code", "error", "errors", "test", "tests",
-}
+# トレンドの閾値（窓は半減期・日。既定は DEFAULT_TREND_HALF_LIVES の短い窓と長い窓）
+TREND_RATIO = 2.0  # 短い窓の1日あたり件数が長い窓の何倍以上（何分の1以下）で増加（減少）とみなすか
+TREND_MIN_SCORE = 2.0  # 判定に必要な減衰付き件数（増加は短い窓、減少は長い窓）
+TREND_TOP = 5  # 種類ごとに表示する件数
+
+# キーワードの正規化と無視するキーワード（STOP_WORDS）も、インデックスが保存時に
+# ポスティングを作るため feedback_index.py にある
+
+# 整数のビット集合の要素数（int.bit_count は Python 3.10 以降）
+_popcount = getattr(int, 'bit_count', None) or (lambda value: bin(value).count('1'))
 
 
 # ===============================
-# YAML 限定パーサ
+# フィードバック読み込み
 # ===============================
 
-def parse_feedback_yaml(filepath: str) -> Optional[Dict]:
-    """
-    フィードバック YAML から必要なフィールドだけを抽出する限定パーサ。
-    PyYAML なしで動作。
-    """
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception:
-        return None
-
-    result = {
-        'id': None,
-        'triage_status': None,
-        'improvement_targets': [],
-        'errors': [],
-        'user_corrections': [],
-    }
+def status_matches(status: Optional[str], status_filter: str) -> bool:
+    """triage.status が対象か（'open' なら open または triage がないものも対象）"""
+    if status_filter == 'open':
+        return not status or status == 'open'
+    return status == status_filter
 
-    # ID
-    match = re.search(r'^id:\s*(\S+)', content, re.MULTILINE)
-    if match:
-        result['id'] = match.group(1)
 
-    # triage.status
-    match = re.search(r'triage:\s*\n\s+status:\s*(\S+)', content)
-    if match:
-        result['triage_status'] = match.group(1)
+def parse_feedbacks(
+    paths: List[str],
+    status_filter: str,
+    cache: FeedbackParseCache,
+    jobs: int = 1,
+) -> List[Dict]:
+    """
+    フィードバックを paths の順に読み込み、triage.status が対象のものだけを返す。
 
-    # improvement_targets セクションを抽出（ネスト構造を含む全行をキャプチャ）
-    targets_match = re.search(
-        r'improvement_targets:\s*\n((?:\s{4,}.*\n?)+?)(?=\n\s{2}\w+:|\Z)',
-        content
-    )
-    if targets_match:
-        targets_section = targets_match.group(1)
-        result['improvement_targets'] = parse_improvement_targets(targets_section)
-
-    # errors セクションからキーワードを抽出（ネスト構造を含む）
-    errors_match = re.search(
-        r'^\s+errors:\s*\n((?:\s{6,}.*\n?)+?)(?=\n\s{2,4}\w+:|\Z)',
-        content,
-        re.MULTILINE
-    )
-    if errors_match:
-        errors_section = errors_match.group(1)
-        result['errors'] = extract_error_keywords(errors_section)
-
-    # user_corrections セクションからキーワードと詳細を抽出
-    # items: セクションを探す（ネスト構造を含む全行をキャプチャ）
-    items_match = re.search(
-        r'user_corrections:\s*\n\s+count:\s*\d+\s*\n\s+items:\s*\n((?:\s{6,}.*\n?)+)',
-        content
+    先に id / triage.status（update_triage.sh で更新される）だけを読んで絞り込み、
+    対象外のファイルは解析しない。サイドカーがあれば extracted 部分は JSON から組み立て、
+    なければ YAML を限定パーサで解析する（解析結果のキャッシュを使う）。
+    jobs > 1 なら読み込みはスレッド、キャッシュにない YAML の解析はプロセスで並行に行う。
+    """
+    headers = _map_in_threads(lambda path: parse_feedback_yaml(path, extracted=False), paths, jobs)
+    selected = [
+        (path, header)
+        for path, header in zip(paths, headers)
+        if header is not None and status_matches(header['triage_status'], status_filter)
+    ]
+    sidecars = _map_in_threads(
+        lambda path: load_sidecar(sidecar_path(path), 'extracted'), [path for path, _ in selected], jobs
     )
-    if items_match:
-        items_section = items_match.group(1)
-        result['user_corrections'] = extract_correction_keywords(items_section)
-        result['user_correction_items'] = extract_correction_items(items_section)
-    else:
-        result['user_correction_items'] = []
+    unparsed = [path for (path, _), extracted in zip(selected, sidecars) if extracted is None]
+    parsed = dict(zip(unparsed, cache.parse_many(unparsed, jobs)))
 
-    return result
+    feedbacks = []
+    for (path, header), extracted in zip(selected, sidecars):
+        if extracted is not None:
+            fb = dict(header)
+            fb.update(feedback_from_extracted(extracted))
+        else:
+            fb = parsed[path]
+            # 絞り込んだ後に書き換えられていれば改めて判定する
+            if fb is None or not status_matches(fb['triage_status'], status_filter):
+                continue
+        feedbacks.append(fb)
+    return feedbacks
 
 
-def parse_improvement_targets(section: str) -> List[Dict]:
-    """improvement_targets セクションをパース"""
-    targets = []
-    current_target = {}
-
-    for line in section.split('\n'):
-        if re.match(r'\s+-\s+target:', line):
-            if current_target:
-                targets.append(current_target)
-            current_target = {'keywords': [], 'avg_confidence': 1.0, 'file': None, 'section': None, 'type': None}
-        elif 'type:' in line and current_target:
-            match = re.search(r'type:\s*["\']?(\S+?)["\']?$', line)
-            if match:
-                current_target['type'] = match.group(1).strip('"\'')
-        elif 'file:' in line and current_target:
-            match = re.search(r'file:\s*["\']?(.+?)["\']?\s*$', line)
-            if match:
-                current_target['file'] = match.group(1).strip('"\'')
-        elif 'section:' in line and current_target:
-            match = re.search(r'section:\s*["\']?(.+?)["\']?\s*$', line)
-            if match:
-                current_target['section'] = match.group(1).strip('"\'')
-        elif 'avg_confidence:' in line and current_target:
-            match = re.search(r'avg_confidence:\s*([\d.]+)', line)
-            if match:
-                current_target['avg_confidence'] = float(match.group(1))
-        elif 'keywords:' in line and current_target:
-            # keywords リストを抽出
-            match = re.search(r'keywords:\s*\[(.+?)\]', line)
-            if match:
-                keywords_str = match.group(1)
-                current_target['keywords'] = [
-                    k.strip().strip('"\'')
-                    for k in keywords_str.split(',')
-                ]
-
-    if current_target:
-        targets.append(current_target)
-
-    return targets
-
-
-def extract_error_keywords(section: str) -> List[str]:
-    """errors セクションからキーワードを抽出"""
-    keywords = []
-    matches = re.findall(r'matched_keywords:\s*\[(.+?)\]', section)
-    for match in matches:
-        for kw in match.split(','):
-            kw = kw.strip().strip('"\'')
-            if kw:
-                keywords.append(kw)
-    return keywords
-
-
-def extract_correction_keywords(section: str) -> List[str]:
-    """user_corrections セクションからキーワードを抽出"""
-    keywords = []
-    # patterns から抽出
-    matches = re.findall(r'patterns:\s*\[(.+?)\]', section)
-    for match in matches:
-        for kw in match.split(','):
-            kw = kw.strip().strip('"\'')
-            if kw:
-                keywords.append(kw)
-    return keywords
-
-
-def extract_correction_items(section: str) -> List[Dict]:
-    """user_corrections セクションから詳細情報を抽出"""
-    items = []
-    current_item = {}
-
-    for line in section.split('\n'):
-        if re.match(r'\s+-\s+line:', line):
-            if current_item:
-                items.append(current_item)
-            current_item = {'excerpt': '', 'patterns': [], 'linked_target': None}
-        elif 'excerpt:' in line and current_item is not None:
-            match = re.search(r'excerpt:\s*["\']?(.+?)["\']?\s*$', line)
-            if match:
-                current_item['excerpt'] = match.group(1)[:100]
-        elif 'patterns:' in line and current_item is not None:
-            match = re.search(r'patterns:\s*\[(.+?)\]', line)
-            if match:
-                current_item['patterns'] = [
-                    p.strip().strip('"\'') for p in match.group(1).split(',')
-                ]
-        elif 'linked_target:' in line and current_item is not None:
-            current_item['linked_target'] = True
-
-    if current_item:
-        items.append(current_item)
-
-    return items
+def _map_in_threads(func: Callable, items: List, jobs: int) -> List:
+    """func を items の順に適用した結果（jobs > 1 ならスレッドで並行に）"""
+    if jobs > 1 and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+            return list(pool.map(func, items))
+    return [func(item) for item in items]
 
 
 # ===============================
-# キーワード正規化
+# キーワードのポスティング
 # ===============================
 
-def normalize_keyword(keyword: str) -> str:
-    """キーワードを正規化（大小文字、Unicode正規化）"""
-    # Unicode正規化（NFKC）
-    normalized = unicodedata.normalize('NFKC', keyword)
-    # 小文字化
-    normalized = normalized.lower()
-    # 記号除去（アンダースコア、ハイフンは残す）
-    normalized = re.sub(r'[^\w\s-]', '', normalized)
-    return normalized.strip()
+class KeywordPostings:
+    """
+    検出処理の入力（フィードバックの出現順に集計したもの）。
+
+    - keyword_fb_ids: 正規化キーワード → fb_id 集合（id のあるフィードバックのみ）
+    - low_confidence: 正規化キーワード → 低信頼度の improvement_targets での出現回数
+    - skill_sections / skill_section_fb_ids: skill ファイル → セクション → キーワード集合 / fb_id 集合
+    - unlinked_keywords: リンク不十分な improvement_targets のキーワード → fb_id 集合と元の表記
+    - undetected_excerpts: 検出パターンに引っかからなかったユーザー指摘
 
+    インデックスの *_postings テーブルから作っても（from_index）、フィードバックから作っても
+    （from_feedbacks）、挿入順まで同じになる。id のないフィードバックは unlinked_keywords と
+    undetected_excerpts にだけ入る。
+    """
 
-def is_valid_keyword(keyword: str) -> bool:
-    """有効なキーワードかどうか"""
-    normalized = normalize_keyword(keyword)
-    if len(normalized) < 2:
-        return False
-    if normalized in STOP_WORDS:
-        return False
-    return True
+    def __init__(self):
+        self.feedback_count = 0
+        self.keyword_fb_ids: Dict[str, Set[str]] = defaultdict(set)
+        self.low_confidence: Dict[str, int] = defaultdict(int)
+        self.skill_sections: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self.skill_section_fb_ids: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self.unlinked_keywords: Dict[str, Dict] = defaultdict(lambda: {'fb_ids': set(), 'keywords': set()})
+        self.undetected_excerpts: List[Dict] = []
+
+    def add_keyword(self, fb_id: Optional[str], keyword: str, low_confidence: int) -> None:
+        if fb_id:
+            self.keyword_fb_ids[keyword].add(fb_id)
+            if low_confidence:
+                self.low_confidence[keyword] += low_confidence
+
+    def add_section_keyword(self, fb_id: Optional[str], file_path: str, section: str, keyword: str) -> None:
+        if fb_id:
+            self.skill_sections[file_path][section].add(keyword)
+            self.skill_section_fb_ids[file_path][section].add(fb_id)
+
+    def add_unlinked(self, fb_id: Optional[str], keyword: str, raw: str) -> None:
+        # id のないフィードバックも数える
+        unlinked = self.unlinked_keywords[keyword]
+        unlinked['fb_ids'].add(fb_id)
+        unlinked['keywords'].add(raw)
+
+    def add_correction(self, fb_id: Optional[str], excerpt: Optional[str]) -> None:
+        """patterns が空のユーザー指摘を1件加える（短すぎるものは除く）"""
+        if excerpt and len(excerpt) > 5:
+            self.undetected_excerpts.append({'fb_id': fb_id, 'excerpt': excerpt})
+
+    @classmethod
+    def from_feedbacks(cls, feedbacks: List[Dict]) -> 'KeywordPostings':
+        """読み込んだフィードバックから作る（インデックスが使えない場合）"""
+        postings = cls()
+        for fb in feedbacks:
+            postings.feedback_count += 1
+            fb_id = fb.get('id')
+            keywords, sections, unlinked = posting_rows(fb)
+            for row in keywords:
+                postings.add_keyword(fb_id, *row)
+            for row in sections:
+                postings.add_section_keyword(fb_id, *row)
+            for row in unlinked:
+                postings.add_unlinked(fb_id, *row)
+            for item in fb.get('user_correction_items', []):
+                if not item.get('patterns'):
+                    postings.add_correction(fb_id, item.get('excerpt', ''))
+        return postings
+
+    @classmethod
+    def from_index(cls, index: FeedbackIndex, status_filter: str) -> 'KeywordPostings':
+        """インデックスに保存済みのポスティングから作る（キーワードの正規化はしない）"""
+        postings = cls()
+        postings.feedback_count, rows = index.load_postings(status_filter)
+        for row in rows['keywords']:
+            postings.add_keyword(*row)
+        for row in rows['sections']:
+            postings.add_section_keyword(*row)
+        for row in rows['unlinked']:
+            postings.add_unlinked(*row)
+        for row in rows['corrections']:
+            postings.add_correction(*row)
+        return postings
+
+    def diff(self, other: 'KeywordPostings') -> List[str]:
+        """集計が食い違う項目名（挿入順も比べる。--verify-index 用）"""
+        def nested(sections):
+            return [(name, [(k, list(v)) for k, v in inner.items()]) for name, inner in sections.items()]
+
+        fields = {
+            'feedback_count': lambda p: p.feedback_count,
+            'keyword_fb_ids': lambda p: [(k, list(v)) for k, v in p.keyword_fb_ids.items()],
+            'low_confidence': lambda p: list(p.low_confidence.items()),
+            'skill_sections': lambda p: nested(p.skill_sections),
+            'skill_section_fb_ids': lambda p: nested(p.skill_section_fb_ids),
+            'unlinked_keywords': lambda p: [
+                (k, list(v['fb_ids']), list(v['keywords'])) for k, v in p.unlinked_keywords.items()
+            ],
+            'undetected_excerpts': lambda p: p.undetected_excerpts,
+        }
+        return [name for name, get in fields.items() if get(self) != get(other)]
 
 
 # ===============================
 # 新スキル候補検出
 # ===============================
 
-def detect_new_skill_candidates(feedbacks: List[Dict]) -> List[Dict]:
+def detect_new_skill_candidates(postings: KeywordPostings) -> List[Dict]:
     """
     新スキル作成候補を検出。
 
@@ -245,39 +244,9 @@ def detect_new_skill_candidates(feedbacks: List[Dict]) -> List[Dict]:
     - 同系統キーワードが複数 fb で出現
     """
     # キーワード → 出現 fb_id のマッピング
-    keyword_to_fb_ids: Dict[str, Set[str]] = defaultdict(set)
+    keyword_to_fb_ids = postings.keyword_fb_ids
     # キーワード → 低信頼度フラグ
-    keyword_low_confidence: Dict[str, int] = defaultdict(int)
-
-    for fb in feedbacks:
-        fb_id = fb.get('id')
-        if not fb_id:
-            continue
-
-        # improvement_targets から低信頼度のキーワードを収集
-        for target in fb.get('improvement_targets', []):
-            confidence = target.get('avg_confidence', 1.0)
-            for kw in target.get('keywords', []):
-                if not is_valid_keyword(kw):
-                    continue
-                normalized = normalize_keyword(kw)
-                keyword_to_fb_ids[normalized].add(fb_id)
-                if confidence < LOW_CONFIDENCE_THRESHOLD:
-                    keyword_low_confidence[normalized] += 1
-
-        # errors のキーワードも収集
-        for kw in fb.get('errors', []):
-            if not is_valid_keyword(kw):
-                continue
-            normalized = normalize_keyword(kw)
-            keyword_to_fb_ids[normalized].add(fb_id)
-
-        # user_corrections のキーワードも収集
-        for kw in fb.get('user_corrections', []):
-            if not is_valid_keyword(kw):
-                continue
-            normalized = normalize_keyword(kw)
-            keyword_to_fb_ids[normalized].add(fb_id)
+    keyword_low_confidence = postings.low_confidence
 
     # 候補を検出
     candidates = []
@@ -316,37 +285,87 @@ def detect_new_skill_candidates(feedbacks: List[Dict]) -> List[Dict]:
 
 
 def cluster_keywords_by_cooccurrence(keyword_fb_map: Dict[str, Set[str]]) -> List[Tuple[Set[str], Set[str]]]:
-    """共起ベースでキーワードをクラスタリング"""
+    """
+    共起ベースでキーワードをクラスタリング。
+
+    キーワードを順に種にし、まだ使われていない後ろのキーワードのうち、クラスターの fb_id 集合との
+    Jaccard 類似度が 0.5 を超えるものを順に取り込む（取り込むたびに fb_id 集合は広がる）。
+
+    総当たりで全組を比べる代わりに、fb_id を整数に振り直して fb → キーワードの転置インデックスを作り、
+    クラスターに fb が加わるたびにその fb を含む後ろのキーワードの共通部分の件数を数え上げる。
+    Jaccard > 0.5 は 3 × 共通部分 > |クラスター| + |キーワード| と同じなので、これを満たしうる
+    キーワードだけを元の順（位置の昇順）に比べる。fb を共有しないキーワードは比べない。
+    結果（クラスター内の並びを含む）は総当たりと同じ。
+    """
     if not keyword_fb_map:
         return []
 
-    # 簡易クラスタリング: fb_id の重なりが大きいキーワードをまとめる
     keywords = list(keyword_fb_map.keys())
+    fb_numbers: Dict[str, int] = {}
+    number_of = fb_numbers.setdefault
+    postings = [[number_of(fb_id, len(fb_numbers)) for fb_id in keyword_fb_map[kw]] for kw in keywords]
+    sizes = [len(numbers) for numbers in postings]
+    keywords_by_fb: List[List[int]] = [[] for _ in range(len(fb_numbers))]  # 位置の昇順
+    for position, numbers in enumerate(postings):
+        for number in numbers:
+            keywords_by_fb[number].append(position)
+
+    used = [False] * len(keywords)
+    # 種ごとにリセットする代わりに、書き込んだときの種の位置を持つ
+    fb_seen = [-1] * len(keywords_by_fb)  # クラスターに入った fb
+    shared_seed = [-1] * len(keywords)
+    shared = [0] * len(keywords)  # クラスターとの共通部分の件数
+    queued = [-1] * len(keywords)
     clusters = []
-    used = set()
 
-    for kw in keywords:
-        if kw in used:
+    def absorb(pending: List[int], seed: int, numbers: List[int], after: int, cluster_size: int) -> int:
+        """fb をクラスターに加え、after より後ろのキーワードの共通部分を数え直す。新しい |クラスター| を返す"""
+        for number in numbers:
+            if fb_seen[number] == seed:
+                continue
+            fb_seen[number] = seed
+            cluster_size += 1
+            positions = keywords_by_fb[number]
+            for position in positions[bisect_right(positions, after):]:
+                if shared_seed[position] != seed:
+                    shared_seed[position] = seed
+                    count = shared[position] = 1
+                else:
+                    count = shared[position] = shared[position] + 1
+                # |クラスター| は増える一方なので、今満たさなければ共通部分が増えるまで比べなくてよい
+                if queued[position] != seed and 3 * count > cluster_size + sizes[position]:
+                    queued[position] = seed
+                    heapq.heappush(pending, position)
+        return cluster_size
+
+    for seed, kw in enumerate(keywords):
+        if used[seed]:
             continue
 
         cluster = {kw}
+        members = [seed]
         fb_ids = set(keyword_fb_map[kw])
 
-        for other_kw in keywords:
-            if other_kw in used or other_kw == kw:
-                continue
-
-            other_fb_ids = keyword_fb_map[other_kw]
-            # Jaccard 類似度
-            intersection = len(fb_ids & other_fb_ids)
-            union = len(fb_ids | other_fb_ids)
-
+        # 比較待ち（位置の昇順 = 総当たりで比べる順）
+        pending: List[int] = []
+        cluster_size = absorb(pending, seed, postings[seed], seed, 0)
+        while pending:
+            position = heapq.heappop(pending)
+            intersection = shared[position]
+            union = cluster_size + sizes[position] - intersection
             if union > 0 and intersection / union > 0.5:
+                other_kw = keywords[position]
                 cluster.add(other_kw)
-                fb_ids |= other_fb_ids
+                members.append(position)
+                fb_ids |= keyword_fb_map[other_kw]
+                # 総当たりはこれより前のキーワードを比べ終えているので、後ろだけを数え直す
+                cluster_size = absorb(pending, seed, postings[position], position, cluster_size)
 
-        for c in cluster:
-            used.add(c)
+        # 使ったキーワードは転置インデックスから外す（以降の種では数えない）
+        for position in members:
+            used[position] = True
+            for number in postings[position]:
+                keywords_by_fb[number].remove(position)
 
         clusters.append((cluster, fb_ids))
 
@@ -364,38 +383,20 @@ def suggest_skill_name(keywords: Set[str]) -> str:
 # スキル分割候補検出
 # ===============================
 
-def detect_split_candidates(feedbacks: List[Dict]) -> List[Dict]:
+def detect_split_candidates(postings: KeywordPostings, backend: Optional[str] = None) -> List[Dict]:
     """
     スキル分割候補を検出。
 
     条件:
     - 同一 skill ファイルに対する指摘が複数セクションに分散
     - セクション間のキーワード重なりが薄い（Jaccard 類似度が低い）
+
+    backend はセクション間類似度の計算方法（low_similarity_pairs を参照）。
     """
     # skill ファイル → セクション → キーワード集合
-    skill_sections: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+    skill_sections = postings.skill_sections
     # skill ファイル → セクション → fb_id 集合
-    skill_section_fb_ids: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
-
-    for fb in feedbacks:
-        fb_id = fb.get('id')
-        if not fb_id:
-            continue
-
-        for target in fb.get('improvement_targets', []):
-            if target.get('type') != 'skill':
-                continue
-
-            file_path = target.get('file')
-            section = target.get('section')
-            if not file_path or not section:
-                continue
-
-            for kw in target.get('keywords', []):
-                if is_valid_keyword(kw):
-                    normalized = normalize_keyword(kw)
-                    skill_sections[file_path][section].add(normalized)
-                    skill_section_fb_ids[file_path][section].add(fb_id)
+    skill_section_fb_ids = postings.skill_section_fb_ids
 
     # 分割候補を検出
     candidates = []
@@ -404,53 +405,21 @@ def detect_split_candidates(feedbacks: List[Dict]) -> List[Dict]:
         if len(sections) < 2:
             continue
 
-        # セクション間の Jaccard 類似度を計算
-        section_names = list(sections.keys())
-        clusters = []
-
-        for i, sec1 in enumerate(section_names):
-            kw1 = sections[sec1]
-            fb1 = skill_section_fb_ids[skill_file][sec1]
-
-            # 十分な fb がなければスキップ
-            if len(fb1) < MIN_CLUSTER_SIZE:
-                continue
-
-            is_distinct = True
-            for j, sec2 in enumerate(section_names):
-                if i >= j:
-                    continue
-
-                kw2 = sections[sec2]
-                fb2 = skill_section_fb_ids[skill_file][sec2]
-
-                if len(fb2) < MIN_CLUSTER_SIZE:
-                    continue
+        # 十分な fb があるセクションどうしで、キーワードの重なりが薄い組を求める
+        section_fb_ids = skill_section_fb_ids[skill_file]
+        section_names = [name for name in sections if len(section_fb_ids[name]) >= MIN_CLUSTER_SIZE]
+        pairs = low_similarity_pairs([sections[name] for name in section_names], backend=backend)
 
-                # Jaccard 類似度
-                intersection = len(kw1 & kw2)
-                union = len(kw1 | kw2)
-                similarity = intersection / union if union > 0 else 0
-
-                if similarity <= MAX_JACCARD_SIMILARITY:
-                    # 類似度が低い = 分割推奨
-                    clusters.append({
-                        'section': sec1,
-                        'keywords': list(kw1)[:5],
-                        'fb_count': len(fb1),
-                    })
-                    clusters.append({
-                        'section': sec2,
-                        'keywords': list(kw2)[:5],
-                        'fb_count': len(fb2),
-                    })
-
-        # 重複を除去してクラスターをまとめる
+        # 組に現れた順にセクションをまとめる（重複は最初のものを残す）
         unique_clusters = {}
-        for c in clusters:
-            key = c['section']
-            if key not in unique_clusters:
-                unique_clusters[key] = c
+        for i, j in pairs:
+            for name in (section_names[i], section_names[j]):
+                if name not in unique_clusters:
+                    unique_clusters[name] = {
+                        'section': name,
+                        'keywords': list(sections[name])[:5],
+                        'fb_count': len(section_fb_ids[name]),
+                    }
 
         if len(unique_clusters) >= 2:
             candidates.append({
@@ -469,33 +438,88 @@ def detect_split_candidates(feedbacks: List[Dict]) -> List[Dict]:
     return candidates[:3]  # 上位3件まで
 
 
+def low_similarity_pairs(
+    keyword_sets: List[Set[str]],
+    threshold: float = MAX_JACCARD_SIMILARITY,
+    backend: Optional[str] = None,
+) -> List[Tuple[int, int]]:
+    """
+    キーワード集合どうしの Jaccard 類似度が threshold 以下の組 (i, j)（i < j）を
+    (i, j) の昇順に返す。共通のキーワードがない組（空集合どうしを含む）の類似度は 0。
+
+    各集合をキーワードの出現行列（行 = 集合）に1回だけ符号化し、全組の共通部分の大きさを
+    まとめて求める。backend:
+        'numpy'  : 出現行列とその転置の積（NumPy があるときの既定）
+        'bitset' : 各行を整数のビット集合にし、AND の popcount（NumPy がないときの既定）
+    どちらも類似度は共通部分 / 和集合の浮動小数の割り算で求め、1組ずつ計算した場合と同じ結果になる。
+    """
+    if backend is None:
+        backend = 'numpy' if numpy is not None else 'bitset'
+    count = len(keyword_sets)
+    if count < 2:
+        return []
+
+    vocabulary: Dict[str, int] = {}
+    column_of = vocabulary.setdefault
+    columns = [[column_of(kw, len(vocabulary)) for kw in keywords] for keywords in keyword_sets]
+
+    if backend == 'numpy':
+        if numpy is None:
+            raise RuntimeError('numpy がインストールされていません')
+        incidence = numpy.zeros((count, len(vocabulary)), dtype=numpy.float64)
+        for row, row_columns in enumerate(columns):
+            incidence[row, row_columns] = 1.0
+        # 0/1 の積和なので float64 でも件数は正確
+        intersection = incidence @ incidence.T
+        sizes = numpy.diagonal(intersection)
+        union = sizes[:, None] + sizes[None, :] - intersection
+        similarity = numpy.divide(intersection, union, out=numpy.zeros_like(intersection), where=union > 0)
+        rows, cols = numpy.nonzero(numpy.triu(similarity <= threshold, 1))  # 行優先の順
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    if backend != 'bitset':
+        raise ValueError(f'unknown backend: {backend}')
+    bitsets = []
+    for row_columns in columns:
+        bits = 0
+        for column in row_columns:
+            bits |= 1 << column
+        bitsets.append(bits)
+    sizes = [len(row_columns) for row_columns in columns]
+    pairs = []
+    for i in range(count):
+        bits_i = bitsets[i]
+        size_i = sizes[i]
+        for j in range(i + 1, count):
+            intersection = _popcount(bits_i & bitsets[j])
+            union = size_i + sizes[j] - intersection
+            similarity = intersection / union if union > 0 else 0
+            if similarity <= threshold:
+                pairs.append((i, j))
+    return pairs
+
+
 # ===============================
 # prompt-improver 自己改善検出
 # ===============================
 
-def detect_self_improvement_candidates(feedbacks: List[Dict]) -> Dict:
+def detect_self_improvement_candidates(
+    postings: KeywordPostings,
+    archived_excerpts: Optional[List[Dict]] = None,
+) -> Dict:
     """
     フィードバックから prompt-improver 自体への改善提案を生成。
 
     1. パターン提案: ユーザー修正があるが patterns_matched が空 → 新パターン候補
-    2. キーワード提案: linked_target が null または confidence < 0.3 → 新キーワード候補
+    2. 類似した指摘: patterns が空の指摘を近似重複でグループ化（archived_excerpts が
+       あればそれを、なければ postings の指摘を対象にする）
+    3. キーワード提案: linked_target が null または confidence < 0.3 → 新キーワード候補
     """
     pattern_proposals = []
     keyword_proposals = []
 
-    # パターン提案: 検出されなかったユーザー指摘を収集
-    undetected_excerpts = []
-    for fb in feedbacks:
-        fb_id = fb.get('id')
-        for item in fb.get('user_correction_items', []):
-            # patterns が空 = 検出パターンに引っかからなかった
-            if not item.get('patterns'):
-                excerpt = item.get('excerpt', '')
-                if excerpt and len(excerpt) > 5:
-                    undetected_excerpts.append({
-                        'fb_id': fb_id,
-                        'excerpt': excerpt,
-                    })
+    # パターン提案: 検出されなかったユーザー指摘（patterns が空のもの）
+    undetected_excerpts = postings.undetected_excerpts
 
     # 類似 excerpt をグループ化して提案
     if undetected_excerpts:
@@ -518,21 +542,8 @@ def detect_self_improvement_candidates(feedbacks: List[Dict]) -> Dict:
                     'source_fb_ids': [i['fb_id'] for i in items[:3]],
                 })
 
-    # キーワード提案: リンクされなかった improvement_targets を収集
-    unlinked_keywords = defaultdict(lambda: {'fb_ids': set(), 'keywords': set()})
-    for fb in feedbacks:
-        fb_id = fb.get('id')
-        for target in fb.get('improvement_targets', []):
-            confidence = target.get('avg_confidence', 1.0)
-            target_file = target.get('file')
-
-            # 低信頼度またはファイルがない = リンク不十分
-            if confidence < 0.3 or not target_file:
-                for kw in target.get('keywords', []):
-                    if is_valid_keyword(kw):
-                        normalized = normalize_keyword(kw)
-                        unlinked_keywords[normalized]['fb_ids'].add(fb_id)
-                        unlinked_keywords[normalized]['keywords'].add(kw)
+    # キーワード提案: リンクされなかった improvement_targets のキーワード
+    unlinked_keywords = postings.unlinked_keywords
 
     # 3件以上で提案
     for kw, data in unlinked_keywords.items():
@@ -544,12 +555,79 @@ def detect_self_improvement_candidates(feedbacks: List[Dict]) -> Dict:
                 'source_fb_ids': sorted(list(data['fb_ids']))[:3],
             })
 
+    excerpts = archived_excerpts if archived_excerpts is not None else undetected_excerpts
+
     return {
         'pattern_proposals': pattern_proposals[:5],
+        'excerpt_groups': detect_similar_excerpt_groups(excerpts)[:5],
         'keyword_proposals': keyword_proposals[:5],
     }
 
 
+def detect_similar_excerpt_groups(excerpts: List[Dict]) -> List[Dict]:
+    """
+    検出されなかった指摘を MinHash / LSH で近似重複のグループにまとめ（near_duplicates.py）、
+    2つ以上のフィードバックにまたがるものを件数の多い順に返す。
+    proposed_pattern はグループの半数以上に含まれる最長の言い回し（なければ空文字列）。
+    """
+    proposals = []
+    for members in near_duplicate_groups([item['excerpt'] for item in excerpts]):
+        items = [excerpts[i] for i in members]
+        fb_ids = list(dict.fromkeys(item['fb_id'] for item in items))
+        if len(fb_ids) < 2:
+            continue
+        proposals.append({
+            'reason': f'似た指摘が {len(items)} 件（{len(fb_ids)} フィードバック）検出されていない',
+            'example': items[0]['excerpt'][:50],
+            'proposed_pattern': common_phrase([item['excerpt'] for item in items]),
+            'count': len(items),
+            'source_fb_ids': [fb_id for fb_id in fb_ids if fb_id][:3],
+        })
+    proposals.sort(key=lambda p: -p['count'])
+    return proposals
+
+
+# ===============================
+# トレンド検出
+# ===============================
+
+def detect_trends(trends: Dict[str, Dict[str, Dict]], windows: Tuple[float, float]) -> Dict[str, Dict[str, List[Dict]]]:
+    """
+    増加・減少しているキーワード / 改善ターゲット / 修正パターンを検出。
+
+    trends は FeedbackIndex.trends の結果（半減期 = windows の減衰付き件数）。
+    短い窓と長い窓の件数をそれぞれ1日あたりに直し、その比が TREND_RATIO 以上なら増加、
+    1 / TREND_RATIO 以下なら減少とする。比の大きい（小さい）順に TREND_TOP 件まで。
+    """
+    short, long_ = windows
+    result = {}
+    for kind in TREND_KINDS:
+        rising = []
+        falling = []
+        for key, entry in trends.get(kind, {}).items():
+            short_score = entry.get(short, 0.0)
+            long_score = entry.get(long_, 0.0)
+            short_rate = trend_rate(short_score, short)
+            long_rate = trend_rate(long_score, long_)
+            if long_rate <= 0:
+                continue
+            item = {
+                'key': key,
+                'count': entry['count'],
+                'short_rate': short_rate,
+                'long_rate': long_rate,
+                'ratio': short_rate / long_rate,
+            }
+            if item['ratio'] >= TREND_RATIO and short_score >= TREND_MIN_SCORE:
+                rising.append(item)
+            elif item['ratio'] <= 1 / TREND_RATIO and long_score >= TREND_MIN_SCORE:
+                falling.append(item)
+        rising.sort(key=lambda x: (-x['ratio'], -x['short_rate'], x['key']))
+        falling.sort(key=lambda x: (x['ratio'], -x['long_rate'], x['key']))
+        result[kind] = {'rising': rising[:TREND_TOP], 'falling': falling[:TREND_TOP]}
+    return result
+
+
 # ===============================
 # レポート生成
 # ===============================
@@ -559,8 +637,10 @@ def generate_markdown_report(
     split_candidates: List[Dict],
     self_improvement: Dict,
     total_scanned: int,
+    trends: Optional[Dict[str, Dict[str, List[Dict]]]] = None,
+    trend_windows: Tuple[float, float] = DEFAULT_TREND_HALF_LIVES,
 ) -> str:
-    """Markdown レポートを生成"""
+    """Markdown レポートを生成（trends が None ならトレンドはインデックスなしのため省略と表示）"""
     lines = [
         "==========================================",
         "構造改善レポート",
@@ -572,9 +652,10 @@ def generate_markdown_report(
 
     # prompt-improver 自己改善
     pattern_proposals = self_improvement.get('pattern_proposals', [])
+    excerpt_groups = self_improvement.get('excerpt_groups', [])
     keyword_proposals = self_improvement.get('keyword_proposals', [])
 
-    if pattern_proposals or keyword_proposals:
+    if pattern_proposals or excerpt_groups or keyword_proposals:
         lines.append("【prompt-improver 自己改善】")
 
         if pattern_proposals:
@@ -586,6 +667,15 @@ def generate_markdown_report(
                 lines.append(f"     - 提案: CORRECTION_PATTERNS に追加")
             lines.append("")
 
+        if excerpt_groups:
+            lines.append("類似した未検出の指摘:")
+            for i, group in enumerate(excerpt_groups, 1):
+                lines.append(f"  {i}) \"{group['proposed_pattern'] or group['example']}\"")
+                lines.append(f"     - 理由: {group['reason']}")
+                lines.append(f"     - 例: \"{group['example']}...\"")
+                lines.append(f"     - 代表フィードバック: {', '.join(group['source_fb_ids'])}")
+            lines.append("")
+
         if keyword_proposals:
             lines.append("新キーワード候補:")
             for i, proposal in enumerate(keyword_proposals, 1):
@@ -628,11 +718,146 @@ def generate_markdown_report(
         lines.append("該当なし")
         lines.append("")
 
+    # トレンド
+    short, long_ = trend_windows
+    lines.append(f"【トレンド（半減期 {short:g}日 / {long_:g}日、全ステータス）】")
+    if trends is None:
+        lines.append("インデックスが使えないため省略")
+        lines.append("")
+    elif not any(t['rising'] or t['falling'] for t in trends.values()):
+        lines.append("該当なし")
+        lines.append("")
+    else:
+        labels = {'keyword': 'キーワード', 'target': '改善ターゲット', 'pattern': '修正パターン'}
+        for kind, kind_trends in trends.items():
+            for direction, label in (('rising', '増加'), ('falling', '減少')):
+                items = kind_trends[direction]
+                if not items:
+                    continue
+                lines.append(f"{labels.get(kind, kind)}（{label}）:")
+                for item in items:
+                    lines.append(
+                        f"  - {item['key']}: {item['short_rate']:.2f}件/日"
+                        f"（長期 {item['long_rate']:.2f}件/日、×{item['ratio']:.1f}、累計 {item['count']}件）"
+                    )
+        lines.append("")
+
     lines.append("==========================================")
 
     return "\n".join(lines)
 
 
+# ===============================
+# 読み込み
+# ===============================
+
+def load_feedbacks(feedback_dir: Path, status_filter: str, jobs: int = 1) -> List[Dict]:
+    """fb-*.yaml をすべて読み込む（インデックスが使えない場合。解析結果のキャッシュは使う）"""
+    cache = FeedbackParseCache()
+    try:
+        paths = [str(yaml_file) for yaml_file in sorted(feedback_dir.glob('fb-*.yaml'))]
+        return parse_feedbacks(paths, status_filter, cache, jobs)
+    finally:
+        cache.save()
+
+
+def load_archived_excerpts(feedback_dir: Path, jobs: int = 1) -> List[Dict]:
+    """
+    フィードバックディレクトリと archive/ の fb-*.yaml すべて（ステータスを問わない）から、
+    検出パターンのない修正指示を集める。
+
+    YAML は解析結果のキャッシュを通して読む（変わっていないファイルは stat だけ。
+    archive/ への mv もキャッシュに当たる）。解析結果の excerpt は 100 文字で切り詰めて
+    いるので、該当する指示のあるファイルだけはサイドカーから切り詰める前の excerpt を読む。
+    """
+    paths = [
+        str(yaml_file)
+        for directory in (feedback_dir, feedback_dir / 'archive')
+        for yaml_file in sorted(directory.glob('fb-*.yaml'))
+    ]
+    cache = FeedbackParseCache()
+    try:
+        records = cache.parse_many(paths, jobs)
+    finally:
+        cache.save()
+
+    def undetected(items: List[Dict]) -> List[str]:
+        excerpts = [item.get('excerpt') or '' for item in items if not item.get('patterns')]
+        return [excerpt for excerpt in excerpts if len(excerpt) > 5]
+
+    found = [
+        (path, record) for path, record in zip(paths, records)
+        if record is not None and undetected(record.get('user_correction_items', []))
+    ]
+    sidecars = _map_in_threads(lambda item: load_sidecar(sidecar_path(item[0]), 'extracted'), found, jobs)
+
+    excerpts = []
+    for (path, record), extracted in zip(found, sidecars):
+        if extracted is not None:
+            items = (extracted.get('user_corrections') or {}).get('items') or []
+        else:
+            items = record['user_correction_items']
+        excerpts.extend({'fb_id': record['id'], 'excerpt': excerpt} for excerpt in undetected(items))
+    return excerpts
+
+
+def load_indexed_postings(
+    feedback_dir: str,
+    status_filter: str,
+    jobs: int = 1,
+    trend_windows: Tuple[float, float] = DEFAULT_TREND_HALF_LIVES,
+) -> Tuple[KeywordPostings, Dict[str, Dict[str, Dict]]]:
+    """
+    feedback_index.py のインデックスに保存済みのポスティングから集計し、
+    trend_windows の半減期での減衰付き件数（トレンド）と合わせて返す。
+
+    変わったファイルだけを読み直し、サイドカーのないファイルは限定パーサで
+    解析した結果をインデックスに書き戻す（次回からは解析しない）。
+    インデックスから消えた解析結果（archive/ への移動・インデックスの再構築など）も、
+    内容が同じなら解析結果のキャッシュから戻す。
+    jobs > 1 なら変わったファイルの読み直しと未解析ファイルの解析を並行に行う。
+    """
+    cache = FeedbackParseCache()
+    index = FeedbackIndex(feedback_dir, analyzer=lambda paths: cache.parse_many(paths, jobs))
+    try:
+        index.refresh(jobs)
+        postings = KeywordPostings.from_index(index, status_filter)
+        return postings, index.trends(trend_windows)
+    finally:
+        index.close()
+        cache.save()
+
+
+def verify_index(feedback_dir: str, status_filter: str, jobs: int = 1) -> int:
+    """
+    インデックスに逐次反映されてきた状態を、作り直した結果と比べる（不一致があれば 1）。
+
+    - テーブルの行: YAML とサイドカーから作り直したインデックスと全行を突き合わせる
+      （サイドカーのないファイルは限定パーサで解析し直す）
+    - ポスティングの集計: インデックスから集計した KeywordPostings と、
+      インデックスを使わずに YAML から読み込んだフィードバックで作ったものを比べる
+    """
+    cache = FeedbackParseCache()
+    index = FeedbackIndex(feedback_dir, analyzer=lambda paths: cache.parse_many(paths, jobs))
+    try:
+        index.refresh(jobs)
+        incremental = KeywordPostings.from_index(index, status_filter)
+        mismatches, _ = index.verify(jobs)
+    finally:
+        index.close()
+        cache.save()
+    rebuilt = KeywordPostings.from_feedbacks(load_feedbacks(Path(feedback_dir), status_filter, jobs))
+    mismatches += [f"postings: {name}" for name in incremental.diff(rebuilt)]
+
+    for line in mismatches[:10]:
+        print(line, file=sys.stderr)
+    if mismatches:
+        print(f"MISMATCH: {len(mismatches)} 件")
+        return 1
+    print(f"ok ({incremental.feedback_count} 件, キーワード {len(incremental.keyword_fb_ids)} 種)")
+    return 0
+
+
 # ===============================
 # メイン処理
 # ===============================
@@ -649,46 +874,80 @@ def main():
         default='open',
         help='対象とするトリアージステータス'
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='フィードバックを並行に読み込む数（スレッドで読み、解析はプロセス。0 以下なら CPU 数。既定: 1）'
+    )
+    parser.add_argument(
+        '--trend-windows',
+        default=','.join(f'{h:g}' for h in DEFAULT_TREND_HALF_LIVES),
+        help='トレンドの短い窓と長い窓の半減期（日）をカンマ区切りで（既定: %(default)s）'
+    )
+    parser.add_argument(
+        '--excerpt-scope',
+        choices=['archive', 'status'],
+        default='archive',
+        help='類似した未検出の指摘をまとめる範囲（archive: archive/ を含む全ステータス、'
+             'status: --status の対象のみ。既定: %(default)s）'
+    )
+    parser.add_argument(
+        '--verify-index',
+        action='store_true',
+        help='インデックスに保存済みのポスティングと行を、作り直した結果と比べる'
+    )
     args = parser.parse_args()
 
+
     feedback_dir = Path(args.feedback_dir)
     if not feedback_dir.exists():
         print(f"Error: フィードバックディレクトリが存在しません: {feedback_dir}")
         return 1
 
-    # フィードバックファイルを読み込み
-    feedbacks = []
-    for yaml_file in sorted(feedback_dir.glob('fb-*.yaml')):
-        fb = parse_feedback_yaml(str(yaml_file))
-        if fb is None:
-            continue
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
-        # ステータスフィルタ
-        status = fb.get('triage_status')
-        if args.status == 'open':
-            # open または triage がない場合は対象
-            if status and status != 'open':
-                continue
-        elif status != args.status:
-            continue
+    if args.verify_index:
+        try:
+            return verify_index(str(feedback_dir), args.status, jobs)
+        except sqlite3.Error as e:
+            print(f"Error: インデックスを検証できません: {e}", file=sys.stderr)
+            return 1
 
-        feedbacks.append(fb)
+    try:
+        trend_windows = tuple(float(h) for h in args.trend_windows.split(','))
+    except ValueError:
+        trend_windows = ()
+    if len(trend_windows) != 2 or not 0 < trend_windows[0] < trend_windows[1]:
+        print(f"Error: --trend-windows は「短い半減期,長い半減期」で指定してください: {args.trend_windows}")
+        return 1
+
+    # ポスティングを集計（インデックスがあれば変わったファイルだけ読み直す）
+    try:
+        postings, trend_scores = load_indexed_postings(str(feedback_dir), args.status, jobs, trend_windows)
+        trends = detect_trends(trend_scores, trend_windows)
+    except sqlite3.Error:
+        postings = KeywordPostings.from_feedbacks(load_feedbacks(feedback_dir, args.status, jobs))
+        trends = None
 
-    if not feedbacks:
+    if not postings.feedback_count:
         print("対象となるフィードバックがありません。")
         return 0
 
     # 検出
-    new_skill_candidates = detect_new_skill_candidates(feedbacks)
-    split_candidates = detect_split_candidates(feedbacks)
-    self_improvement = detect_self_improvement_candidates(feedbacks)
+    new_skill_candidates = detect_new_skill_candidates(postings)
+    split_candidates = detect_split_candidates(postings)
+    archived_excerpts = load_archived_excerpts(feedback_dir, jobs) if args.excerpt_scope == 'archive' else None
+    self_improvement = detect_self_improvement_candidates(postings, archived_excerpts)
 
     # レポート生成
     report = generate_markdown_report(
         new_skill_candidates,
         split_candidates,
         self_improvement,
-        len(feedbacks),
+        postings.feedback_count,
+        trends,
+        trend_windows,
     )
 
     print(report)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+structured_output.py - 抽出結果の機械可読出力（JSON / NDJSON / サイドカー）
+
+extract_transcript.py / extract_session_trace.py の --format json|ndjson と、
+Stop hook が fb-*.yaml の隣に書き出すサイドカー（fb-*.extracted.json）を扱う。
+下流（recommend_structure.py など）は YAML を正規表現で読み直す代わりに、
+サイドカーを1回のデコードで読み込める。
+
+NDJSON は1行1レコード:
+    {"record": "<種別>", "data": {...}}
+先頭行は {"record": "header", "data": {"kind": ..., "format_version": ...}}。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Iterable, Optional, TextIO, Tuple
+
+OUTPUT_FORMATS = ("yaml", "json", "ndjson")
+
+# 構造化出力・サイドカーの形式（フィールド構成を変えたら上げる）
+STRUCTURED_FORMAT_VERSION = 1
+
+# fb-*.yaml に対応するサイドカーの拡張子
+SIDECAR_SUFFIX = ".extracted.json"
+
+
+def add_format_arguments(parser: argparse.ArgumentParser) -> None:
+    """出力形式の切り替えオプションを CLI に追加"""
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=OUTPUT_FORMATS,
+        default="yaml",
+        help="出力形式（既定: yaml。json は1ドキュメント、ndjson は1行1レコードで逐次出力）",
+    )
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_ndjson(kind: str, records: Iterable[Tuple[str, object]], stream: TextIO = sys.stdout) -> None:
+    """(種別, データ) のレコード列を1行ずつ書き出す（生成された順に出力）"""
+    stream.write(_dumps({"record": "header", "data": {"kind": kind, "format_version": STRUCTURED_FORMAT_VERSION}}))
+    stream.write("\n")
+    for record, data in records:
+        stream.write(_dumps({"record": record, "data": data}))
+        stream.write("\n")
+    stream.flush()
+
+
+def json_document(kind: str, data: dict) -> dict:
+    """JSON 出力・サイドカー共通のドキュメント形式"""
+    return {"format_version": STRUCTURED_FORMAT_VERSION, kind: data}
+
+
+def write_json(kind: str, data: dict, stream: TextIO = sys.stdout) -> None:
+    stream.write(_dumps(json_document(kind, data)))
+    stream.write("\n")
+    stream.flush()
+
+
+def sidecar_path(yaml_path: str) -> str:
+    """fb-YYYYMMDD-NNN.yaml → fb-YYYYMMDD-NNN.extracted.json"""
+    base = yaml_path[:-5] if yaml_path.endswith(".yaml") else yaml_path
+    return base + SIDECAR_SUFFIX
+
+
+def write_sidecar(path: str, kind: str, data: dict) -> bool:
+    """サイドカーを原子的に書き込む（読み手は常に完全なファイルを見る）"""
+    target_dir = os.path.dirname(path) or "."
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".sidecar-", suffix=".tmp")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(_dumps(json_document(kind, data)))
+            f.write("\n")
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def load_sidecar(path: str, kind: str) -> Optional[dict]:
+    """サイドカーを読み込む（存在しない・壊れている・形式が違う場合は None）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(document, dict) or document.get("format_version") != STRUCTURED_FORMAT_VERSION:
+        return None
+    data = document.get(kind)
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+transcript_rules.py - トランスクリプト解析の共通ルール
+
+extract_transcript.py（prompt-improver）と extract_session_trace.py（hurikaeri）が
+共有する検出パターン・キーワードマッピング・リンク判定を定義する。
+
+依存: Python 3.x 標準ライブラリのみ
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Optional, Tuple
+
+from correction_detector import CorrectionDetector
+from keyword_matcher import (  # noqa: F401
+    WEAK_KEYWORDS,
+    SectionKeywordIndex,
+    compile_section_keywords,
+    keywords_fingerprint,
+    load_compiled_keywords,
+)
+
+# セクションキーワードマッピングファイルのパス
+KEYWORDS_FILE = os.path.join(os.path.dirname(__file__), "section_keywords.json")
+
+# 解析キャッシュ（チェックポイント・コンパイル済みキーワード）の保存先
+DEFAULT_CACHE_DIR = os.environ.get(
+    "TRANSCRIPT_SCAN_CACHE_DIR",
+    os.path.expanduser("~/.claude/cache/transcript-scan"),
+)
+
+# デフォルトのキーワードマッピング（外部ファイルがない場合のフォールバック）
+DEFAULT_KEYWORDS = {
+    "claude_md": {
+        "RULES.md": {
+            "## Git Workflow": ["git", "commit", "push", "branch", "PR", "rebase", "checkout", "merge"],
+            "## Implementation Completeness": ["TODO", "実装", "完成", "未完了", "stub", "incomplete"],
+            "## Scope Discipline": ["スコープ", "MVP", "機能追加", "YAGNI", "scope"],
+            "## Failure Investigation": ["エラー", "デバッグ", "失敗", "調査", "debug", "error"],
+            "## Professional Honesty": ["マーケティング", "誇張", "正直", "professional"],
+            "## Workspace Hygiene": ["クリーンアップ", "一時ファイル", "cleanup", "temp"],
+            "## Tool Optimization": ["ツール", "並列", "parallel", "効率"],
+            "## File Organization": ["ファイル構成", "ディレクトリ", "directory", "organization"]
+        },
+        "PRINCIPLES.md": {
+            "## Engineering Mindset": ["SOLID", "DRY", "KISS", "設計", "design"],
+            "## Decision Framework": ["決定", "トレードオフ", "trade-off", "decision"],
+            "## Quality Philosophy": ["品質", "quality", "テスト", "test"]
+        },
+        "FLAGS.md": {
+            "## Mode Activation Flags": ["brainstorm", "introspect", "orchestrate", "flag"],
+            "## MCP Server Flags": ["context7", "sequential", "playwright", "MCP"]
+        }
+    },
+    "skills": {
+        "architecture": {
+            "## セキュリティパターン": ["JWT", "認証", "OAuth", "セキュリティ", "暗号化", "auth", "security"],
+            "## アーキテクチャ決定": ["ADR", "設計", "構造", "レイヤー", "architecture"]
+        },
+        "api": {
+            "## エンドポイント設計": ["REST", "API", "エンドポイント", "HTTP", "endpoint"]
+        },
+        "database": {
+            "## データモデル": ["スキーマ", "エンティティ", "schema", "entity", "table", "index"]
+        },
+        "implementation": {
+            "## コーディング規約": ["コーディング", "規約", "coding", "standard", "convention"]
+        }
+    }
+}
+
+# ユーザー修正検出パターン
+CORRECTION_PATTERNS = {
+    # 既存パターン
+    "negation_start": re.compile(r"^(いや|違う|違います|そうじゃない|それじゃない|間違|訂正|no[,.]|not |that's not|you misunderstood)", re.IGNORECASE),
+    "contrast": re.compile(r"(ではなく|じゃなくて|ではなくて|instead|rather than)", re.IGNORECASE),
+    "correction_request": re.compile(r"(直して|修正して|やり直して|〜にして|してください|please fix|please change|redo)", re.IGNORECASE),
+
+    # 新規: ユーザー指摘パターン
+    "instruction_reminder": re.compile(
+        r"(って言った|と言った|って指示した|って頼んだ|told you|said to|asked you|I said)",
+        re.IGNORECASE
+    ),
+    "why_doing": re.compile(
+        r"(なんで|なぜ|どうして|why).{0,20}(してる|やってる|している|するの|させてる|させて|doing|did you)",
+        re.IGNORECASE
+    ),
+    "comprehension_check": re.compile(
+        r"(聞いてた|聞いてる|わかってる|理解してる|読んだ(?:\?|？)|見た(?:\?|？)|are you listening|did you understand|did you read)",
+        re.IGNORECASE
+    ),
+
+    # 繰り返し不満
+    "repetition_frustration": re.compile(
+        r"(もう一回|何度も|さっきも)(言|説明)",
+        re.IGNORECASE
+    ),
+
+    # 不足指摘（質問形式・確認形式を除外）
+    "missing_element": re.compile(
+        r"(がない|が足りない|が抜けてる|を忘れてる)(?!か|ことを|ように|ようです|かも)",
+        re.IGNORECASE
+    ),
+
+    # 確認期待
+    "expectation_check": re.compile(
+        r"(じゃないの|でしょ|だよね)(?:\?|？)",
+        re.IGNORECASE
+    ),
+}
+
+
+def load_section_keywords() -> dict:
+    """セクションキーワードをファイルまたはデフォルトから読み込み"""
+    if os.path.exists(KEYWORDS_FILE):
+        try:
+            with open(KEYWORDS_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+    return DEFAULT_KEYWORDS
+
+
+def load_compiled_section_keywords(cache_dir: str = DEFAULT_CACHE_DIR) -> Tuple[dict, str, SectionKeywordIndex]:
+    """セクションキーワードをコンパイル済みインデックスとして読み込み
+
+    cache_dir（ユーザーのキャッシュディレクトリ）にだけキャッシュを置き、
+    JSON の mtime・内容が変わったときだけ再コンパイルする（スキルのディレクトリには書かない）。
+
+    Returns:
+        (section_keywords, keywords_fingerprint, SectionKeywordIndex)
+    """
+    keywords_path = os.path.abspath(KEYWORDS_FILE)
+    path_key = hashlib.sha1(keywords_path.encode("utf-8")).hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, f"section_keywords-{path_key}.index.json")
+    compiled = load_compiled_keywords(keywords_path, cache_path)
+    if compiled is not None:
+        return compiled
+    # ファイルがない・壊れている場合はデフォルト（キャッシュしない）
+    return DEFAULT_KEYWORDS, keywords_fingerprint(DEFAULT_KEYWORDS), compile_section_keywords(DEFAULT_KEYWORDS)
+
+
+def extract_text_from_content(content, include_tool_results: bool = True) -> str:
+    """メッセージコンテンツからテキストを抽出
+
+    Args:
+        content: メッセージの content フィールド
+        include_tool_results: tool_result のテキストも含めるか（修正検出では False 推奨）
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        texts = []
+        for item in content:
+            if isinstance(item, dict):
+                if item.get("type") == "text":
+                    texts.append(item.get("text", ""))
+                elif item.get("type") == "tool_result" and include_tool_results:
+                    result_content = item.get("content", "")
+                    if isinstance(result_content, str):
+                        texts.append(result_content)
+        return " ".join(texts)
+    return ""
+
+
+def extract_keywords_from_text(text: str) -> set:
+    """テキストからキーワードを抽出（小文字化して単語分割）"""
+    # 日本語と英語の両方に対応
+    words = set(re.findall(r"[a-zA-Z]+|[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]+", text.lower()))
+    return words
+
+
+def keyword_matches_in_text(context_text: str, keyword: str) -> bool:
+    """キーワードがコンテキストに部分一致するか（大文字小文字無視）"""
+    # 部分一致で検索（日本語・英語両対応）
+    return keyword.lower() in context_text.lower()
+
+
+# コンパイル済みマッチャのキャッシュ（同じ section_keywords を渡す限り再コンパイルしない）
+_compiled_keywords = {}
+
+
+def get_section_index(section_keywords) -> SectionKeywordIndex:
+    """section_keywords に対応するコンパイル済みマッチャを返す
+
+    SectionKeywordIndex を渡した場合はそのまま返す。dict の場合はオブジェクト単位でキャッシュする。
+    """
+    if isinstance(section_keywords, SectionKeywordIndex):
+        return section_keywords
+    cached = _compiled_keywords.get(id(section_keywords))
+    # id の再利用に備えて元の dict 自体も保持して照合する
+    if cached is not None and cached[0] is section_keywords:
+        return cached[1]
+    index = compile_section_keywords(section_keywords)
+    _compiled_keywords[id(section_keywords)] = (section_keywords, index)
+    return index
+
+
+def find_linked_target(context_text: str, active_skill: Optional[str], section_keywords) -> Optional[dict]:
+    """コンテキストテキストからリンク先セクションを特定（部分一致方式）
+
+    全セクションのキーワードをコンパイル済みマッチャで1回走査して判定する。
+    section_keywords には dict またはコンパイル済みの SectionKeywordIndex を渡せる。
+    """
+    return get_section_index(section_keywords).find_linked_target(context_text, active_skill)
+
+
+# 高スコアパターン（単独で検出されるべき明示的な指摘）
+# expectation_check は曖昧なため除外（他パターンとの組み合わせで検出）
+HIGH_SCORE_PATTERNS = {
+    "instruction_reminder", "why_doing", "comprehension_check",
+    "repetition_frustration", "missing_element"
+}
+
+
+# コンパイル済み検出器のキャッシュ（パターン辞書ごと）
+_correction_detectors = {}
+
+
+def get_correction_detector(patterns: dict, high_score_patterns: set) -> CorrectionDetector:
+    """パターン辞書に対応する融合検出器を返す（辞書オブジェクト単位でキャッシュ）"""
+    key = (id(patterns), frozenset(high_score_patterns))
+    cached = _correction_detectors.get(key)
+    # id の再利用に備えて元の dict 自体も保持して照合する
+    if cached is not None and cached[0] is patterns:
+        return cached[1]
+    detector = CorrectionDetector(patterns, high_score_patterns)
+    _correction_detectors[key] = (patterns, detector)
+    return detector
+
+
+def detect_user_correction(
+    text: str,
+    patterns: Optional[dict] = None,
+    high_score_patterns: Optional[set] = None,
+) -> Optional[dict]:
+    """ユーザーの修正指示を検出
+
+    全パターンとボーナス判定を結合した正規表現で1回走査する（correction_detector.py）。
+
+    Args:
+        patterns: 検出パターン（省略時は CORRECTION_PATTERNS）
+        high_score_patterns: 単独で閾値を超えるパターン名（省略時は HIGH_SCORE_PATTERNS）
+    """
+    if patterns is None:
+        patterns = CORRECTION_PATTERNS
+    if high_score_patterns is None:
+        high_score_patterns = HIGH_SCORE_PATTERNS
+    return get_correction_detector(patterns, high_score_patterns).detect(text)
+
+
+# hurikaeri 用のユーザー修正検出パターン（expectation_check なし、why_doing / comprehension_check の語彙が一部異なる）
+SESSION_CORRECTION_PATTERNS = {
+    "negation_start": re.compile(
+        r"^(いや|違う|違います|そうじゃない|それじゃない|間違|訂正|no[,.]|not |that's not|you misunderstood)",
+        re.IGNORECASE,
+    ),
+    "contrast": re.compile(
+        r"(ではなく|じゃなくて|ではなくて|instead|rather than)", re.IGNORECASE
+    ),
+    "correction_request": re.compile(
+        r"(直して|修正して|やり直して|〜にして|してください|please fix|please change|redo)",
+        re.IGNORECASE,
+    ),
+    "instruction_reminder": re.compile(
+        r"(って言った|と言った|って指示した|って頼んだ|told you|said to|asked you|I said)",
+        re.IGNORECASE,
+    ),
+    "why_doing": re.compile(
+        r"(なんで|なぜ|どうして|why).{0,20}(してる|やってる|している|するの|doing|did you)",
+        re.IGNORECASE,
+    ),
+    "comprehension_check": re.compile(
+        r"(聞いてた|聞いてる|わかってる|理解してる|読んだ(?:\?|？)|見た(?:\?|？)|are you listening|did you understand)",
+        re.IGNORECASE,
+    ),
+    "repetition_frustration": re.compile(
+        r"(もう一回|何度も|さっきも)(言|説明)", re.IGNORECASE
+    ),
+    "missing_element": re.compile(
+        r"(がない|が足りない|が抜けてる|を忘れてる)(?!か|ことを|ように|ようです|かも)",
+        re.IGNORECASE,
+    ),
+}
+
+# hurikaeri 用の高スコアパターン（correction_request も単独で検出する）
+SESSION_HIGH_SCORE_PATTERNS = {
+    "correction_request",
+    "instruction_reminder",
+    "why_doing",
+    "comprehension_check",
+    "repetition_frustration",
+    "missing_element",
+}
+
+
+def summarize_tool_input(tool_name: str, tool_input: dict) -> str:
+    """ツール入力を簡潔にサマリーする"""
+    if tool_name in ("Read", "Grep", "Glob"):
+        path = tool_input.get("file_path", tool_input.get("path", ""))
+        pattern = tool_input.get("pattern", "")
+        if path and pattern:
+            return f"{pattern} in {path}"
+        return path or pattern or ""
+
+    if tool_name in ("Write", "Edit"):
+        path = tool_input.get("file_path", "")
+        return path
+
+    if tool_name == "Bash":
+        cmd = tool_input.get("command", "")
+        # 主要コマンドを抽出（パイプチェーンの先頭コマンド）
+        first_cmd = cmd.split("|")[0].split("&&")[0].strip()
+        return first_cmd[:80]
+
+    if tool_name == "Skill":
+        return tool_input.get("skill", "")
+
+    if tool_name == "Task":
+        desc = tool_input.get("description", "")
+        return desc[:60]
+
+    if tool_name == "AskUserQuestion":
+        questions = tool_input.get("questions", [])
+        if questions and isinstance(questions, list):
+            return questions[0].get("question", "")[:60]
+        return ""
+
+    return str(tool_input)[:60]
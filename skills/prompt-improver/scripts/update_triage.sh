@@ -5,6 +5,8 @@
 set -euo pipefail
 
 FEEDBACK_DIR="${FEEDBACK_DIR:-${HOME}/.claude/feedback}"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+INDEX_SCRIPT="$SCRIPT_DIR/feedback_index.py"
 
 usage() {
   local exit_code="${1:-1}"
@@ -217,9 +219,20 @@ main() {
     cp "$temp2" "$temp3"
   fi
 
-  # 原子的置換
+  # 原子的置換（インデックスに反映するまでの間は書き換え中の印を置く。
+  # 反映前に落ちても、Stop hook の件数の問い合わせが印を見て反映し直す）
+  local indexed=false
+  if [[ -f "$INDEX_SCRIPT" ]] && command -v python3 &> /dev/null; then
+    indexed=true
+    mkdir -p "$FEEDBACK_DIR/.index.journal" && : > "$FEEDBACK_DIR/.index.journal/$(basename "$filepath")"
+  fi
   mv "$temp3" "$filepath"
 
+  # インデックスに反映（失敗しても次の問い合わせ時に stat の照合で追いつく）
+  if [[ "$indexed" == true ]]; then
+    python3 "$INDEX_SCRIPT" --feedback-dir "$FEEDBACK_DIR" update "$filepath" 2>/dev/null || true
+  fi
+
   echo "更新完了: $filepath"
   echo "  status: $status"
   [[ "$set_fix_ref" == true ]] && echo "  fix_ref: $fix_ref" || true